@@ -0,0 +1,225 @@
+"""
+Bird's-eye view (inverse perspective mapping) of the floor.
+A floor calibration gives the homography from floor coordinates (cm) to
+camera pixels. From it, fixed-point cv2.remap lookup maps for the floor
+region of interest are computed once and cached on disk, so each frame only
+pays for one remap of the region, and the grid appears as a regular lattice.
+"""
+
+import os
+import time
+import hashlib
+import cv2
+import numpy as np
+from config import *
+
+# Bump when the map format changes so stale cache files are ignored
+BIRDS_EYE_MAP_VERSION = 1
+
+
+def calibrate_homography(image_points, floor_points):
+    """
+    Homography from floor coordinates to image pixels.
+
+    Args:
+        image_points (list): (x, y) pixel positions of at least four floor points
+        floor_points (list): The same points in floor coordinates (cm)
+
+    Returns:
+        numpy.ndarray: 3x3 homography, or None if the points are degenerate
+    """
+    image_points = np.asarray(image_points, dtype=np.float32).reshape(-1, 2)
+    floor_points = np.asarray(floor_points, dtype=np.float32).reshape(-1, 2)
+    if len(image_points) < 4 or len(image_points) != len(floor_points):
+        return None
+    if len(image_points) == 4:
+        homography = cv2.getPerspectiveTransform(floor_points, image_points)
+    else:
+        homography, _ = cv2.findHomography(floor_points, image_points, cv2.RANSAC, 3.0)
+    return homography
+
+
+def calibrate_from_model(model, width=CAMERA_WIDTH, height=CAMERA_HEIGHT):
+    """
+    Homography from a fitted GridModel, with the floor origin at the top-left
+    corner of the cell nearest the image center.
+
+    Returns:
+        numpy.ndarray: 3x3 homography, or None if the model has no cells
+    """
+    cells = model.cells(width, height)
+    if not cells:
+        return None
+    cell = min(cells, key=lambda c: (c['center'][0] - width / 2) ** 2 + (c['center'][1] - height / 2) ** 2)
+    size = GRID_CELL_SIZE_CM
+    floor_points = [(0, 0), (size, 0), (0, size), (size, size)]  # Same order as cell['corners']
+    return calibrate_homography(cell['corners'], floor_points)
+
+
+def save_calibration(homography, path=BIRDS_EYE_CALIBRATION_FILE):
+    """Store a floor calibration."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    np.savez(path, homography=homography)
+    print(f"Bird's-eye calibration saved: {path}")
+
+
+def load_calibration(path=BIRDS_EYE_CALIBRATION_FILE):
+    """Load a floor calibration. Returns the homography or None."""
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            return data['homography']
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+class BirdsEyeView:
+    def __init__(self, homography, roi_cm=BIRDS_EYE_ROI_CM, pixels_per_cm=BIRDS_EYE_PIXELS_PER_CM,
+                 image_size=(CAMERA_WIDTH, CAMERA_HEIGHT), cache_dir=VISION_CACHE_DIR):
+        """
+        Initialize the view, loading the remap tables from the disk cache or
+        building them.
+
+        Args:
+            homography (numpy.ndarray): 3x3 floor (cm) to image pixel homography
+            roi_cm (tuple): Floor region (x_min, y_min, x_max, y_max) in cm
+            pixels_per_cm (float): Resolution of the bird's-eye view
+            image_size (tuple): (width, height) of camera frames
+            cache_dir (str): Directory for cached maps (None disables caching)
+        """
+        self.homography = np.asarray(homography, dtype=np.float64)
+        self.roi_cm = tuple(roi_cm)
+        self.pixels_per_cm = pixels_per_cm
+        self.image_size = tuple(image_size)
+        self.cache_dir = os.path.expanduser(cache_dir) if cache_dir else None
+        self.cell_size = GRID_CELL_SIZE_CM * pixels_per_cm  # Grid spacing in view pixels
+
+        x_min, y_min, x_max, y_max = self.roi_cm
+        self.width = int(round((x_max - x_min) * pixels_per_cm))
+        self.height = int(round((y_max - y_min) * pixels_per_cm))
+
+        # View pixel -> floor cm -> image pixel
+        view_to_floor = np.array([[1.0 / pixels_per_cm, 0.0, x_min],
+                                  [0.0, 1.0 / pixels_per_cm, y_min],
+                                  [0.0, 0.0, 1.0]])
+        self.view_to_image = self.homography @ view_to_floor
+        self.image_to_view = np.linalg.inv(self.view_to_image)
+
+        self.map1 = None
+        self.map2 = None
+        self.source_rect = None  # (x, y, w, h) of the camera frame the maps read from
+        self.remap_time = 0.0
+        self.remap_count = 0
+
+        start_time = time.time()
+        if self.load():
+            source = "loaded from cache"
+        else:
+            self.build()
+            self.save()
+            source = "built"
+        print(f"Bird's-eye maps {source}: {self.width}x{self.height} view "
+              f"in {(time.time() - start_time) * 1000:.1f}ms")
+
+    def cache_path(self):
+        """Cache file name, keyed by the calibration, region and resolution."""
+        key = (f"{BIRDS_EYE_MAP_VERSION}:{self.homography.round(9).tobytes().hex()}:"
+               f"{self.roi_cm!r}:{self.pixels_per_cm!r}:{self.image_size!r}")
+        digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"birds_eye_{self.width}x{self.height}_{digest}.npz")
+
+    def load(self):
+        """Load the maps from disk. Returns True on success."""
+        if not self.cache_dir:
+            return False
+        try:
+            with np.load(self.cache_path(), allow_pickle=False) as data:
+                self.map1 = data['map1']
+                self.map2 = data['map2']
+                self.source_rect = tuple(int(v) for v in data['source_rect'])
+            return True
+        except (OSError, KeyError, ValueError):
+            return False
+
+    def save(self):
+        """Write the maps to disk, ignoring failures (the cache is optional)."""
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            temp_path = self.cache_path() + '.tmp.npz'
+            np.savez(temp_path, map1=self.map1, map2=self.map2, source_rect=np.array(self.source_rect))
+            os.replace(temp_path, self.cache_path())
+        except OSError as e:
+            print(f"Bird's-eye cache warning: {e}")
+
+    def build(self):
+        """Compute the fixed-point remap tables for the region of interest."""
+        xs, ys = np.meshgrid(np.arange(self.width, dtype=np.float64), np.arange(self.height, dtype=np.float64))
+        points = np.stack([xs, ys, np.ones_like(xs)], axis=-1) @ self.view_to_image.T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            map_x = points[..., 0] / points[..., 2]
+            map_y = points[..., 1] / points[..., 2]
+        # Behind the camera (or at the horizon) there is no floor to sample
+        behind = ~(points[..., 2] > 0)
+        map_x[behind] = -1
+        map_y[behind] = -1
+
+        # Only the part of the frame the view samples needs to be read
+        image_width, image_height = self.image_size
+        inside = (map_x >= 0) & (map_x < image_width) & (map_y >= 0) & (map_y < image_height)
+        if inside.any():
+            x0 = int(np.floor(map_x[inside].min()))
+            y0 = int(np.floor(map_y[inside].min()))
+            x1 = min(int(np.ceil(map_x[inside].max())) + 2, image_width)
+            y1 = min(int(np.ceil(map_y[inside].max())) + 2, image_height)
+        else:
+            x0, y0, x1, y1 = 0, 0, image_width, image_height
+        self.source_rect = (x0, y0, x1 - x0, y1 - y0)
+
+        # Out-of-frame samples (and points behind the camera) are moved outside the
+        # source rectangle; warp() replicates its edge pixels there, so the view
+        # has no dark fill that could be mistaken for a grid line
+        map_x = np.where(np.isfinite(map_x), map_x - x0, -10.0).clip(-10, 32000).astype(np.float32)
+        map_y = np.where(np.isfinite(map_y), map_y - y0, -10.0).clip(-10, 32000).astype(np.float32)
+        self.map1, self.map2 = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+    def warp(self, image, dst=None):
+        """
+        Remap a camera frame (any channel count) to the bird's-eye view.
+
+        Args:
+            image (numpy.ndarray): Camera frame
+            dst (numpy.ndarray): Optional preallocated output of the view size
+        """
+        start_time = time.perf_counter()
+        x, y, w, h = self.source_rect
+        view = cv2.remap(image[y:y + h, x:x + w], self.map1, self.map2, cv2.INTER_LINEAR, dst=dst,
+                         borderMode=cv2.BORDER_REPLICATE)
+        self.remap_time += time.perf_counter() - start_time
+        self.remap_count += 1
+        return view
+
+    def average_remap_ms(self):
+        """Average per-frame cost of warp() so far, in milliseconds."""
+        return self.remap_time / self.remap_count * 1000 if self.remap_count else 0.0
+
+    def to_view(self, x, y):
+        """Map a camera pixel to bird's-eye view coordinates."""
+        point = self.image_to_view @ np.array([x, y, 1.0])
+        return point[0] / point[2], point[1] / point[2]
+
+    def to_image(self, x, y):
+        """Map a bird's-eye view pixel to camera coordinates."""
+        point = self.view_to_image @ np.array([x, y, 1.0])
+        return point[0] / point[2], point[1] / point[2]
+
+
+def load_birds_eye_view(path=BIRDS_EYE_CALIBRATION_FILE):
+    """Create the view from the stored floor calibration, or None if uncalibrated."""
+    homography = load_calibration(path)
+    if homography is None:
+        print(f"Warning: no bird's-eye calibration at {path}, using the camera view")
+        return None
+    return BirdsEyeView(homography)
@@ -3,18 +3,35 @@ Button controller for the robotic vehicle.
 Handles push button input for starting the robot and emergency stop.
 """
 
-import RPi.GPIO as GPIO
-import time
 from config import *
+from clock import REAL_CLOCK
+
+try:
+    import RPi.GPIO as GPIO
+except ImportError:
+    GPIO = None  # Off the Pi: pass a simulated backend (simulated_hardware.FakeGPIO)
 
 class ButtonController:
-    def __init__(self):
-        """Initialize the button controller."""
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setwarnings(False)
+    def __init__(self, gpio=None, clock=None):
+        """
+        Initialize the button controller.
+        
+        Args:
+            gpio: GPIO backend with the RPi.GPIO interface (default RPi.GPIO;
+                  simulated_hardware.FakeGPIO off the Pi)
+            clock: Clock for polling, debounce and press timing (default: wall clock)
+        """
+        if gpio is None:
+            if GPIO is None:
+                raise ImportError("RPi.GPIO is required to read the button")
+            gpio = GPIO
+        self.gpio = gpio
+        self.clock = clock or REAL_CLOCK
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setwarnings(False)
         
         # Set up start button pin
-        GPIO.setup(START_BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        self.gpio.setup(START_BUTTON_PIN, self.gpio.IN, pull_up_down=self.gpio.PUD_UP)
         
         # Button state tracking
         self.button_pressed = False
@@ -25,7 +42,7 @@ class ButtonController:
     
     def is_button_pressed(self):
         """Check if the start button is currently pressed."""
-        return GPIO.input(START_BUTTON_PIN) == GPIO.LOW
+        return self.gpio.input(START_BUTTON_PIN) == self.gpio.LOW
     
     def wait_for_button_press(self, timeout=None):
         """
@@ -40,34 +57,34 @@ class ButtonController:
         print("🤖 Robot ready! Press the START button to begin navigation...")
         print("   (Button is on GPIO 16)")
         
-        start_time = time.time()
+        start_time = self.clock.time()
         
         while True:
             # Check for button press
             if self.is_button_pressed():
-                current_time = time.time()
+                current_time = self.clock.time()
                 
                 # Debounce check
                 if current_time - self.last_press_time > BUTTON_DEBOUNCE_TIME:
                     self.last_press_time = current_time
                     self.button_pressed = True
                     print("🚀 START button pressed! Beginning navigation...")
-                    time.sleep(0.5)  # Brief delay to ensure clean press
+                    self.clock.sleep(0.5)  # Brief delay to ensure clean press
                     return True
             
             # Check timeout
-            if timeout and (time.time() - start_time) > timeout:
+            if timeout and (self.clock.time() - start_time) > timeout:
                 print(f"⏰ Timeout reached ({timeout}s). Starting automatically...")
                 return False
             
             # Small delay to prevent excessive CPU usage
-            time.sleep(0.01)
+            self.clock.sleep(0.01)
     
     def wait_for_button_release(self):
         """Wait for the button to be released."""
         while self.is_button_pressed():
-            time.sleep(0.01)
-        time.sleep(0.1)  # Additional debounce delay
+            self.clock.sleep(0.01)
+        self.clock.sleep(0.1)  # Additional debounce delay
     
     def check_emergency_stop(self):
         """
@@ -75,7 +92,7 @@ class ButtonController:
         Returns True if emergency stop is requested.
         """
         if self.is_button_pressed():
-            current_time = time.time()
+            current_time = self.clock.time()
             # Hold button for 2 seconds for emergency stop
             if current_time - self.last_press_time > 2.0:
                 print("🛑 EMERGENCY STOP activated!")
@@ -92,7 +109,7 @@ class ButtonController:
     
     def cleanup(self):
         """Clean up GPIO resources."""
-        GPIO.cleanup()
+        self.gpio.cleanup()
         print("Button controller cleaned up")
 
 def test_button():
@@ -115,7 +132,7 @@ def test_button():
                 print("Emergency stop detected!")
                 break
             
-            time.sleep(0.1)
+            button.clock.sleep(0.1)
     
     except KeyboardInterrupt:
         print("\nTest interrupted by user")
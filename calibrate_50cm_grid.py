@@ -4,7 +4,6 @@ This script helps determine the exact timing needed for your robot to move
 precisely one grid cell (50cm) with the geared motors.
 """
 
-import time
 from motor_controller import MotorController
 from config import *
 
@@ -36,14 +35,23 @@ def calculate_theoretical_timing():
     
     print()
 
-def test_50cm_movement():
-    """Test movement for exactly 50cm."""
+def test_50cm_movement(motor=None):
+    """
+    Test movement for exactly 50cm.
+    
+    Args:
+        motor (MotorController): Motors to drive (default: a new controller
+                                 on the GPIO, cleaned up afterwards); its
+                                 clock times the pauses
+    """
     print("=== 50cm Movement Calibration ===")
     print("This test will help you find the exact timing for 50cm movement.")
     print("Place your robot at the start of a 50cm distance and run the test.")
     print()
     
-    motor = MotorController()
+    owned = motor is None
+    if owned:
+        motor = MotorController()
     
     try:
         # Test different PWM speeds and times
@@ -75,7 +83,7 @@ def test_50cm_movement():
             else:
                 print("❌ Not quite right, trying next configuration...")
             
-            time.sleep(1)
+            motor.clock.sleep(1)
         
         print("\nNo perfect match found. You may need to adjust the configurations.")
         return None, None
@@ -84,15 +92,25 @@ def test_50cm_movement():
         print(f"Error during calibration: {e}")
         return None, None
     finally:
-        motor.cleanup()
+        if owned:
+            motor.cleanup()
 
-def test_turn_calibration():
-    """Test 90-degree turn calibration."""
+def test_turn_calibration(motor=None):
+    """
+    Test 90-degree turn calibration.
+    
+    Args:
+        motor (MotorController): Motors to drive (default: a new controller
+                                 on the GPIO, cleaned up afterwards); its
+                                 clock times the pauses
+    """
     print("=== 90-Degree Turn Calibration ===")
     print("This test will help you find the exact timing for 90-degree turns.")
     print()
     
-    motor = MotorController()
+    owned = motor is None
+    if owned:
+        motor = MotorController()
     
     try:
         turn_times = [1.5, 2.0, 2.5, 3.0, 3.5]
@@ -103,7 +121,7 @@ def test_turn_calibration():
             
             print("Turning left...")
             motor.turn_left(TURN_SPEED, turn_time)
-            time.sleep(1)
+            motor.clock.sleep(1)
             
             result = input("Was the turn approximately 90 degrees? (y/n/s for skip): ").lower()
             if result == 'y':
@@ -114,7 +132,7 @@ def test_turn_calibration():
             else:
                 print("❌ Not quite right, trying next timing...")
             
-            time.sleep(1)
+            motor.clock.sleep(1)
         
         print("\nNo perfect turn time found. You may need to adjust manually.")
         return None
@@ -123,7 +141,8 @@ def test_turn_calibration():
         print(f"Error during turn calibration: {e}")
         return None
     finally:
-        motor.cleanup()
+        if owned:
+            motor.cleanup()
 
 def update_config_file(forward_speed, forward_time, turn_time):
     """Update the config file with calibrated values."""
@@ -137,8 +156,15 @@ def update_config_file(forward_speed, forward_time, turn_time):
         print("Please update these values in config.py manually.")
         print("Or run this script again after updating the file.")
 
-def manual_50cm_test():
-    """Manual test for 50cm movement."""
+def manual_50cm_test(motor=None):
+    """
+    Manual test for 50cm movement.
+    
+    Args:
+        motor (MotorController): Motors to drive (default: a new controller
+                                 on the GPIO, cleaned up afterwards); its
+                                 clock times the pauses
+    """
     print("=== Manual 50cm Test ===")
     print("Commands:")
     print("w = move forward (current config)")
@@ -150,7 +176,9 @@ def manual_50cm_test():
     print("x = stop")
     print("quit = exit")
     
-    motor = MotorController()
+    owned = motor is None
+    if owned:
+        motor = MotorController()
     
     try:
         while True:
@@ -191,7 +219,8 @@ def manual_50cm_test():
     except Exception as e:
         print(f"Error during manual test: {e}")
     finally:
-        motor.cleanup()
+        if owned:
+            motor.cleanup()
 
 if __name__ == "__main__":
     print("=== 50cm Grid Calibration Tool ===")
@@ -0,0 +1,74 @@
+"""
+Floor calibration for the bird's-eye view.
+Place the robot on the grid facing along a grid line, then run this script.
+The floor-to-image homography is computed from the grid cell nearest the
+image center (or from four points entered by hand) and saved to
+BIRDS_EYE_CALIBRATION_FILE. Set BIRDS_EYE_ENABLED = True in config.py to use it.
+"""
+
+from camera_controller import CameraController
+from birds_eye import BirdsEyeView, calibrate_homography, calibrate_from_model, save_calibration
+from config import *
+
+def capture_calibration_image(camera):
+    """Capture a frame in the raw camera view."""
+    image = camera.capture_image()
+    if image is None:
+        print("Failed to capture image")
+        return None
+    camera.save_debug_image(image, "birds_eye_calibration_input.jpg")
+    return image
+
+def calibrate_automatic(camera, image):
+    """Calibrate from the grid detected in the image."""
+    detection = camera.detect_grid(image)
+    if detection['model'] is None:
+        print("No grid found in the image. Check lighting and camera position.")
+        return None
+    print(f"Grid detected with quality {detection['quality']:.2f}")
+    if detection['quality'] < GRID_DETECTION_THRESHOLD:
+        answer = input("Detection quality is low. Use it anyway? (y/n): ")
+        if answer.lower() != 'y':
+            return None
+    return calibrate_from_model(detection['model'])
+
+def calibrate_manual():
+    """Calibrate from four floor points entered by hand."""
+    print("Enter the pixel coordinates (x y) of the four corners of one grid cell,")
+    print("as seen in birds_eye_calibration_input.jpg:")
+    names = ["top-left", "top-right", "bottom-left", "bottom-right"]
+    image_points = []
+    for name in names:
+        x, y = input(f"  {name}: ").split()
+        image_points.append((float(x), float(y)))
+    size = GRID_CELL_SIZE_CM
+    return calibrate_homography(image_points, [(0, 0), (size, 0), (0, size), (size, size)])
+
+def verify_calibration(camera, image, homography):
+    """Save the bird's-eye view of the image and report the remap cost."""
+    view = BirdsEyeView(homography)
+    for _ in range(50):
+        warped = view.warp(image)
+    camera.save_debug_image(warped, "birds_eye_view.jpg")
+    print(f"Bird's-eye view: {view.width}x{view.height}, remap {view.average_remap_ms():.2f}ms per frame")
+    print("Check birds_eye_view.jpg: grid lines should be straight, parallel and evenly spaced")
+
+if __name__ == "__main__":
+    print("=== Bird's-Eye View Calibration ===")
+    camera = CameraController()
+    camera.birds_eye = None  # Calibrate in the raw camera view
+    
+    try:
+        image = capture_calibration_image(camera)
+        if image is not None:
+            choice = input("Choose calibration:\n1. Automatic (detected grid)\n2. Manual (enter cell corners)\nEnter choice (1-2): ")
+            homography = calibrate_automatic(camera, image) if choice == "1" else calibrate_manual()
+            if homography is None:
+                print("Calibration failed")
+            else:
+                save_calibration(homography)
+                verify_calibration(camera, image, homography)
+    except KeyboardInterrupt:
+        print("\nCalibration interrupted")
+    finally:
+        camera.cleanup()
@@ -6,18 +6,117 @@ import cv2
 import numpy as np
 import os
 import time
-from picamera2 import Picamera2
 from config import *
+from grid_model import fit_grid_model
+from birds_eye import load_birds_eye_view
+from grid_tracker import GridTracker, refine_grid_model, FRAME_PADDING
+from frame_buffers import FrameBufferPool, structuring_element
+from frame_quality import FrameQualityGate
+from detection_cache import DetectionCache
+from exposure_control import ExposureController
+from vision_workers import VisionWorkerPool
+from lazy_imports import lazy_import
+from clock import REAL_CLOCK
+
+# Loaded when the camera is opened (libcamera is slow to import); None for
+# offline use, processing recorded frames without a camera
+picamera2 = lazy_import('picamera2')
+
+LINE_DETECTORS = ('morphology', 'projection', 'hough')
 
 class CameraController:
-    def __init__(self):
-        """Initialize the camera controller."""
-        self.camera = Picamera2()
+    def __init__(self, line_detector=GRID_LINE_DETECTOR, use_camera=True, birds_eye=None, tracking=GRID_TRACKING,
+                 buffers=None, pyramid_levels=VISION_PYRAMID_LEVELS, cache=None, camera=None,
+                 exposure_control=EXPOSURE_CONTROL, clock=None, vision_workers=None):
+        """
+        Initialize the camera controller.
+        
+        Args:
+            line_detector (str): Grid line detector, one of LINE_DETECTORS
+            use_camera (bool): Open the Pi camera; False for processing
+                               recorded frames only
+            birds_eye (BirdsEyeView): Detect the grid in this bird's-eye view;
+                                      by default loaded from the floor
+                                      calibration when BIRDS_EYE_ENABLED
+            tracking (bool): Track locked grid lines between frames instead
+                             of running full detection on every frame
+            buffers (FrameBufferPool): Destination buffers for the vision
+                                       path; by default a new pool
+            pyramid_levels (int): Detect the grid on the frame halved this
+                                  many times, then refine the lines at full
+                                  resolution (0 = detect at full resolution)
+            cache (bool): Reuse the detection of an unchanged view; by
+                          default DETECTION_CACHE for the live camera and
+                          off for recorded frames
+            camera: Camera to use instead of opening the Pi camera, e.g.
+                    simulated_hardware.FakeCamera (implies use_camera)
+            exposure_control (bool): Drive exposure from the lores stream
+                                     instead of the camera's auto exposure
+            clock: Clock for the startup timings (default: wall clock)
+            vision_workers (bool): Detect frames given to submit_position in
+                                   a VisionWorkerPool instead of this
+                                   process; by default VISION_WORKER_POOL
+                                   for a camera and off for recorded frames
+        """
+        if line_detector not in LINE_DETECTORS:
+            print(f"Warning: unknown line detector '{line_detector}', using morphology")
+            line_detector = 'morphology'
+        self.line_detector = line_detector
+        
+        if pyramid_levels not in range(PYRAMID_MAX_LEVELS + 1):
+            print(f"Warning: pyramid levels must be 0-{PYRAMID_MAX_LEVELS}, detecting at full resolution")
+            pyramid_levels = 0
+        self.pyramid_levels = pyramid_levels
+        self.detection_scale = 2 ** pyramid_levels  # Full-resolution pixels per detection image pixel
+        
+        if birds_eye is None and BIRDS_EYE_ENABLED:
+            birds_eye = load_birds_eye_view()
+        self.birds_eye = birds_eye
+        self.tracker = GridTracker() if tracking else None
+        self.buffers = buffers if buffers is not None else FrameBufferPool()
+        self.quality_gate = FrameQualityGate()
+        if cache is None:
+            cache = DETECTION_CACHE and use_camera
+        self.detection_cache = DetectionCache() if cache else None
+        self.exposure = ExposureController() if exposure_control else None
+        
+        self.clock = clock or REAL_CLOCK
+        self.camera = None
+        self.startup_stats = None
+        if use_camera or camera is not None:
+            self._start_camera(camera)
+        
+        self.vision_pool = None
+        if vision_workers is None:
+            vision_workers = VISION_WORKER_POOL and (use_camera or camera is not None)
+        if vision_workers:
+            self._start_vision_pool()
+        
+        # Create image save directory if it doesn't exist
+        if SAVE_IMAGES and not os.path.exists(IMAGE_SAVE_PATH):
+            os.makedirs(IMAGE_SAVE_PATH)
+        
+        print(f"Camera controller initialized (line detector: {self.line_detector}, "
+              f"detection scale: 1/{self.detection_scale})")
+    
+    def _start_camera(self, camera=None):
+        """
+        Open, configure and start the camera, then wait until it is ready.
+        
+        Args:
+            camera: Camera to use instead of opening the Pi camera
+        """
+        start_time = self.clock.time()
+        if camera is None:
+            if picamera2 is None:
+                raise ImportError("picamera2 is required to use the camera")
+            camera = picamera2.Picamera2()
+        self.camera = camera
         
         # Configure camera for Pi Camera v1 (OV5647)
         self.camera_config = self.camera.create_still_configuration(
             main={"size": (CAMERA_WIDTH, CAMERA_HEIGHT), "format": "RGB888"},
-            lores={"size": (320, 240), "format": "YUV420"}
+            lores={"size": CAMERA_LORES_SIZE, "format": "YUV420"}
         )
         
         # Set sensor mode for optimal performance
@@ -30,56 +129,213 @@ class CameraController:
         
         self.camera.configure(self.camera_config)
         
-        # Set camera properties for better image quality
-        try:
-            # Wait for camera to stabilize
-            time.sleep(2)
-            
+        if self.exposure is not None:
+            # Manual exposure from the first frame, converged on the lores stream
+            controls = dict(self.exposure.controls(), AwbEnable=True)
+        else:
             # Set exposure and gain for Pi Camera v1
-            self.camera.set_controls({
+            controls = {
                 "ExposureTime": 50000,   # 50ms exposure (longer for better light)
                 "AnalogueGain": 2.0,     # Higher gain for better sensitivity
                 "DigitalGain": 1.0,      # No digital gain
                 "AeEnable": True,        # Enable auto exposure
                 "AwbEnable": True,      # Enable auto white balance
-            })
-            
-            # Give camera time to adjust
-            time.sleep(1)
-            
+            }
+        try:
+            self.camera.set_controls(controls)
         except Exception as e:
             print(f"Camera control warning: {e}")
             pass  # Some controls might not be available
         
         self.camera.start()
+        self.wait_until_ready(start_time)
+    
+    def wait_until_ready(self, start_time=None, timeout=CAMERA_READY_TIMEOUT,
+                         stable_frames=CAMERA_READY_STABLE_FRAMES):
+        """
+        Capture lores frames until the frame metadata shows the camera is
+        ready: frames arrive at the configured frame duration, white balance
+        has settled and exposure is on target (or auto exposure has locked).
         
-        # Create image save directory if it doesn't exist
-        if SAVE_IMAGES and not os.path.exists(IMAGE_SAVE_PATH):
-            os.makedirs(IMAGE_SAVE_PATH)
+        Args:
+            start_time (float): Clock time when startup began; the
+                                startup timings are measured from it
+            timeout (float): Seconds to wait at most
+            stable_frames (int): Consecutive frames that must pass all checks
+        
+        Returns:
+            bool: True if the camera became ready before the timeout
+        """
+        if start_time is None:
+            start_time = self.clock.time()
+        first_frame = None
+        previous = None
+        stable = 0
+        frames = 0
+        checks = {}
+        while self.clock.time() - start_time < timeout:
+            (lores,), metadata = self.camera.capture_arrays(["lores"])
+            frames += 1
+            if first_frame is None:
+                first_frame = self.clock.time() - start_time
+            self.adjust_exposure(lores, metadata)
+            checks = self._readiness_checks(metadata, previous)
+            previous = metadata
+            stable = stable + 1 if all(checks.values()) else 0
+            if stable >= stable_frames:
+                break
+        
+        ready = stable >= stable_frames
+        self.startup_stats = {
+            'first_frame_ms': None if first_frame is None else first_frame * 1000,
+            'ready_ms': (self.clock.time() - start_time) * 1000,
+            'frames': frames,
+            'ready': ready,
+        }
+        if ready:
+            print(f"Camera ready in {self.startup_stats['ready_ms']:.0f}ms "
+                  f"(first frame after {self.startup_stats['first_frame_ms']:.0f}ms, {frames} frames)")
+        else:
+            waiting = [name for name, passed in checks.items() if not passed]
+            print(f"Warning: camera not ready after {timeout:.1f}s ({frames} frames), "
+                  f"still waiting for: {', '.join(waiting) or 'frames'}")
+        self._log_startup()
+        return ready
+    
+    def _readiness_checks(self, metadata, previous):
+        """
+        Readiness checks on the metadata of one frame and the one before it.
+        
+        Returns:
+            dict: 'timing', 'white balance' and 'exposure', True when passed
+        """
+        checks = {'timing': False, 'white balance': True, 'exposure': True}
+        if previous is None:
+            return dict(checks, **{'white balance': False, 'exposure': False})
+        
+        # Frame interval a whole number of frame durations (frames may be dropped)
+        duration = metadata.get('FrameDuration')
+        if duration and 'SensorTimestamp' in metadata and 'SensorTimestamp' in previous:
+            frames = (metadata['SensorTimestamp'] - previous['SensorTimestamp']) / 1000 / duration
+            checks['timing'] = round(frames) >= 1 and abs(frames - round(frames)) <= CAMERA_READY_TIMING_TOLERANCE
+        else:
+            checks['timing'] = True  # No timing reported
+        
+        if 'ColourGains' in metadata and 'ColourGains' in previous:
+            change = np.abs(np.subtract(metadata['ColourGains'], previous['ColourGains'])) / np.maximum(previous['ColourGains'], 1e-6)
+            checks['white balance'] = bool(np.max(change) <= CAMERA_READY_AWB_TOLERANCE)
+        
+        if self.exposure is not None:
+            checks['exposure'] = self.exposure.converged
+        elif 'AeLocked' in metadata:
+            checks['exposure'] = bool(metadata['AeLocked'])
+        elif 'ExposureTime' in metadata and 'ExposureTime' in previous:
+            exposure = metadata['ExposureTime'] * metadata.get('AnalogueGain', 1.0)
+            previous_exposure = previous['ExposureTime'] * previous.get('AnalogueGain', 1.0)
+            checks['exposure'] = abs(exposure - previous_exposure) <= CAMERA_READY_AE_TOLERANCE * max(previous_exposure, 1)
+        return checks
+    
+    def _log_startup(self):
+        """Append the startup timings to CAMERA_STARTUP_LOG and compare with earlier starts."""
+        stats = self.startup_stats
+        path = os.path.expanduser(CAMERA_STARTUP_LOG)
+        try:
+            earlier = []
+            if os.path.exists(path):
+                with open(path) as log:
+                    earlier = [float(line.split(',')[2]) for line in log.readlines()[1:] if line.strip()]
+            else:
+                os.makedirs(os.path.dirname(path) or '.', mode=0o700, exist_ok=True)
+                with open(path, 'w') as log:
+                    log.write("time,first_frame_ms,ready_ms,frames,ready\n")
+            with open(path, 'a') as log:
+                first_frame = '' if stats['first_frame_ms'] is None else f"{stats['first_frame_ms']:.1f}"
+                log.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')},{first_frame},{stats['ready_ms']:.1f},"
+                          f"{stats['frames']},{int(stats['ready'])}\n")
+        except (OSError, ValueError, IndexError) as e:
+            print(f"Camera startup log warning: {e}")
+            return
+        if earlier:
+            print(f"Camera startup: {stats['ready_ms']:.0f}ms, median of {len(earlier[-20:])} earlier starts "
+                  f"{np.median(earlier[-20:]):.0f}ms")
+    
+    def _start_vision_pool(self):
+        """Start the vision worker pool; detection stays in this process if it cannot start."""
+        try:
+            self.vision_pool = VisionWorkerPool(line_detector=self.line_detector, pyramid_levels=self.pyramid_levels)
+        except (OSError, ValueError) as e:
+            print(f"Warning: vision worker pool unavailable ({e}), detecting in-process")
+            self.vision_pool = None
+    
+    def _lores_luma(self, lores):
+        """Y (luminance) plane of a YUV420 lores array: its top part."""
+        lores_width, lores_height = CAMERA_LORES_SIZE
+        return lores[:lores_height, :lores_width]
+    
+    def adjust_exposure(self, lores, metadata=None):
+        """
+        Feed a lores frame to the exposure controller and apply its new
+        controls, if any.
         
-        print("Camera controller initialized")
+        Args:
+            lores (numpy.ndarray): YUV420 lores array
+            metadata (dict): Metadata of the frame's capture request
+        """
+        if self.exposure is None or self.camera is None:
+            return
+        controls = self.exposure.update(self._lores_luma(lores), metadata)
+        if controls is not None:
+            try:
+                self.camera.set_controls(controls)
+            except Exception as e:
+                print(f"Camera control warning: {e}")
+    
+    def set_moving(self, moving):
+        """
+        Tell the exposure controller whether the robot is moving, which caps
+        the exposure time to limit motion blur.
+        """
+        if self.exposure is None or self.camera is None:
+            return
+        controls = self.exposure.set_moving(moving)
+        if controls is not None:
+            try:
+                self.camera.set_controls(controls)
+            except Exception as e:
+                print(f"Camera control warning: {e}")
     
     def capture_image(self):
-        """Capture an image from the camera."""
+        """
+        Capture an image from the camera (a pooled buffer, valid until the
+        next capture).
+        
+        Frames that the quality gate rejects on the lores stream (too dark,
+        overexposed or blurred) are skipped and the next frame is captured,
+        up to FRAME_QUALITY_MAX_RETRIES times; after that the last one is used.
+        """
         try:
-            # Wait for camera to stabilize
-            time.sleep(0.5)
-            
-            # Capture image
-            image = self.camera.capture_array()
+            for attempt in range(FRAME_QUALITY_MAX_RETRIES + 1):
+                # Main and lores frames of the same capture request
+                (image, lores), metadata = self.camera.capture_arrays(["main", "lores"])
+                if image is None or image.size == 0:
+                    break
+                
+                self.adjust_exposure(lores, metadata)
+                accepted, reason, metrics = self.quality_gate.check(self._lores_luma(lores))
+                if accepted:
+                    break
+                print(f"Skipping {reason} frame (brightness {metrics['brightness']:.0f}, "
+                      f"clipped {metrics['clipped']:.0%}, sharpness {metrics['sharpness']:.0f})")
+            else:
+                print("Warning: no frame passed the quality gate, using the last one")
+                self.quality_gate.use_anyway(reason, metrics)
+                if reason == 'dark':
+                    print("Try improving lighting or camera settings")
             
-            # Check if image is valid (not all black)
+            # Check if image is valid (not empty)
             if image is not None and image.size > 0:
                 # Convert from RGB to BGR for OpenCV
-                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-                
-                # Check if image is too dark
-                mean_brightness = np.mean(image)
-                if mean_brightness < 10:  # Very dark image
-                    print(f"Warning: Image is very dark (brightness: {mean_brightness:.1f})")
-                    print("Try improving lighting or camera settings")
-                
-                return image
+                return cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=self.buffers.get('frame', image.shape))
             else:
                 print("Error: Captured image is None or empty")
                 return None
@@ -88,37 +344,92 @@ class CameraController:
             print(f"Error capturing image: {e}")
             return None
     
+    def detector_gray(self, image):
+        """Grayscale frame in the detector's coordinates (a pooled buffer)."""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self.buffers.get('gray', image.shape[:2]))
+        
+        # Warp the floor region to the bird's-eye view (grid becomes a regular lattice)
+        if self.birds_eye is not None:
+            view = self.birds_eye
+            gray = view.warp(gray, dst=self.buffers.get('view', (view.height, view.width)))
+        return gray
+    
     def preprocess_image(self, image):
-        """Preprocess the image for grid detection."""
+        """
+        Preprocess the image for grid detection (a pooled buffer, valid until
+        the next frame). In pyramid mode the result is at the detection scale.
+        """
         if image is None:
             return None
         
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Apply Gaussian blur to reduce noise
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        # Convert to grayscale (in the bird's-eye view if enabled)
+        return self.threshold_image(self.detector_gray(image))
+    
+    def threshold_image(self, gray):
+        """Threshold a grayscale frame at the detection scale (lines become foreground)."""
+        if self.pyramid_levels:
+            # pyrDown low-pass filters before decimating, so no extra blur is needed
+            blurred = self.downscale(gray)
+        else:
+            # Apply Gaussian blur to reduce noise
+            blurred = cv2.GaussianBlur(gray, (5, 5), 0, dst=self.buffers.get('blurred', gray.shape))
         
-        # Apply adaptive thresholding
+        # Apply adaptive thresholding (inverted: dark tape lines become foreground)
         thresh = cv2.adaptiveThreshold(
-            blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
+            blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2,
+            dst=self.buffers.get('thresh', blurred.shape)
         )
         
         return thresh
     
-    def detect_grid_lines(self, image):
-        """Detect grid lines in the image using Hough line detection."""
+    def downscale(self, gray):
+        """Halve a frame pyramid_levels times with cv2.pyrDown (pooled buffers)."""
+        for level in range(self.pyramid_levels):
+            height, width = gray.shape[:2]
+            size = ((width + 1) // 2, (height + 1) // 2)
+            gray = cv2.pyrDown(gray, dst=self.buffers.get(f'pyramid{level}', size[::-1]), dstsize=size)
+        return gray
+    
+    def _pixels(self, length):
+        """A length in full-resolution pixels at the detection scale."""
+        return max(1, int(round(length / self.detection_scale)))
+    
+    def detect_grid_lines(self, image, oriented=False):
+        """
+        Detect grid lines in the image with the selected line detector.
+        
+        Args:
+            image: Thresholded image with lines as foreground
+            oriented (bool): Return segments along each line (x1, y1, x2, y2)
+                             fitted to its pixels instead of bounding boxes
+        
+        Returns:
+            tuple: (h_lines, v_lines)
+        """
         if image is None:
             return [], []
         
+        if self.line_detector == 'hough':
+            return self.detect_grid_lines_hough(image, oriented)
+        if self.line_detector == 'projection':
+            lines = self.detect_grid_lines_projection(image, oriented)
+            if lines is not None:
+                return lines
+            # Profiles have no sharp peaks: grid is rotated, use the general detector
+        return self.detect_grid_lines_morphology(image, oriented)
+    
+    def detect_grid_lines_morphology(self, image, oriented=False):
+        """Detect grid lines using morphological filtering (any small rotation)."""
         try:
             # Detect horizontal lines
-            horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (25, 1))
-            horizontal_lines = cv2.morphologyEx(image, cv2.MORPH_OPEN, horizontal_kernel)
+            horizontal_kernel = structuring_element(cv2.MORPH_RECT, (self._pixels(25), 1))
+            horizontal_lines = cv2.morphologyEx(image, cv2.MORPH_OPEN, horizontal_kernel,
+                                                dst=self.buffers.get('horizontal', image.shape))
             
             # Detect vertical lines
-            vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 25))
-            vertical_lines = cv2.morphologyEx(image, cv2.MORPH_OPEN, vertical_kernel)
+            vertical_kernel = structuring_element(cv2.MORPH_RECT, (1, self._pixels(25)))
+            vertical_lines = cv2.morphologyEx(image, cv2.MORPH_OPEN, vertical_kernel,
+                                              dst=self.buffers.get('vertical', image.shape))
             
             # Find contours for horizontal lines
             h_contours, _ = cv2.findContours(horizontal_lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -126,8 +437,8 @@ class CameraController:
             for contour in h_contours:
                 if len(contour) > 0:  # Check if contour is valid
                     x, y, w, h = cv2.boundingRect(contour)
-                    if w > MIN_LINE_LENGTH:  # Filter short lines
-                        h_lines.append((x, y, x + w, y + h))
+                    if w > self._pixels(MIN_LINE_LENGTH):  # Filter short lines
+                        h_lines.append(self._fit_segment(contour) if oriented else (x, y, x + w, y + h))
             
             # Find contours for vertical lines
             v_contours, _ = cv2.findContours(vertical_lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -135,8 +446,8 @@ class CameraController:
             for contour in v_contours:
                 if len(contour) > 0:  # Check if contour is valid
                     x, y, w, h = cv2.boundingRect(contour)
-                    if h > MIN_LINE_LENGTH:  # Filter short lines
-                        v_lines.append((x, y, x + w, y + h))
+                    if h > self._pixels(MIN_LINE_LENGTH):  # Filter short lines
+                        v_lines.append(self._fit_segment(contour) if oriented else (x, y, x + w, y + h))
             
             return h_lines, v_lines
             
@@ -144,6 +455,138 @@ class CameraController:
             print(f"Error in grid line detection: {e}")
             return [], []
     
+    def detect_grid_lines_hough(self, image, oriented=False):
+        """
+        Detect grid lines at any rotation with the probabilistic Hough transform.
+        
+        Segments are split into the grid's two perpendicular line families;
+        the family closer to the image x axis is returned as horizontal.
+        """
+        try:
+            # Remove threshold speckle, then vote with line edges only: every
+            # foreground pixel of a thick line would vote otherwise. At coarse
+            # pyramid scales the lines are only a pixel or two wide and vote as they are.
+            edges = image
+            if self.detection_scale == 1:
+                speckle_kernel = structuring_element(cv2.MORPH_RECT, (3, 3))
+                opened = cv2.morphologyEx(image, cv2.MORPH_OPEN, speckle_kernel,
+                                          dst=self.buffers.get('opened', image.shape))
+                edges = cv2.Canny(opened, 50, 150, edges=self.buffers.get('edges', image.shape))
+            segments = cv2.HoughLinesP(edges, 1, np.pi / 180, self._pixels(LINE_DETECTION_THRESHOLD),
+                                       minLineLength=self._pixels(MIN_LINE_LENGTH),
+                                       maxLineGap=self._pixels(MAX_LINE_GAP))
+            if segments is None:
+                return [], []
+            segments = segments.reshape(-1, 4).astype(float)
+            
+            # Dominant grid orientation: quadrupling the angles maps both
+            # perpendicular families (and both segment directions) onto one
+            # angle, so a length-weighted circular mean finds it
+            dx = segments[:, 2] - segments[:, 0]
+            dy = segments[:, 3] - segments[:, 1]
+            angles = np.arctan2(dy, dx)
+            lengths = np.hypot(dx, dy)
+            grid_angle = np.angle(np.sum(lengths * np.exp(4j * angles))) / 4
+            
+            # Family membership: angle from the grid orientation, modulo 180 degrees
+            offsets = np.angle(np.exp(2j * (angles - grid_angle))) / 2
+            first = np.abs(offsets) < np.radians(HOUGH_ANGLE_TOLERANCE)
+            second = np.abs(np.abs(offsets) - np.pi / 2) < np.radians(HOUGH_ANGLE_TOLERANCE)
+            if abs(np.cos(grid_angle)) < abs(np.sin(grid_angle)):
+                first, second = second, first
+            
+            h_lines = [self._segment_output(segment, 0, oriented) for segment in segments[first]]
+            v_lines = [self._segment_output(segment, 1, oriented) for segment in segments[second]]
+            return h_lines, v_lines
+            
+        except Exception as e:
+            print(f"Error in Hough line detection: {e}")
+            return [], []
+    
+    def _segment_output(self, segment, axis, oriented):
+        """Segment ordered along the axis (0 = x, 1 = y), or its bounding box."""
+        x1, y1, x2, y2 = segment
+        if not oriented:
+            return (int(min(x1, x2)), int(min(y1, y2)), int(max(x1, x2)), int(max(y1, y2)))
+        if (x1, y1)[axis] > (x2, y2)[axis]:
+            x1, y1, x2, y2 = x2, y2, x1, y1
+        return (float(x1), float(y1), float(x2), float(y2))
+    
+    def detect_grid_lines_projection(self, image, oriented=False):
+        """
+        Detect axis-aligned grid lines from the row and column sums of the
+        thresholded image (projection profiles).
+        
+        Returns:
+            tuple: (h_lines, v_lines) like detect_grid_lines, or None when the
+                   profiles show no sharp peaks (grid rotated or not visible)
+        """
+        row_profile = cv2.reduce(image, 1, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel() / 255
+        col_profile = cv2.reduce(image, 0, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel() / 255
+        h_bands = self._find_profile_peaks(row_profile)
+        v_bands = self._find_profile_peaks(col_profile)
+        if h_bands is None or v_bands is None:
+            return None
+        
+        h_lines = []
+        for start, end in h_bands:
+            columns = np.flatnonzero(image[start:end].any(axis=0))
+            y = (start + end - 1) / 2
+            if oriented:
+                h_lines.append((float(columns[0]), y, float(columns[-1]), y))
+            else:
+                h_lines.append((int(columns[0]), start, int(columns[-1]) + 1, end))
+        
+        v_lines = []
+        for start, end in v_bands:
+            rows = np.flatnonzero(image[:, start:end].any(axis=1))
+            x = (start + end - 1) / 2
+            if oriented:
+                v_lines.append((x, float(rows[0]), x, float(rows[-1])))
+            else:
+                v_lines.append((start, int(rows[0]), end, int(rows[-1]) + 1))
+        
+        return h_lines, v_lines
+    
+    def _find_profile_peaks(self, profile):
+        """
+        Find the line bands in a projection profile.
+        
+        Returns:
+            list: (start, end) pixel ranges, one per line, or None if fewer
+                  than two lines stand out or a peak is too wide for an
+                  axis-aligned line
+        """
+        baseline = np.median(profile)
+        height = profile.max() - baseline
+        if height < self._pixels(MIN_LINE_LENGTH):
+            return None
+        
+        # Runs of the profile above the peak threshold
+        above = np.concatenate(([False], profile > baseline + PROJECTION_PEAK_RATIO * height, [False]))
+        runs = np.flatnonzero(np.diff(above.astype(np.int8))).reshape(-1, 2)
+        if (runs[:, 1] - runs[:, 0]).max() > self._pixels(PROJECTION_MAX_LINE_WIDTH):
+            return None
+        
+        # Merge runs that are the two edges of one thick line
+        bands = []
+        for start, end in runs:
+            if bands and start - bands[-1][1] <= self._pixels(PROJECTION_MERGE_DISTANCE):
+                bands[-1][1] = end
+            else:
+                bands.append([start, end])
+        if len(bands) < 2:
+            return None
+        return [(int(start), int(end)) for start, end in bands]
+    
+    def _fit_segment(self, contour):
+        """Least-squares line through a contour, clipped to its extent."""
+        points = contour.reshape(-1, 2).astype(np.float32)
+        vx, vy, x0, y0 = cv2.fitLine(points, cv2.DIST_L2, 0, 0.01, 0.01).ravel()
+        t = (points[:, 0] - x0) * vx + (points[:, 1] - y0) * vy
+        return (float(x0 + vx * t.min()), float(y0 + vy * t.min()),
+                float(x0 + vx * t.max()), float(y0 + vy * t.max()))
+    
     def find_grid_intersections(self, h_lines, v_lines):
         """Find intersections between horizontal and vertical lines."""
         intersections = []
@@ -173,113 +616,259 @@ class CameraController:
         
         return intersections
     
-    def detect_grid_cells(self, image):
-        """Detect grid cells and return their positions."""
+    def detect_grid(self, image):
+        """
+        Detect grid cells and score how trustworthy the detection is.
+        
+        Returns:
+            dict: 'cells' (list of cell dicts), 'quality' (0-1 overall score),
+                  'metrics' (the individual scores), 'fallback' (True when
+                  the cells were fabricated by simple_grid_detection) and
+                  'model' (the fitted GridModel, or None); detections
+                  reused from the cache have metrics['cached'] set
+        """
+        cache = self.detection_cache
+        if cache is None or image is None:
+            return self.detect_grid_uncached(image)
+        
+        cached, thumb = cache.lookup(image)
+        if cached is not None:
+            return dict(cached, metrics=dict(cached['metrics'], cached=True))
+        start_time = time.perf_counter()
+        detection = self.detect_grid_uncached(image)
+        # Only trustworthy detections; a poor one should be retried on the next frame
+        if not detection['fallback'] and detection['quality'] >= GRID_DETECTION_THRESHOLD:
+            cache.store(thumb, detection, time.perf_counter() - start_time)
+        return detection
+    
+    def detect_grid_uncached(self, image):
+        """Detect the grid, tracking the locked lines if possible (see detect_grid)."""
+        tracker = self.tracker
+        if tracker is not None and tracker.locked and image is not None and not tracker.needs_full_detection():
+            detection = self.track_grid(image)
+            if detection is not None:
+                return detection
+        
+        detection = self.detect_grid_full(image)
+        if tracker is None:
+            return detection
+        tracker.full_detection_done()
+        if detection['model'] is not None and detection['quality'] >= GRID_DETECTION_THRESHOLD:
+            # Fuse the detected lines into the line tracks and report the smoothed grid
+            width, height = self.frame_geometry()[:2]
+            model = tracker.lock(detection['model'], width, height)
+            detection['model'] = model
+            detection['cells'] = model.cells(width, height)
+        elif tracker.locked and image is not None:
+            # One poor frame should not lose the grid; the tracks may still find it
+            tracked = self.track_grid(image)
+            if tracked is not None:
+                return tracked
+        return detection
+    
+    def track_grid(self, image):
+        """
+        Predict the locked grid lines and re-find them in small windows
+        around the prediction.
+        
+        Returns:
+            dict: Detection like detect_grid, or None if the lock was lost
+        """
+        gray = self.detector_gray(image)
+        pad = 2 * FRAME_PADDING
+        tracked = self.tracker.track(gray, self.buffers.get('padded', (gray.shape[0] + pad, gray.shape[1] + pad)))
+        if tracked is not None:
+            model, h_lines, v_lines = tracked
+            cells = model.cells(gray.shape[1], gray.shape[0])
+            quality, metrics = self.score_grid_detection(h_lines, v_lines, cells, model)
+            if quality >= GRID_DETECTION_THRESHOLD:
+                self.tracker.stats['tracked'] += 1
+                metrics['tracked'] = True
+                return {'cells': cells, 'quality': quality, 'metrics': metrics, 'fallback': False, 'model': model}
+        print("Grid tracking lost, running full detection")
+        self.tracker.unlock()
+        return None
+    
+    def note_motion(self, command):
+        """Tell the grid tracker and the detection cache about an executed motion command."""
+        # One cell forward maps the grid onto itself, so an unchanged-looking
+        # view after a move may still be a different cell
+        if self.detection_cache is not None:
+            self.detection_cache.clear()
+        if self.tracker is not None:
+            self.tracker.predict(command)
+    
+    def detect_grid_full(self, image):
+        """Detect grid cells in the whole frame (see detect_grid)."""
         try:
+            if image is None:
+                return {'cells': [], 'quality': 0.0, 'metrics': {}, 'fallback': False, 'model': None}
+            
             # Preprocess image
-            processed = self.preprocess_image(image)
-            if processed is None:
-                return []
+            gray = self.detector_gray(image)
+            processed = self.threshold_image(gray)
             
-            # Detect grid lines
-            h_lines, v_lines = self.detect_grid_lines(processed)
+            # Detect grid line segments
+            h_lines, v_lines = self.detect_grid_lines(processed, oriented=True)
             print(f"Detected {len(h_lines)} horizontal lines and {len(v_lines)} vertical lines")
             
-            # Find intersections
-            intersections = self.find_grid_intersections(h_lines, v_lines)
-            print(f"Found {len(intersections)} intersections")
-            
-            # Filter intersections to reduce noise (keep only well-spaced ones)
-            if len(intersections) > 100:  # Too many intersections, filter them
-                print("Too many intersections, filtering...")
-                filtered_intersections = []
-                min_distance = 20  # Minimum distance between intersections
-                
-                for intersection in intersections:
-                    too_close = False
-                    for existing in filtered_intersections:
-                        distance = ((intersection[0] - existing[0]) ** 2 + (intersection[1] - existing[1]) ** 2) ** 0.5
-                        if distance < min_distance:
-                            too_close = True
-                            break
-                    if not too_close:
-                        filtered_intersections.append(intersection)
-                
-                intersections = filtered_intersections
-                print(f"Filtered to {len(intersections)} intersections")
-        
-            # Group intersections into grid cells
-            cells = []
-            if len(intersections) >= 4:  # Need at least 4 corners for a cell
-                print(f"Processing {len(intersections)} intersections...")
-                
-                # Sort intersections by position
-                intersections.sort(key=lambda x: (x[1], x[0]))  # Sort by Y, then X
-                print("Intersections sorted")
-                
-                # Group into rows and columns
-                rows = []
-                current_row = []
-                last_y = intersections[0][1] if intersections else 0
-                print(f"Starting with last_y: {last_y}")
-                
-                for idx, (x, y) in enumerate(intersections):
-                    print(f"Processing intersection {idx}: ({x}, {y})")
-                    if abs(y - last_y) > 10:  # New row
-                        if current_row:
-                            rows.append(sorted(current_row, key=lambda p: p[0]))
-                            print(f"Added row with {len(current_row)} points")
-                        current_row = [(x, y)]
-                    else:
-                        current_row.append((x, y))
-                    last_y = y
-                
-                if current_row:
-                    rows.append(sorted(current_row, key=lambda p: p[0]))
-                    print(f"Added final row with {len(current_row)} points")
-                
-                print(f"Total rows: {len(rows)}")
-                for i, row in enumerate(rows):
-                    print(f"Row {i}: {len(row)} points")
-                
-                # Create grid cells from intersections
-                print("Creating grid cells...")
-                for i in range(len(rows) - 1):
-                    print(f"Processing row {i}...")
-                    # Find the minimum number of points between current and next row
-                    min_points = min(len(rows[i]), len(rows[i + 1]))
-                    print(f"  Row {i} has {len(rows[i])} points, row {i+1} has {len(rows[i+1])} points")
-                    print(f"  Using {min_points} points for cell creation")
-                    
-                    for j in range(min_points - 1):
-                        print(f"  Processing cell at row {i}, col {j}")
-                        if j < len(rows[i]) and j < len(rows[i + 1]) and j + 1 < len(rows[i]) and j + 1 < len(rows[i + 1]):
-                            print(f"    Accessing rows[{i}][{j}] and rows[{i+1}][{j}]")
-                            top_left = rows[i][j]
-                            top_right = rows[i][j + 1]
-                            bottom_left = rows[i + 1][j]
-                            bottom_right = rows[i + 1][j + 1]
-                            
-                            cell_center_x = (top_left[0] + top_right[0] + bottom_left[0] + bottom_right[0]) // 4
-                            cell_center_y = (top_left[1] + top_right[1] + bottom_left[1] + bottom_right[1]) // 4
-                            
-                            cells.append({
-                                'center': (cell_center_x, cell_center_y),
-                                'corners': [top_left, top_right, bottom_left, bottom_right],
-                                'row': i,
-                                'col': j
-                            })
-                            print(f"    Created cell at ({cell_center_x}, {cell_center_y})")
-                        else:
-                            print(f"    Skipping cell - insufficient points in rows")
-            
-            print(f"Returning {len(cells)} cells")
-            return cells
+            # Fit the lattice model and compute cell corners from it
+            if self.pyramid_levels:
+                model, h_lines, v_lines = self.refine_pyramid_detection(gray, h_lines, v_lines)
+            else:
+                model = fit_grid_model(h_lines, v_lines)
+            cells = model.cells(gray.shape[1], gray.shape[0]) if model is not None else []
+            quality, metrics = self.score_grid_detection(h_lines, v_lines, cells, model)
+            print(f"Returning {len(cells)} cells (quality {quality:.2f})")
+            return {'cells': cells, 'quality': quality, 'metrics': metrics, 'fallback': False, 'model': model}
         
         except Exception as e:
             print(f"Error in grid detection: {e}")
             print("Trying simplified grid detection...")
-            return self.simple_grid_detection(image)
+            # The fallback grid does not come from the image, so it carries no confidence
+            return {'cells': self.simple_grid_detection(image), 'quality': 0.0, 'metrics': {}, 'fallback': True,
+                    'model': None}
+    
+    def refine_pyramid_detection(self, gray, h_lines, v_lines):
+        """
+        Fit the lattice to lines detected at the pyramid scale and refine
+        every line in small full-resolution windows around its coarse position.
+        
+        Args:
+            gray (numpy.ndarray): Full-resolution frame
+            h_lines (list): Oriented segments found at the detection scale
+            v_lines (list): Oriented segments found at the detection scale
+        
+        Returns:
+            tuple: (GridModel or None, h_lines, v_lines) with the segments in
+                   full-resolution coordinates
+        """
+        # Pixel centers: detection pixel i covers full-resolution pixels [i * scale, (i + 1) * scale)
+        scale = self.detection_scale
+        h_lines = [tuple((value + 0.5) * scale - 0.5 for value in line) for line in h_lines]
+        v_lines = [tuple((value + 0.5) * scale - 0.5 for value in line) for line in v_lines]
+        coarse = fit_grid_model(h_lines, v_lines, tolerance=max(6.0, 2.0 * scale))
+        if coarse is None:
+            return None, h_lines, v_lines
+        
+        pad = 2 * FRAME_PADDING
+        refined = refine_grid_model(gray, coarse, band=max(TRACKING_BAND, 2 * scale),
+                                    buffer=self.buffers.get('padded', (gray.shape[0] + pad, gray.shape[1] + pad)))
+        if refined is None:
+            print("Pyramid refinement failed, using the coarse grid")
+            return coarse, h_lines, v_lines
+        model, h_segments, v_segments = refined
+        return model, list(map(tuple, h_segments)), list(map(tuple, v_segments))
+    
+    def frame_geometry(self):
+        """
+        Geometry of the frames the detector works on.
+        
+        Returns:
+            tuple: (width, height, grid cell size in pixels, (x, y) of the
+                   camera image center), in bird's-eye view pixels when the
+                   view is enabled
+        """
+        if self.birds_eye is None:
+            return CAMERA_WIDTH, CAMERA_HEIGHT, GRID_CELL_SIZE, (CAMERA_WIDTH / 2, CAMERA_HEIGHT / 2)
+        center = self.birds_eye.to_view(CAMERA_WIDTH / 2, CAMERA_HEIGHT / 2)
+        return self.birds_eye.width, self.birds_eye.height, self.birds_eye.cell_size, center
+    
+    def detect_grid_cells(self, image):
+        """Detect grid cells and return their positions."""
+        return self.detect_grid(image)['cells']
+    
+    def score_grid_detection(self, h_lines, v_lines, cells, model=None):
+        """
+        Score a grid detection from 0 (unusable) to 1 (clean lattice).
+        
+        Combines how many lines were found, how regular their spacing is and
+        how well they fit an evenly spaced lattice. When a fitted GridModel is
+        given, its residual replaces the evenly-spaced fit (it allows for
+        perspective).
+        
+        Returns:
+            tuple: (quality, dict of individual metrics)
+        """
+        h_positions = self._cluster_positions([(line[1] + line[3]) / 2 for line in h_lines])
+        v_positions = self._cluster_positions([(line[0] + line[2]) / 2 for line in v_lines])
+        
+        # Line count: need at least two lines per direction for a cell, and
+        # far more lines than the view can hold means noise was picked up
+        width, height, cell_size, (center_x, center_y) = self.frame_geometry()
+        count_score = 1.0
+        for positions, extent in ((h_positions, height), (v_positions, width)):
+            expected = extent / cell_size + 1
+            if len(positions) < 2:
+                count_score *= len(positions) / 2
+            elif len(positions) > 2 * expected:
+                count_score *= 2 * expected / len(positions)
+        
+        regularity_scores = []
+        residual_scores = []
+        for positions in (h_positions, v_positions):
+            regularity, residual = self._lattice_fit(positions)
+            regularity_scores.append(regularity)
+            residual_scores.append(residual)
+        regularity_score = float(np.sqrt(regularity_scores[0] * regularity_scores[1]))
+        residual_score = float(np.sqrt(residual_scores[0] * residual_scores[1]))
+        
+        if model is not None:
+            spacing = min(model.horizontal.spacing(center_x, center_y), model.vertical.spacing(center_x, center_y))
+            residual_score = max(0.0, 1.0 - 2.0 * model.residual() / spacing) if spacing > 0 else 0.0
+            residual_score = float(residual_score)
+            # Under perspective the spacing legitimately varies, so only the
+            # model residual is meaningful
+            regularity_score = max(regularity_score, residual_score)
+        
+        quality = (count_score * regularity_score * residual_score) ** (1 / 3) if cells else 0.0
+        metrics = {
+            'h_lines': len(h_positions),
+            'v_lines': len(v_positions),
+            'cells': len(cells),
+            'count_score': count_score,
+            'regularity_score': regularity_score,
+            'residual_score': residual_score,
+            'model_residual_px': model.residual() if model is not None else None,
+        }
+        return float(quality), metrics
+    
+    def _cluster_positions(self, positions, tolerance=10):
+        """Merge line positions closer than the tolerance (fragments of one line)."""
+        clusters = []
+        for position in sorted(positions):
+            if clusters and position - clusters[-1][-1] <= tolerance:
+                clusters[-1].append(position)
+            else:
+                clusters.append([position])
+        return [sum(cluster) / len(cluster) for cluster in clusters]
+    
+    def _lattice_fit(self, positions):
+        """
+        Fit evenly spaced lines to sorted positions.
+        
+        Returns:
+            tuple: (regularity score, residual score), both 0-1
+        """
+        if len(positions) < 3:
+            return (0.5, 0.5) if len(positions) == 2 else (0.0, 0.0)
+        
+        positions = np.array(positions)
+        spacings = np.diff(positions)
+        spacing = np.median(spacings)
+        if spacing <= 0:
+            return 0.0, 0.0
+        
+        # Regularity: spread of the spacings relative to their median
+        regularity = max(0.0, 1.0 - float(np.std(spacings) / spacing))
+        
+        # Residual: distance of each line from the fitted lattice, with missing
+        # lines allowed by rounding to the nearest lattice index
+        indices = np.round((positions - positions[0]) / spacing)
+        slope, offset = np.polyfit(indices, positions, 1)
+        rms = float(np.sqrt(np.mean((positions - (slope * indices + offset)) ** 2)))
+        residual = max(0.0, 1.0 - 2.0 * rms / spacing)
+        return regularity, residual
     
     def simple_grid_detection(self, image):
         """Simplified grid detection that's more robust."""
@@ -318,20 +907,72 @@ class CameraController:
     
     def get_vehicle_position(self, image):
         """Estimate vehicle position relative to the grid."""
-        cells = self.detect_grid_cells(image)
+        row, col, _ = self.get_vehicle_position_with_quality(image)
+        return row, col
+    
+    def get_vehicle_position_with_quality(self, image):
+        """
+        Estimate vehicle position relative to the grid.
+        
+        Returns:
+            tuple: (row, col, quality); row and col are None when no cells
+                   were found, quality is 0 for the fabricated fallback grid
+        """
+        return self.position_from_detection(self.detect_grid(image))
+    
+    def submit_position(self, image):
+        """
+        Start estimating the vehicle position in a frame without waiting for it.
+        
+        With the vision worker pool the detection runs in a worker process
+        while the caller carries on; otherwise it runs in collect_position.
+        
+        Returns:
+            tuple: Handle for collect_position
+        """
+        frame_id = None
+        if self.vision_pool is not None and image is not None:
+            frame_id = self.vision_pool.submit(image)
+        return image, frame_id
+    
+    def collect_position(self, pending, timeout=VISION_RESULT_TIMEOUT):
+        """
+        Wait for a position estimate started with submit_position.
+        
+        Detects in this process instead when the frame could not be queued
+        (ring full, other frame size) or no worker answered in time.
+        
+        Returns:
+            tuple: (row, col, quality) as from get_vehicle_position_with_quality
+        """
+        image, frame_id = pending
+        if frame_id is not None:
+            result = self.vision_pool.result(frame_id, timeout=timeout)
+            if result is not None:
+                return result['row'], result['col'], result['quality']
+            self.vision_pool.cancel(frame_id)
+            print(f"Warning: no vision worker result after {timeout:.1f}s, detecting in-process")
+            if not self.vision_pool.alive():
+                print("Warning: vision workers have exited, detecting in-process from now on")
+                self.vision_pool.cleanup()
+                self.vision_pool = None
+        return self.get_vehicle_position_with_quality(image)
+    
+    def position_from_detection(self, detection):
+        """(row, col, quality) of the cell under the camera center in a detection."""
+        cells = detection['cells']
         
         if not cells:
-            return None, None
+            return None, None, 0.0
         
         # Find the cell closest to the center of the image
-        image_center_x = CAMERA_WIDTH // 2
-        image_center_y = CAMERA_HEIGHT // 2
+        _, _, _, (image_center_x, image_center_y) = self.frame_geometry()
         
         closest_cell = min(cells, key=lambda cell: 
             ((cell['center'][0] - image_center_x) ** 2 + 
              (cell['center'][1] - image_center_y) ** 2) ** 0.5)
         
-        return closest_cell['row'], closest_cell['col']
+        return closest_cell['row'], closest_cell['col'], detection['quality']
     
     def save_debug_image(self, image, filename):
         """Save an image for debugging purposes."""
@@ -342,6 +983,15 @@ class CameraController:
     
     def cleanup(self):
         """Clean up camera resources."""
+        if self.vision_pool is not None:
+            self.vision_pool.cleanup()
+            self.vision_pool = None
+        if self.quality_gate.stats['frames']:
+            print(self.quality_gate.summary())
+        if self.detection_cache is not None and self.detection_cache.stats['lookups']:
+            print(self.detection_cache.summary())
+        if self.camera is None:
+            return
         self.camera.stop()
         self.camera.close()
         print("Camera controller cleaned up")
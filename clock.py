@@ -0,0 +1,168 @@
+"""
+Clocks for the hardware controllers.
+Controllers take their time, sleeps and background threads from a clock
+object instead of the time and threading modules. RealClock is the wall
+clock. VirtualClock is a discrete-event clock: time stands still while any
+thread on it is running and jumps straight to the next event once all of
+them are asleep, so code full of multi-second motor timings runs instantly
+against simulated hardware, sees the right times and does the same thing
+on every run. Durations that measure computation (detection times,
+profiling) stay on time.perf_counter().
+"""
+
+import time
+import heapq
+import itertools
+import threading
+
+
+class RealClock:
+    """Wall clock: time.monotonic(), time.sleep() and plain threads."""
+
+    def time(self):
+        """Seconds on a monotonic clock."""
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        """Block for the given number of seconds."""
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def schedule(self, delay, callback):
+        """Call callback() on a timer thread after delay seconds."""
+        timer = threading.Timer(max(0.0, delay), callback)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def start_thread(self, target, *args, name=None, **kwargs):
+        """Start a daemon thread running target(*args, **kwargs)."""
+        thread = threading.Thread(target=target, args=args, kwargs=kwargs, name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def join(self, thread, timeout=None):
+        """
+        Wait for a thread from start_thread() to finish.
+
+        Returns:
+            bool: True if it finished within the timeout
+        """
+        thread.join(timeout)
+        return not thread.is_alive()
+
+
+class VirtualClock:
+    def __init__(self, start=0.0, poll_interval=0.01):
+        """
+        Initialize a discrete-event clock.
+
+        The threads on the clock are the one using it directly and those
+        started with start_thread(). They must only wait through the clock
+        (sleep, join), never on locks or queues held by each other, or time
+        cannot move on.
+
+        Args:
+            start (float): Initial time in seconds
+            poll_interval (float): Virtual seconds between checks in join()
+        """
+        self.now = float(start)
+        self.poll_interval = poll_interval
+        self.slept = 0.0  # Total virtual seconds slept, over all threads
+        self.events = 0  # Events dispatched
+        self.condition = threading.Condition()
+        self.running = 1  # Threads on the clock that are not asleep
+        self.queue = []  # Heap of (time, thread rank, sequence, callback); callback None wakes a sleeper
+        self.sequence = itertools.count()
+        self.threads = 0  # Threads started on the clock
+        self.ranks = {}  # Thread ident -> start order; ties at the same time go in this order
+        self.woken = set()  # Sequence numbers of sleepers due to resume
+
+    def time(self):
+        """Current virtual time in seconds."""
+        return self.now
+
+    def sleep(self, seconds):
+        """Sleep until the virtual time has advanced by seconds (0 yields to due events)."""
+        seconds = max(0.0, seconds)
+        with self.condition:
+            self.slept += seconds
+            wakeup = self._push(self.now + seconds, None)
+            self.running -= 1
+            self._dispatch()
+            while wakeup not in self.woken:
+                self.condition.wait()
+            self.woken.discard(wakeup)
+
+    def schedule(self, delay, callback):
+        """
+        Call callback() once the virtual time reaches now + delay.
+
+        The callback runs on whichever thread advances the clock to it and
+        must not sleep.
+        """
+        with self.condition:
+            self._push(self.now + max(0.0, delay), callback)
+
+    def start_thread(self, target, *args, name=None, **kwargs):
+        """Start a daemon thread on the clock running target(*args, **kwargs)."""
+        with self.condition:
+            self.running += 1
+            self.threads += 1
+            rank = self.threads
+        done = threading.Event()
+
+        def run():
+            with self.condition:
+                self.ranks[threading.get_ident()] = rank
+            try:
+                target(*args, **kwargs)
+            finally:
+                with self.condition:
+                    done.set()
+                    self.running -= 1
+                    self._dispatch()
+
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        thread.clock_done = done
+        thread.start()
+        return thread
+
+    def join(self, thread, timeout=None):
+        """
+        Wait (in virtual time) for a thread from start_thread() to finish.
+
+        Returns:
+            bool: True if it finished within the timeout
+        """
+        deadline = None if timeout is None else self.now + timeout
+        while not thread.clock_done.is_set():
+            if deadline is not None and self.now >= deadline:
+                return False
+            self.sleep(self.poll_interval if deadline is None else min(self.poll_interval, deadline - self.now))
+        thread.join()
+        return True
+
+    def _push(self, when, callback):
+        """Queue an event (with the clock locked); returns its sequence number."""
+        sequence = next(self.sequence)
+        rank = self.ranks.get(threading.get_ident(), 0)
+        heapq.heappush(self.queue, (when, rank, sequence, callback))
+        return sequence
+
+    def _dispatch(self):
+        """Once every thread is asleep, advance to the next events (with the clock locked)."""
+        while self.running == 0 and self.queue:
+            when, _, sequence, callback = heapq.heappop(self.queue)
+            self.now = max(self.now, when)
+            self.events += 1
+            if callback is None:
+                self.woken.add(sequence)
+                self.running += 1
+                self.condition.notify_all()
+            else:
+                callback()
+
+
+# Shared wall clock for controllers that are not given one
+REAL_CLOCK = RealClock()
@@ -5,10 +5,32 @@ Configuration file for the robotic vehicle navigation system.
 # Camera settings - Optimized for Pi Camera v1 (OV5647)
 CAMERA_WIDTH = 640
 CAMERA_HEIGHT = 480
+CAMERA_LORES_SIZE = (320, 240)  # Low-resolution stream (YUV420) used for cheap frame checks
 CAMERA_FPS = 30
 CAMERA_SENSOR_MODE = 2  # Mode 2: 640x480@60fps for Pi Camera v1
 CAMERA_ISO = 100  # Lower ISO for better image quality
 CAMERA_EXPOSURE_MODE = 'auto'  # Auto exposure for varying lighting
+CAMERA_READY_TIMEOUT = 3.0  # Longest wait (s) at startup for the camera to become ready
+CAMERA_READY_STABLE_FRAMES = 2  # Consecutive frames that must pass the readiness checks
+CAMERA_READY_TIMING_TOLERANCE = 0.1  # Largest frame interval deviation from the frame duration (fraction)
+CAMERA_READY_AWB_TOLERANCE = 0.02  # Largest colour gain change between frames (fraction) once white balance settled
+CAMERA_READY_AE_TOLERANCE = 0.05  # Largest exposure change between frames (fraction) once auto exposure settled
+CAMERA_INIT_TIMEOUT = 10.0  # Longest wait (s) for the camera thread before navigation starts
+CAMERA_STARTUP_LOG = "~/.cache/robotour/camera_startup.csv"  # Startup timings, one line per camera start
+
+# Exposure control (closed loop on the lores stream)
+EXPOSURE_CONTROL = True  # Drive exposure from the lores histogram instead of the camera's auto exposure
+EXPOSURE_REGION = (0.1, 0.1, 0.9, 0.9)  # Grid region (x0, y0, x1, y1 as fractions of the frame) measured
+EXPOSURE_PERCENTILE = 75  # Histogram percentile taken as the floor level (tape lines are the dark minority)
+EXPOSURE_TARGET = 190  # Grey level the floor is driven to: bright for line contrast, with headroom below saturation
+EXPOSURE_TOLERANCE = 12  # Grey levels from the target that count as converged
+EXPOSURE_MAX_CLIPPED = 0.02  # Saturated fraction of the region above which exposure is cut hard
+EXPOSURE_DAMPING = 1.0  # Exponent on the correction ratio (< 1 damps it, for sensors that are not linear)
+EXPOSURE_INITIAL_TIME = 20000  # Exposure time (us) before the first measurement
+EXPOSURE_MIN_TIME = 100  # Shortest exposure time (us)
+EXPOSURE_MAX_TIME = 66000  # Longest exposure time (us) while stationary
+EXPOSURE_MOVING_MAX_TIME = 8000  # Longest exposure time (us) while the robot moves, limits motion blur
+EXPOSURE_MAX_GAIN = 8.0  # Highest analogue gain; gain only rises once exposure time is at its cap
 
 # Grid settings
 GRID_ROWS = 4
@@ -87,12 +109,81 @@ FORWARD_SPEED = 50  # PWM duty cycle for forward movement (increased for movemen
 MOVE_FORWARD_TIME = 8.0  # seconds to move forward 50cm (will need calibration)
 TURN_TIME = 2.0  # seconds for 90-degree turn
 PIVOT_TIME = 1.5  # seconds for pivot turn
+COMMAND_DELAY = 0.2  # seconds of pause between executed movement commands
+
+# Route planning settings
+OPTIMIZE_ROUTE = True  # Reorder target cells to minimize mission time (turn-aware)
+ROUTE_EXACT_LIMIT = 8  # Target sets up to this size are solved exactly, larger ones heuristically
+USE_MOVE_TABLE = True  # Precompute optimal command sequences between all grid poses at startup
+MOVE_TABLE_CACHE_DIR = "~/.cache/robotour/"  # Cached tables (JSON), keyed by grid size and timing constants; private to the user, not a shared /tmp
+MAX_REPLANNERS = 8  # Incremental (D* Lite) planners kept for recent goal cells
+
+# Localization (histogram filter over row, col, heading)
+LOCALIZATION_MOVE_SUCCESS = 0.85    # Probability a forward move advances exactly one cell
+LOCALIZATION_MOVE_OVERSHOOT = 0.05  # Probability it advances two cells (rest: robot stalled)
+LOCALIZATION_TURN_SUCCESS = 0.9     # Probability a 90-degree turn completes
+LOCALIZATION_VISION_SIGMA = 0.5     # Vision position error (standard deviation, in cells)
+LOCALIZATION_VISION_CONFIDENCE = 0.8  # Weight of a perfect-quality vision detection against odometry
+LOCALIZATION_MIN_CONFIDENCE = 0.5   # Minimum cell probability to trust the estimate
 
 # Computer vision settings
-GRID_DETECTION_THRESHOLD = 0.8
-LINE_DETECTION_THRESHOLD = 50
+GRID_DETECTION_THRESHOLD = 0.8  # Minimum detection quality (0-1) to trust a vision position
+VISION_MAX_FRAMES = 3  # Frames to try per navigation step when detection quality is low
+FRAME_QUALITY_MAX_RETRIES = 2  # Extra frames captured when the quality gate rejects one
+FRAME_QUALITY_SUBSAMPLE = 2  # Subsampling step over the lores frame for the quality checks
+FRAME_MIN_BRIGHTNESS = 10  # Darker frames (mean grey level) are rejected
+FRAME_MAX_BRIGHTNESS = 240  # Brighter frames are rejected
+FRAME_MAX_CLIPPED = 0.25  # Largest fraction of black or saturated pixels
+FRAME_MIN_SHARPNESS = 50  # Laplacian variance below which a frame is always rejected as blurred
+FRAME_RELATIVE_SHARPNESS = 0.5  # A frame must be this fraction as sharp as the recent accepted frames
+FRAME_SHARPNESS_HISTORY = 15  # Accepted frames the recent sharpness is taken over
+DETECTION_CACHE = True  # Reuse the detection of an unchanged camera view (robot stationary between commands)
+DETECTION_CACHE_SIZE = 4  # (thumbnail, detection) pairs kept
+DETECTION_CACHE_THUMBNAIL = (64, 48)  # Grayscale thumbnail size frames are compared at
+DETECTION_CACHE_THRESHOLD = 2.5  # Mean absolute thumbnail difference (grey levels) below which the view is unchanged
+LINE_DETECTION_THRESHOLD = 50  # Hough accumulator votes for a line
 MIN_LINE_LENGTH = 50
-MAX_LINE_GAP = 10
+MAX_LINE_GAP = 10  # Largest gap (px) bridged within one Hough segment
+HOUGH_ANGLE_TOLERANCE = 15  # Degrees a segment may deviate from its grid line family
+LATTICE_MAX_SEGMENTS = 60  # Longest segments per line family the RANSAC lattice fit scores hypotheses on
+LATTICE_MIN_SPACING = 8  # Smallest line spacing (px) a lattice hypothesis may have
+LATTICE_PERSPECTIVE_MARGIN = 2.0  # Far lines may be this much closer together than the sampled pair
+GRID_LINE_DETECTOR = 'projection'  # 'projection' (fast, axis-aligned grids, falls back to morphology), 'morphology' or 'hough' (any rotation)
+PROJECTION_PEAK_RATIO = 0.35  # Profile threshold between baseline and highest peak
+PROJECTION_MAX_LINE_WIDTH = 15  # Wider profile peaks (px) mean the grid is rotated
+PROJECTION_MERGE_DISTANCE = 10  # Peaks closer than this (px) are edges of one line
+VISION_PYRAMID_LEVELS = 0  # Detect on the frame halved this many times (2 = 1/4, 3 = 1/8 scale) and refine at full resolution
+PYRAMID_MAX_LEVELS = 3  # Coarsest detection scale (1/8): grid lines still span a pixel
+FRAME_BUFFER_POOL = False  # Reuse preallocated frame buffers in the vision path (lower allocation peak, but no measurable speedup)
+VISION_WORKER_POOL = False  # Detect navigation frames in the vision worker pool, off the control thread (workers neither track lines nor cache detections)
+VISION_WORKERS = 3  # Detection processes in the vision worker pool (leaves a core for the control loop)
+VISION_RESULT_TIMEOUT = 2.0  # Seconds to wait for a worker's detection before detecting in-process
+VISION_RING_SLOTS = 4  # Frames in flight in the worker pool's shared memory ring
+VISION_WORKER_START_METHOD = 'spawn'  # Workers start clean instead of forking the camera and GPIO state
+PERF_PROFILE = 'pi_zero_2w'  # OpenCV threads and CPU affinity per subsystem (see perf_profile.PERF_PROFILES)
+
+# Grid line tracking between frames
+GRID_TRACKING = True  # Re-find locked grid lines in small windows instead of full-frame detection
+TRACKING_BAND = 12  # Smallest half-height (px) of the search window across a predicted line
+TRACKING_MAX_BAND = 30  # Largest search half-height after repeated moves
+TRACKING_MOVE_UNCERTAINTY = 8  # Pixels added to the search band per forward move (drift)
+TRACKING_WINDOWS = 3  # Windows examined along each line
+TRACKING_WINDOW_LENGTH = 32  # Window size (px) along the line
+TRACKING_MIN_CONTRAST = 25  # Grey levels a line must be darker than the floor around it
+TRACKING_MIN_VERIFIED = 0.7  # Fraction of predicted lines that must be re-found to keep the lock
+TRACKING_FULL_DETECTION_INTERVAL = 5  # Full-frame detection every Nth frame while locked
+TRACKING_MEASUREMENT_NOISE = 1.5  # Std (px) of a line position measured in the windows
+TRACKING_PROCESS_NOISE = 0.5  # Std (px) of unmodelled line motion per frame
+TRACKING_VELOCITY_NOISE = 0.5  # Std (px/frame) of line velocity changes per frame
+TRACKING_GATE = 3.0  # Mahalanobis distance beyond which a measurement is not the tracked line
+TRACKING_MAX_MISSES = 2  # Frames a line may go unseen before its track is dropped
+
+# Bird's-eye view (inverse perspective mapping of the floor)
+BIRDS_EYE_ENABLED = False  # Detect the grid in the bird's-eye view (run calibrate_birds_eye.py first)
+BIRDS_EYE_CALIBRATION_FILE = "/robotour/birds_eye_calibration.npz"  # Floor-to-image homography
+BIRDS_EYE_ROI_CM = (-100, -100, 150, 100)  # Floor region (x_min, y_min, x_max, y_max) in cm from the calibration cell
+BIRDS_EYE_PIXELS_PER_CM = 1.5  # Resolution of the bird's-eye view
+VISION_CACHE_DIR = "~/.cache/robotour/"  # Cached remap tables, keyed by calibration and region
 
 # Debug settings
 DEBUG_MODE = True
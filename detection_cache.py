@@ -0,0 +1,109 @@
+"""
+Detection cache for a stationary camera.
+Between motion commands the robot stands still and consecutive frames show
+the same view, yet every navigation step would detect the grid again. Each
+frame is reduced to a small grayscale thumbnail; when it matches the
+thumbnail of a recent frame (mean absolute difference under a threshold,
+well above sensor noise but below a 1 px shift of the grid lines) the
+detection of that frame is reused instead of running detection again.
+"""
+
+import time
+from collections import deque
+import cv2
+import numpy as np
+from config import *
+
+
+def thumbnail(image, size=DETECTION_CACHE_THUMBNAIL):
+    """
+    Grayscale thumbnail a frame is compared by.
+
+    Args:
+        image (numpy.ndarray): BGR or grayscale frame
+        size (tuple): Thumbnail (width, height)
+
+    Returns:
+        numpy.ndarray: int16 thumbnail (signed, ready for differencing)
+    """
+    small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small.astype(np.int16)
+
+
+class DetectionCache:
+    def __init__(self, size=DETECTION_CACHE_SIZE, threshold=DETECTION_CACHE_THRESHOLD,
+                 thumbnail_size=DETECTION_CACHE_THUMBNAIL):
+        """
+        Initialize an empty cache.
+
+        Args:
+            size (int): (thumbnail, detection) pairs kept, most recent first
+            threshold (float): Mean absolute thumbnail difference (grey
+                               levels) below which two frames show the same view
+            thumbnail_size (tuple): Thumbnail (width, height)
+        """
+        self.threshold = threshold
+        self.thumbnail_size = tuple(thumbnail_size)
+        self.entries = deque(maxlen=size)  # [thumbnail, detection, detection seconds]
+        self.stats = {'lookups': 0, 'hits': 0, 'saved_time': 0.0, 'check_time': 0.0}
+
+    def lookup(self, image):
+        """
+        Find the detection of a frame showing the same view.
+
+        Args:
+            image (numpy.ndarray): BGR frame
+
+        Returns:
+            tuple: (detection or None, thumbnail); pass the thumbnail to
+                   store() after detecting a missed frame
+        """
+        start_time = time.perf_counter()
+        thumb = thumbnail(image, self.thumbnail_size)
+        self.stats['lookups'] += 1
+        for i, entry in enumerate(self.entries):
+            if float(np.mean(np.abs(thumb - entry[0]))) < self.threshold:
+                # Most recently used first
+                if i:
+                    del self.entries[i]
+                    self.entries.appendleft(entry)
+                self.stats['hits'] += 1
+                self.stats['saved_time'] += entry[2]
+                self.stats['check_time'] += time.perf_counter() - start_time
+                return entry[1], thumb
+        self.stats['check_time'] += time.perf_counter() - start_time
+        return None, thumb
+
+    def store(self, thumb, detection, elapsed):
+        """
+        Remember the detection of a frame.
+
+        Args:
+            thumb (numpy.ndarray): Thumbnail returned by lookup()
+            detection (dict): Detection of the frame (see
+                              CameraController.detect_grid)
+            elapsed (float): Seconds the detection took (credited as saved
+                             on every hit)
+        """
+        self.entries.appendleft([thumb, detection, elapsed])
+
+    def clear(self):
+        """Forget all cached detections."""
+        self.entries.clear()
+
+    def hit_rate(self):
+        """Fraction of lookups answered from the cache."""
+        return self.stats['hits'] / self.stats['lookups'] if self.stats['lookups'] else 0.0
+
+    def saved_time(self):
+        """Detection seconds saved by hits, less the time spent checking."""
+        return self.stats['saved_time'] - self.stats['check_time']
+
+    def summary(self):
+        """One-line report of the cache's hit rate and saved CPU time."""
+        stats = self.stats
+        check_ms = stats['check_time'] / stats['lookups'] * 1000 if stats['lookups'] else 0.0
+        return (f"Detection cache: {stats['hits']}/{stats['lookups']} hits ({self.hit_rate():.0%}), "
+                f"{check_ms:.2f}ms per lookup, CPU time saved {self.saved_time() * 1000:.0f}ms")
@@ -0,0 +1,512 @@
+"""
+Diagnostics runner for the robotic vehicle.
+The checks of the standalone troubleshooting scripts (troubleshoot_movement.py,
+emergency_motor_diagnosis.py, diagnose_right_motor.py, test_ena_enb.py,
+check_power_supply.py) as registered checks with structured results and no
+prompts. Checks run against the real GPIO, or against simulated hardware
+(FakeGPIO on a virtual clock) where the multi-second motor timings take no
+time and every check gets its own hardware, so they all run in parallel.
+On the real GPIO, checks that share a resource run one after another.
+
+Usage:
+    python3 diagnostics.py                 # Real hardware
+    python3 diagnostics.py --simulated     # No Pi needed
+    python3 diagnostics.py --only movement --json
+"""
+
+import sys
+import json
+import time
+import argparse
+import contextlib
+import io
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from config import *
+from clock import VirtualClock, REAL_CLOCK
+
+CheckResult = namedtuple('CheckResult', ['name', 'group', 'status', 'message', 'details', 'seconds',
+                                         'clock_seconds'])
+Diagnostic = namedtuple('Diagnostic', ['name', 'group', 'function', 'resources', 'description'])
+
+STATUSES = ('pass', 'warn', 'fail', 'skip', 'error')
+DIAGNOSTICS = {}  # name -> Diagnostic, in registration order
+
+MOTOR_PINS = {
+    'IN1 (Left Forward)': MOTOR_LEFT_FORWARD,
+    'IN2 (Left Backward)': MOTOR_LEFT_BACKWARD,
+    'IN3 (Right Forward)': MOTOR_RIGHT_FORWARD,
+    'IN4 (Right Backward)': MOTOR_RIGHT_BACKWARD,
+}
+ENABLE_PINS = {'ENA (Right Enable)': ENA_PIN, 'ENB (Left Enable)': ENB_PIN}
+
+
+def diagnostic(name, group, resources=('gpio',)):
+    """
+    Register a check.
+
+    The check is called with a HardwareContext and returns (status, message)
+    or (status, message, details); a failed assert is reported as 'fail'
+    and any other exception as 'error'.
+
+    Args:
+        name (str): Unique check name
+        group (str): Group the check is selected by (see --only)
+        resources (tuple): Hardware the check uses; checks sharing a
+                           resource never run at the same time on real hardware
+    """
+    def register(function):
+        if name in DIAGNOSTICS:
+            raise ValueError(f"Diagnostic {name!r} registered twice")
+        description = (function.__doc__ or '').strip().splitlines()[0] if function.__doc__ else ''
+        DIAGNOSTICS[name] = Diagnostic(name, group, function, tuple(resources), description)
+        return function
+    return register
+
+
+class HardwareContext:
+    def __init__(self, simulated=False, clock=None):
+        """
+        Hardware a check runs against.
+
+        Args:
+            simulated (bool): Use a FakeGPIO instead of RPi.GPIO
+            clock: Clock for the check's timings (default: a new virtual clock
+                   when simulated, else the wall clock)
+        """
+        self.simulated = simulated
+        if simulated:
+            from simulated_hardware import FakeGPIO
+            self.clock = clock or VirtualClock()
+            self.gpio = FakeGPIO(clock=self.clock)
+        else:
+            import RPi.GPIO as GPIO
+            self.clock = clock or REAL_CLOCK
+            self.gpio = GPIO
+
+    def motor_controller(self):
+        """A MotorController on this context's GPIO and clock (use it as a context manager)."""
+        from motor_controller import MotorController
+        return MotorController(gpio=self.gpio, clock=self.clock)
+
+    def setup_outputs(self, pins):
+        """Set the pin mode and configure pins as low outputs."""
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setwarnings(False)
+        for pin in pins:
+            self.gpio.setup(pin, self.gpio.OUT)
+            self.gpio.output(pin, self.gpio.LOW)
+
+    def wheel_drive(self):
+        """(left, right) wheel drive as seen on the simulated pins, or None on real hardware."""
+        return self.gpio.wheel_drive() if self.simulated else None
+
+
+# ---------------------------------------------------------------- configuration
+
+@diagnostic('config_pins', 'config', resources=())
+def check_config_pins(hw):
+    """Motor, enable and button pins are valid BCM pins and all different."""
+    pins = dict(MOTOR_PINS)
+    if USE_ENABLE_PINS:
+        pins.update(ENABLE_PINS)
+    pins['Start button'] = START_BUTTON_PIN
+    invalid = [f"{name}=GPIO {pin}" for name, pin in pins.items() if not 2 <= pin <= 27]
+    assert not invalid, f"Not usable BCM pins: {', '.join(invalid)}"
+    seen = {}
+    for name, pin in pins.items():
+        assert pin not in seen, f"GPIO {pin} assigned to both {seen[pin]} and {name}"
+        seen[pin] = name
+    return 'pass', f"{len(pins)} pins assigned", {name: pin for name, pin in pins.items()}
+
+
+@diagnostic('config_speeds', 'config', resources=())
+def check_config_speeds(hw):
+    """Movement speeds are valid duty cycles at or above MIN_MOTOR_SPEED."""
+    speeds = {'DEFAULT_SPEED': DEFAULT_SPEED, 'FORWARD_SPEED': FORWARD_SPEED, 'TURN_SPEED': TURN_SPEED}
+    invalid = [name for name, speed in speeds.items() if not 0 < speed <= 100]
+    assert not invalid, f"Duty cycles outside 1-100%: {', '.join(invalid)}"
+    assert 0 < MIN_MOTOR_SPEED <= 100, f"MIN_MOTOR_SPEED {MIN_MOTOR_SPEED} is not a duty cycle"
+    slow = [name for name, speed in speeds.items() if speed < MIN_MOTOR_SPEED]
+    if slow:
+        return 'warn', f"Below MIN_MOTOR_SPEED ({MIN_MOTOR_SPEED}%), may not start: {', '.join(slow)}", speeds
+    return 'pass', f"All speeds {MIN_MOTOR_SPEED}-100%", speeds
+
+
+@diagnostic('power_voltages', 'power', resources=())
+def check_power_voltages(hw):
+    """Battery, LM2596S and motor voltages are compatible."""
+    motor_voltage = MOTOR_VOLTAGE - L298N_VOLTAGE_DROP
+    details = {'battery': BATTERY_VOLTAGE, 'lm2596s_output': MOTOR_VOLTAGE, 'motor_terminals': motor_voltage}
+    assert LM2596S_INPUT_VOLTAGE_MIN <= BATTERY_VOLTAGE <= LM2596S_INPUT_VOLTAGE_MAX, \
+        f"Battery {BATTERY_VOLTAGE}V outside the LM2596S input range " \
+        f"{LM2596S_INPUT_VOLTAGE_MIN}-{LM2596S_INPUT_VOLTAGE_MAX}V"
+    assert LM2596S_OUTPUT_VOLTAGE_MIN <= MOTOR_VOLTAGE <= LM2596S_OUTPUT_VOLTAGE_MAX, \
+        f"Motor supply {MOTOR_VOLTAGE}V outside the LM2596S output range"
+    # The buck converter needs some headroom above its output
+    assert BATTERY_VOLTAGE >= MOTOR_VOLTAGE + 1.5, \
+        f"Battery {BATTERY_VOLTAGE}V too close to the {MOTOR_VOLTAGE}V output for the LM2596S"
+    if motor_voltage < 0.7 * MOTOR_RATED_VOLTAGE:
+        return 'warn', (f"Motors get {motor_voltage:.1f}V of their {MOTOR_RATED_VOLTAGE}V rating after the "
+                        f"L298N's {L298N_VOLTAGE_DROP}V drop; raise the LM2596S output"), details
+    return 'pass', f"{BATTERY_VOLTAGE}V → {MOTOR_VOLTAGE}V → {motor_voltage:.1f}V at the motors", details
+
+
+@diagnostic('power_current', 'power', resources=())
+def check_power_current(hw):
+    """Estimated motor current at the configured speeds is within the supply limits."""
+    from power_monitor import PowerMonitor
+    monitor = PowerMonitor()
+    speed = max(FORWARD_SPEED, TURN_SPEED, DEFAULT_SPEED)
+    per_motor = monitor.estimate_motor_current(speed)
+    total = 2 * per_motor
+    stall = monitor.estimate_motor_current(100)
+    details = {'speed': speed, 'per_motor': round(per_motor, 2), 'total': round(total, 2),
+               'stall_per_motor': round(stall, 2)}
+    assert per_motor <= L298N_MAX_CURRENT, \
+        f"{per_motor:.1f}A per motor at {speed}% exceeds the L298N's {L298N_MAX_CURRENT}A per channel"
+    assert total <= LM2596S_MAX_CURRENT, \
+        f"{total:.1f}A for both motors at {speed}% exceeds the LM2596S maximum of {LM2596S_MAX_CURRENT}A"
+    if total > LM2596S_RECOMMENDED_CURRENT:
+        return 'warn', (f"{total:.1f}A for both motors at {speed}% is above the LM2596S recommended "
+                        f"{LM2596S_RECOMMENDED_CURRENT}A"), details
+    if 2 * stall > LM2596S_MAX_CURRENT:
+        return 'warn', (f"{total:.1f}A at {speed}% is fine, but stalled motors draw {2 * stall:.1f}A "
+                        f"(LM2596S max {LM2596S_MAX_CURRENT}A)"), details
+    return 'pass', f"{total:.1f}A for both motors at {speed}%", details
+
+
+# ---------------------------------------------------------------- GPIO
+
+@diagnostic('gpio_setup', 'gpio')
+def check_gpio_setup(hw):
+    """All motor pins can be set up as outputs."""
+    pins = list(MOTOR_PINS.values()) + (list(ENABLE_PINS.values()) if USE_ENABLE_PINS else [])
+    try:
+        hw.setup_outputs(pins)
+    finally:
+        hw.gpio.cleanup()
+    return 'pass', f"{len(pins)} outputs set up", {'pins': pins}
+
+
+@diagnostic('pin_toggle', 'gpio')
+def check_pin_toggle(hw):
+    """Each motor pin goes high and low and reads back what was written."""
+    pins = dict(MOTOR_PINS)
+    if USE_ENABLE_PINS:
+        pins.update(ENABLE_PINS)
+    failed = []
+    try:
+        hw.setup_outputs(pins.values())
+        for name, pin in pins.items():
+            for level in (hw.gpio.HIGH, hw.gpio.LOW):
+                hw.gpio.output(pin, level)
+                hw.clock.sleep(0.5)
+                if hw.gpio.input(pin) != level:
+                    failed.append(name)
+    finally:
+        hw.gpio.cleanup()
+    assert not failed, f"Read back the wrong level on {', '.join(sorted(set(failed)))}"
+    return 'pass', f"{len(pins)} pins toggled", {'pins': pins}
+
+
+@diagnostic('enable_pwm', 'gpio')
+def check_enable_pwm(hw):
+    """ENA and ENB PWM steps through 25-100% duty."""
+    if not USE_ENABLE_PINS:
+        return 'skip', "ENA/ENB method not enabled"
+    duties = [25, 50, 75, 100]
+    wrong = []
+    try:
+        hw.setup_outputs(ENABLE_PINS.values())
+        for name, pin in ENABLE_PINS.items():
+            pwm = hw.gpio.PWM(pin, PWM_FREQUENCY)
+            pwm.start(0)
+            for duty in duties:
+                pwm.ChangeDutyCycle(duty)
+                if hw.simulated and abs(hw.gpio.level(pin) - duty / 100) > 1e-9:
+                    wrong.append(f"{name} at {duty}%")
+                hw.clock.sleep(1)
+            pwm.stop()
+    finally:
+        hw.gpio.cleanup()
+    assert not wrong, f"Wrong duty on {', '.join(wrong)}"
+    return 'pass', f"Both enable pins stepped through {duties}%", {'duties': duties}
+
+
+# ---------------------------------------------------------------- motors
+
+@diagnostic('motor_init', 'motors')
+def check_motor_init(hw):
+    """MotorController initializes with every output low."""
+    with hw.motor_controller() as motor:
+        method = motor.get_control_method()
+        if hw.simulated:
+            high = [pin for pin in list(MOTOR_PINS.values()) + list(ENABLE_PINS.values()) if hw.gpio.level(pin)]
+            assert not high, f"GPIO {high} not low after initialization"
+    return 'pass', f"Initialized and cleaned up ({method})", {'method': method}
+
+
+# (method, expected sign of the (left, right) wheel drive)
+MOVEMENTS = (
+    ('move_forward', (1, 1)),
+    ('move_backward', (-1, -1)),
+    ('turn_left', (-1, 1)),
+    ('turn_right', (1, -1)),
+    ('pivot_left', (-1, 1)),
+    ('pivot_right', (1, -1)),
+)
+
+
+@diagnostic('movement', 'motors')
+def check_movement(hw):
+    """Every movement drives the wheels in the right directions, and stop() stops them."""
+    drives = {}
+    wrong = []
+    with hw.motor_controller() as motor:
+        for method, expected in MOVEMENTS:
+            getattr(motor, method)(MIN_MOTOR_SPEED)
+            drive = hw.wheel_drive()
+            hw.clock.sleep(1)
+            motor.stop()
+            if drive is None:
+                continue
+            drives[method] = drive
+            if tuple(int((value > 0) - (value < 0)) for value in drive) != expected:
+                wrong.append(f"{method} drove (left, right) = ({drive[0]:+.2f}, {drive[1]:+.2f})")
+            if hw.wheel_drive() != (0, 0):
+                wrong.append(f"stop() after {method} left the drive at {hw.wheel_drive()}")
+    assert not wrong, "; ".join(wrong)
+    if not hw.simulated:
+        return 'pass', "Movements commanded; check the wheels turned forward, backward, left and right", {}
+    return 'pass', f"{len(MOVEMENTS)} movements in the right directions", drives
+
+
+def _drive_single_wheel(hw, side):
+    """Drive one wheel forward then backward with the other one off, as diagnose_right_motor.py does."""
+    if side == 'left':
+        forward, backward, enable, reversed_motor = MOTOR_LEFT_FORWARD, MOTOR_LEFT_BACKWARD, ENB_PIN, REVERSE_LEFT_MOTOR
+    else:
+        forward, backward, enable, reversed_motor = (MOTOR_RIGHT_FORWARD, MOTOR_RIGHT_BACKWARD, ENA_PIN,
+                                                     REVERSE_RIGHT_MOTOR)
+    pins = list(MOTOR_PINS.values()) + (list(ENABLE_PINS.values()) if USE_ENABLE_PINS else [])
+    drives = []
+    try:
+        hw.setup_outputs(pins)
+        pwm = None
+        if USE_ENABLE_PINS:
+            pwm = hw.gpio.PWM(enable, PWM_FREQUENCY)
+            pwm.start(MIN_MOTOR_SPEED)
+        for wheel_forward in (True, False):
+            high, low = (forward, backward) if wheel_forward != reversed_motor else (backward, forward)
+            hw.gpio.output(low, hw.gpio.LOW)
+            hw.gpio.output(high, hw.gpio.HIGH)
+            drives.append(hw.wheel_drive())
+            hw.clock.sleep(3)
+        if pwm is not None:
+            pwm.stop()
+    finally:
+        hw.gpio.cleanup()
+    if not hw.simulated:
+        return 'pass', f"{side.capitalize()} wheel driven forward then backward; check it turned", {}
+    index = 0 if side == 'left' else 1
+    for drive, sign in zip(drives, (1, -1)):
+        assert drive[index] * sign > 0, f"{side.capitalize()} wheel drive {drive[index]:+.2f}, expected sign {sign:+d}"
+        assert drive[1 - index] == 0, f"Driving the {side} wheel also drove the other one ({drive})"
+    return 'pass', f"{side.capitalize()} wheel alone, forward and backward", {'drives': drives}
+
+
+@diagnostic('left_motor_only', 'motors')
+def check_left_motor_only(hw):
+    """The left wheel turns on its own in both directions."""
+    return _drive_single_wheel(hw, 'left')
+
+
+@diagnostic('right_motor_only', 'motors')
+def check_right_motor_only(hw):
+    """The right wheel turns on its own in both directions."""
+    return _drive_single_wheel(hw, 'right')
+
+
+# ---------------------------------------------------------------- button
+
+@diagnostic('button_idle', 'button')
+def check_button_idle(hw):
+    """The start button input reads HIGH (released) with the pull-up."""
+    try:
+        hw.gpio.setmode(hw.gpio.BCM)
+        hw.gpio.setwarnings(False)
+        hw.gpio.setup(START_BUTTON_PIN, hw.gpio.IN, pull_up_down=hw.gpio.PUD_UP)
+        level = hw.gpio.input(START_BUTTON_PIN)
+    finally:
+        hw.gpio.cleanup(START_BUTTON_PIN)
+    if level != hw.gpio.HIGH:
+        return 'warn', f"GPIO {START_BUTTON_PIN} reads LOW: button held down or shorted to GND", {'level': level}
+    return 'pass', f"GPIO {START_BUTTON_PIN} reads HIGH", {'level': level}
+
+
+# ---------------------------------------------------------------- navigation
+
+@diagnostic('mission_start_target', 'navigation', resources=())
+def check_mission_start_target(hw):
+    """A mission whose first target is the start cell visits it instead of blocking it."""
+    import numpy as np
+    from simulated_hardware import simulate_mission
+    # Bare floor and an unsure localizer: the robot keeps its dead-reckoned start pose
+    floor = np.full((CAMERA_HEIGHT, CAMERA_WIDTH, 3), 200, dtype=np.uint8)
+    targets = [(0, 0), (0, 2)]
+    robot, _, clock = simulate_mission(button_press=0.5, scene=floor, targets=targets, known_start=False,
+                                       clock=hw.clock)
+    status = robot.navigation_controller.get_navigation_status()
+    details = {'visited': status['visited_cells'], 'blocked': status['blocked_cells'],
+               'position': status['current_position'], 'mission_seconds': round(clock.time(), 1)}
+    assert status['blocked_cells'] == 0, f"{status['blocked_cells']} cells blocked on an open floor"
+    assert status['visited_cells'] == len(targets), f"Visited {status['visited_cells']} of {len(targets)} targets"
+    return 'pass', f"Visited the start cell and {len(targets) - 1} more target", details
+
+
+# ---------------------------------------------------------------- runner
+
+def run_check(check, hw):
+    """
+    Run one check and time it.
+
+    Args:
+        check (Diagnostic): Registered check
+        hw (HardwareContext): Hardware to run it against, or the exception
+                              raised creating it
+
+    Returns:
+        CheckResult: The check's result
+    """
+    start_time = time.perf_counter()
+    clock_start = hw.clock.time() if isinstance(hw, HardwareContext) else 0.0
+    details = {}
+    try:
+        if isinstance(hw, Exception):
+            raise hw
+        outcome = check.function(hw)
+        status, message = outcome[0], outcome[1]
+        details = outcome[2] if len(outcome) > 2 else {}
+        if status not in STATUSES:
+            raise ValueError(f"Unknown status {status!r}")
+    except AssertionError as e:
+        status, message = 'fail', str(e) or "Assertion failed"
+    except Exception as e:
+        status, message = 'error', f"{type(e).__name__}: {e}"
+    clock_seconds = hw.clock.time() - clock_start if isinstance(hw, HardwareContext) else 0.0
+    return CheckResult(check.name, check.group, status, message, details,
+                       time.perf_counter() - start_time, clock_seconds)
+
+
+def _lanes(checks, simulated, parallel):
+    """
+    Split checks into lanes that may run concurrently: every check on its
+    own hardware when simulated, else one lane per set of checks linked by
+    shared resources.
+    """
+    if not parallel:
+        return [list(checks)]
+    if simulated:
+        return [[check] for check in checks]
+    lanes = []
+    for check in checks:
+        joined = [lane for lane in lanes if any(set(check.resources) & set(other.resources) for other in lane)]
+        merged = [other for lane in joined for other in lane] + [check]
+        lanes = [lane for lane in lanes if lane not in joined] + [merged]
+    return lanes
+
+
+def _context(check, simulated, shared):
+    """
+    Hardware for a check: a new simulated context when simulated or when the
+    check uses no hardware, else the shared real one.
+    """
+    if simulated or not check.resources:
+        return HardwareContext(simulated=True)
+    return shared
+
+
+def run_diagnostics(names=None, simulated=False, parallel=True, workers=8, verbose=False):
+    """
+    Run registered checks.
+
+    Args:
+        names (list): Check or group names to run (default: all)
+        simulated (bool): Run against simulated hardware on virtual clocks
+        parallel (bool): Run independent checks concurrently
+        workers (int): Concurrent checks
+        verbose (bool): Show what the checks and controllers print
+
+    Returns:
+        list: CheckResult of each check, in registration order
+    """
+    checks = [check for check in DIAGNOSTICS.values()
+              if not names or check.name in names or check.group in names]
+    shared = None
+    if not simulated and any(check.resources for check in checks):
+        # One process-wide RPi.GPIO: checks share it and the wall clock
+        try:
+            shared = HardwareContext(simulated=False)
+        except ImportError as e:
+            shared = e  # Reported by every check that needs the GPIO
+
+    def run_lane(lane):
+        return [run_check(check, _context(check, simulated, shared)) for check in lane]
+
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            lane_results = list(pool.map(run_lane, _lanes(checks, simulated, parallel)))
+    by_name = {result.name: result for results in lane_results for result in results}
+    return [by_name[check.name] for check in checks]
+
+
+def print_report(results, wall_seconds):
+    """Print a table of the results and a summary line."""
+    marks = {'pass': '✓', 'warn': '⚠', 'fail': '✗', 'skip': '-', 'error': '!'}
+    print("Check                | Group      | Status  | Time (s) | Clock (s) | Message")
+    print("-" * 100)
+    for result in results:
+        print(f"{result.name:20s} | {result.group:10s} | {marks[result.status]} {result.status:5s} | "
+              f"{result.seconds:8.3f} | {result.clock_seconds:9.1f} | {result.message}")
+    counts = {status: sum(result.status == status for result in results) for status in STATUSES}
+    hardware_seconds = sum(result.clock_seconds for result in results)
+    print("-" * 100)
+    print(", ".join(f"{count} {status}" for status, count in counts.items() if count) +
+          f" in {wall_seconds:.2f}s ({hardware_seconds:.1f}s of hardware timings)")
+
+
+def main():
+    """Run the diagnostics from the command line; exit code 1 on any failure."""
+    parser = argparse.ArgumentParser(description="Run the robot's hardware diagnostics without prompts.")
+    parser.add_argument('--simulated', action='store_true', help="use simulated GPIO on a virtual clock")
+    parser.add_argument('--serial', action='store_true', help="run one check at a time")
+    parser.add_argument('--only', nargs='+', metavar='NAME', help="checks or groups to run")
+    parser.add_argument('--list', action='store_true', help="list the checks and exit")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    parser.add_argument('--verbose', action='store_true', help="show the checks' own output")
+    args = parser.parse_args()
+
+    if args.list:
+        for check in DIAGNOSTICS.values():
+            print(f"{check.name:20s} {check.group:10s} {check.description}")
+        return 0
+    unknown = set(args.only or []) - set(DIAGNOSTICS) - {check.group for check in DIAGNOSTICS.values()}
+    if unknown:
+        parser.error(f"unknown checks or groups: {', '.join(sorted(unknown))}")
+
+    start_time = time.perf_counter()
+    results = run_diagnostics(args.only, simulated=args.simulated, parallel=not args.serial,
+                              verbose=args.verbose)
+    wall_seconds = time.perf_counter() - start_time
+    if args.json:
+        print(json.dumps([result._asdict() for result in results], indent=2))
+    else:
+        print(f"=== Diagnostics ({'simulated' if args.simulated else 'real'} hardware) ===")
+        print_report(results, wall_seconds)
+    return 1 if any(result.status in ('fail', 'error') for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""
+Incremental path planner (D* Lite) for grids with blocked cells.
+When cells become blocked or free, only the affected part of the search is
+repaired instead of planning again from scratch.
+"""
+
+import time
+import heapq
+import random
+import numpy as np
+from config import *
+
+INFINITY = float('inf')
+
+NEIGHBOUR_DELTAS = ((-1, 0), (0, 1), (1, 0), (0, -1))
+
+
+class DStarLitePlanner:
+    def __init__(self, blocked, goal, start):
+        """
+        Initialize the planner for one goal cell.
+
+        Args:
+            blocked (numpy.ndarray): Boolean occupancy grid (True = blocked),
+                                     read live so later changes are seen
+            goal (tuple): (row, col) goal cell
+            start (tuple): (row, col) start cell
+        """
+        self.blocked = blocked
+        self.grid_rows, self.grid_cols = blocked.shape
+        self.goal = tuple(goal)
+        self.start = tuple(start)
+        self.last_start = self.start
+        self.km = 0
+        self.g = {}
+        self.rhs = {self.goal: 0}
+        self.queue = []  # Heap of (key, cell), stale entries skipped lazily
+        self.queued = {self.goal: self._calculate_key(self.goal)}
+        heapq.heappush(self.queue, (self.queued[self.goal], self.goal))
+        self.expanded = 0  # Vertex expansions, for benchmarking
+
+    def _heuristic(self, a, b):
+        """Manhattan distance between two cells."""
+        return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+    def _calculate_key(self, cell):
+        """Priority of a cell in the queue."""
+        value = min(self.g.get(cell, INFINITY), self.rhs.get(cell, INFINITY))
+        return (value + self._heuristic(self.start, cell) + self.km, value)
+
+    def _neighbours(self, cell):
+        """Cells adjacent to a cell inside the grid."""
+        row, col = cell
+        for d_row, d_col in NEIGHBOUR_DELTAS:
+            r, c = row + d_row, col + d_col
+            if 0 <= r < self.grid_rows and 0 <= c < self.grid_cols:
+                yield (r, c)
+
+    def _cost(self, a, b):
+        """Cost of moving between adjacent cells (infinite if either is blocked)."""
+        if self.blocked[a] or self.blocked[b]:
+            return INFINITY
+        return 1
+
+    def _update_vertex(self, cell):
+        """Recompute a cell's one-step lookahead value and requeue it if inconsistent."""
+        if cell != self.goal:
+            best = INFINITY
+            for neighbour in self._neighbours(cell):
+                cost = self._cost(cell, neighbour) + self.g.get(neighbour, INFINITY)
+                if cost < best:
+                    best = cost
+            self.rhs[cell] = best
+        self.queued.pop(cell, None)
+        if self.g.get(cell, INFINITY) != self.rhs.get(cell, INFINITY):
+            key = self._calculate_key(cell)
+            self.queued[cell] = key
+            heapq.heappush(self.queue, (key, cell))
+
+    def _top(self):
+        """Drop stale queue entries and return the smallest valid key."""
+        while self.queue:
+            key, cell = self.queue[0]
+            if self.queued.get(cell) == key:
+                return key, cell
+            heapq.heappop(self.queue)
+        return (INFINITY, INFINITY), None
+
+    def compute_shortest_path(self):
+        """Expand cells until the start cell is consistent."""
+        while True:
+            top_key, cell = self._top()
+            start_g = self.g.get(self.start, INFINITY)
+            start_rhs = self.rhs.get(self.start, INFINITY)
+            if cell is None or (top_key >= self._calculate_key(self.start) and start_rhs == start_g):
+                break
+
+            self.expanded += 1
+            new_key = self._calculate_key(cell)
+            g_old = self.g.get(cell, INFINITY)
+            rhs = self.rhs.get(cell, INFINITY)
+            if top_key < new_key:
+                self.queued[cell] = new_key
+                heapq.heappush(self.queue, (new_key, cell))
+            elif g_old > rhs:
+                self.g[cell] = rhs
+                del self.queued[cell]
+                for neighbour in self._neighbours(cell):
+                    self._update_vertex(neighbour)
+            else:
+                self.g[cell] = INFINITY
+                self._update_vertex(cell)
+                for neighbour in self._neighbours(cell):
+                    self._update_vertex(neighbour)
+
+    def update_start(self, start):
+        """Move the start cell (the robot moved) before the next query."""
+        start = tuple(start)
+        self.km += self._heuristic(self.last_start, start)
+        self.last_start = start
+        self.start = start
+
+    def update_cells(self, cells):
+        """Repair the search after the blocked state of some cells changed."""
+        for cell in cells:
+            cell = tuple(cell)
+            self._update_vertex(cell)
+            for neighbour in self._neighbours(cell):
+                self._update_vertex(neighbour)
+
+    def get_path(self, start=None):
+        """
+        Shortest path from the start to the goal.
+
+        Returns:
+            list: Cells after the start up to and including the goal, or None
+                  if the goal cannot be reached
+        """
+        if start is not None and tuple(start) != self.start:
+            self.update_start(start)
+        self.compute_shortest_path()
+
+        if self.g.get(self.start, INFINITY) == INFINITY and self.start != self.goal:
+            return None
+
+        path = []
+        cell = self.start
+        previous_delta = None
+        while cell != self.goal:
+            # Among equally short continuations prefer driving straight (no turn)
+            best = None
+            best_rank = (INFINITY, True)
+            for neighbour in self._neighbours(cell):
+                delta = (neighbour[0] - cell[0], neighbour[1] - cell[1])
+                rank = (self._cost(cell, neighbour) + self.g.get(neighbour, INFINITY), delta != previous_delta)
+                if rank < best_rank:
+                    best, best_rank = neighbour, rank
+            if best is None or best_rank[0] == INFINITY or len(path) > self.grid_rows * self.grid_cols:
+                return None
+            previous_delta = (best[0] - cell[0], best[1] - cell[1])
+            path.append(best)
+            cell = best
+        return path
+
+
+def benchmark_replanning():
+    """Compare incremental repair with planning from scratch on random grids."""
+    print("=== D* Lite Replanning Benchmark ===")
+    print("Grid      | Updates | Incremental (avg) | Full replan (avg) | Speedup")
+    print("-" * 70)
+    rng = random.Random(0)
+    for size in (50, 100, 200):
+        start, goal = (0, 0), (size - 1, size - 1)
+        path = None
+        while path is None:
+            # Random layout with 20% blocked cells, redrawn until the goal is reachable
+            blocked = np.zeros((size, size), dtype=bool)
+            for _ in range(int(size * size * 0.2)):
+                blocked[rng.randrange(size), rng.randrange(size)] = True
+            blocked[start] = blocked[goal] = False
+            planner = DStarLitePlanner(blocked, goal, start)
+            path = planner.get_path()
+
+        incremental_time = 0.0
+        full_time = 0.0
+        updates = 0
+        position = start
+        while path and updates < 50:
+            # Drive a few cells, then block a cell on the remaining path
+            position = path[min(2, len(path) - 1)]
+            if position == goal:
+                break
+            remaining = planner.get_path(position)
+            if not remaining or len(remaining) < 3:
+                break
+            cell = remaining[rng.randrange(1, len(remaining) - 1)]
+            blocked[cell] = True
+
+            start_time = time.perf_counter()
+            planner.update_cells([cell])
+            path = planner.get_path(position)
+            incremental_time += time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            DStarLitePlanner(blocked, goal, position).get_path()
+            full_time += time.perf_counter() - start_time
+            updates += 1
+
+        if updates:
+            print(f"{size:4d}x{size:<4d} | {updates:7d} | {incremental_time / updates * 1000:14.2f}ms | "
+                  f"{full_time / updates * 1000:14.2f}ms | {full_time / max(incremental_time, 1e-9):6.1f}x")
+
+
+if __name__ == "__main__":
+    benchmark_replanning()
@@ -0,0 +1,145 @@
+"""
+Closed-loop exposure control from the lores stream.
+The camera's auto exposure meters the whole scene for a pleasing picture;
+grid detection wants the floor as bright as possible without saturating,
+so the dark tape lines stand out. The controller reads the histogram of
+the grid region on the lores Y plane, takes a high percentile as the
+floor level and scales the total exposure (exposure time x analogue gain)
+towards the target level. Each frame is measured against the exposure it
+was actually taken with (from the frame metadata), so the few frames of
+control latency do not make it overshoot. While the robot moves the
+exposure time is capped and gain makes up the difference, trading noise
+for less motion blur.
+"""
+
+import cv2
+import numpy as np
+from config import *
+
+
+class ExposureController:
+    def __init__(self, target=EXPOSURE_TARGET, percentile=EXPOSURE_PERCENTILE, tolerance=EXPOSURE_TOLERANCE,
+                 max_clipped=EXPOSURE_MAX_CLIPPED, damping=EXPOSURE_DAMPING, region=EXPOSURE_REGION,
+                 initial_time=EXPOSURE_INITIAL_TIME, min_time=EXPOSURE_MIN_TIME, max_time=EXPOSURE_MAX_TIME,
+                 moving_max_time=EXPOSURE_MOVING_MAX_TIME, max_gain=EXPOSURE_MAX_GAIN):
+        """
+        Initialize the controller.
+
+        Args:
+            target (float): Grey level the floor is driven to
+            percentile (float): Histogram percentile taken as the floor level
+            tolerance (float): Grey levels from the target that count as converged
+            max_clipped (float): Saturated fraction above which exposure is at
+                                 least halved
+            damping (float): Exponent on the correction ratio
+            region (tuple): Measured region (x0, y0, x1, y1) as frame fractions
+            initial_time (int): Exposure time (us) before the first measurement
+            min_time (int): Shortest exposure time (us)
+            max_time (int): Longest exposure time (us) while stationary
+            moving_max_time (int): Longest exposure time (us) while moving
+            max_gain (float): Highest analogue gain
+        """
+        self.target = target
+        self.percentile = percentile
+        self.tolerance = tolerance
+        self.max_clipped = max_clipped
+        self.damping = damping
+        self.region = region
+        self.min_time = min_time
+        self.max_time = max_time
+        self.moving_max_time = moving_max_time
+        self.max_gain = max_gain
+        self.moving = False
+        self.exposure = float(initial_time)  # Total exposure: time (us) x gain
+        self.converged = False
+        self.stats = {'frames': 0, 'adjustments': 0}
+
+    def controls(self):
+        """
+        Camera controls for the current total exposure: exposure time up to
+        its cap (lower while moving), then analogue gain.
+
+        Returns:
+            dict: 'AeEnable', 'ExposureTime' (us) and 'AnalogueGain'
+        """
+        time_cap = self.moving_max_time if self.moving else self.max_time
+        exposure_time = int(np.clip(self.exposure, self.min_time, time_cap))
+        gain = float(np.clip(self.exposure / exposure_time, 1.0, self.max_gain))
+        return {'AeEnable': False, 'ExposureTime': exposure_time, 'AnalogueGain': gain}
+
+    def set_moving(self, moving):
+        """
+        Switch the exposure time cap for a moving or stationary robot.
+
+        Returns:
+            dict: Controls to apply, or None if they did not change
+        """
+        if moving == self.moving:
+            return None
+        before = self.controls()
+        self.moving = moving
+        after = self.controls()
+        return after if after != before else None
+
+    def measure(self, gray):
+        """
+        Floor level and saturation of the grid region.
+
+        Args:
+            gray (numpy.ndarray): Grayscale frame (the lores Y plane)
+
+        Returns:
+            tuple: (level at the floor percentile, saturated fraction,
+                    contrast between the floor and the darkest 5%)
+        """
+        height, width = gray.shape[:2]
+        x0, y0, x1, y1 = self.region
+        region = gray[int(y0 * height):int(y1 * height), int(x0 * width):int(x1 * width)]
+        histogram = cv2.calcHist([region], [0], None, [256], [0, 256]).ravel()
+        cumulative = np.cumsum(histogram) / max(histogram.sum(), 1)
+        level = int(np.searchsorted(cumulative, self.percentile / 100))
+        dark = int(np.searchsorted(cumulative, 0.05))
+        clipped = float(cumulative[-1] - cumulative[249])
+        return level, clipped, level - dark
+
+    def update(self, gray, metadata=None):
+        """
+        Measure a frame and compute the next exposure.
+
+        Args:
+            gray (numpy.ndarray): Grayscale frame (the lores Y plane)
+            metadata (dict): Frame metadata with the 'ExposureTime' and
+                             'AnalogueGain' the frame was taken with; without
+                             it the last commanded exposure is assumed
+
+        Returns:
+            dict: Controls to apply, or None while the exposure is on target
+        """
+        self.stats['frames'] += 1
+        level, clipped, _ = self.measure(gray)
+        if metadata and 'ExposureTime' in metadata:
+            frame_exposure = metadata['ExposureTime'] * metadata.get('AnalogueGain', 1.0)
+        else:
+            frame_exposure = self.exposure
+
+        if level >= 250:
+            # The floor itself is saturated: no telling how bright it really is
+            ratio = 0.25
+        elif clipped > self.max_clipped:
+            ratio = min(self.target / max(level, 1), 0.5)
+        elif abs(level - self.target) <= self.tolerance:
+            self.converged = True
+            return None
+        else:
+            ratio = np.clip(self.target / max(level, 1), 0.125, 8.0) ** self.damping
+
+        self.converged = False
+        before = self.controls()
+        time_cap = self.moving_max_time if self.moving else self.max_time
+        self.exposure = float(np.clip(frame_exposure * ratio, self.min_time, time_cap * self.max_gain))
+        after = self.controls()
+        if after == before:
+            # At a limit: nothing more to change
+            return None
+        self.stats['adjustments'] += 1
+        return after
@@ -0,0 +1,74 @@
+"""
+Reusable frame buffers for the vision path.
+OpenCV functions write into preallocated destination arrays (dst=) from a
+pool instead of allocating full-size images on every frame, and the
+morphology kernels are built once. Pooled buffers are overwritten by the
+next frame, so callers that keep a result across frames must copy it.
+"""
+
+import functools
+import cv2
+import numpy as np
+from config import *
+
+
+@functools.lru_cache(maxsize=None)
+def structuring_element(shape, size):
+    """
+    Cached morphology kernel (do not modify the returned array).
+
+    Args:
+        shape (int): cv2.MORPH_RECT, cv2.MORPH_CROSS or cv2.MORPH_ELLIPSE
+        size (tuple): Kernel (width, height)
+    """
+    return cv2.getStructuringElement(shape, size)
+
+
+class FrameBufferPool:
+    def __init__(self, enabled=FRAME_BUFFER_POOL):
+        """
+        Initialize an empty pool.
+
+        Args:
+            enabled (bool): Reuse buffers; when False get() returns None, so
+                            OpenCV allocates a new destination on every call
+        """
+        self.enabled = enabled
+        self.buffers = {}
+        self.stats = {'requests': 0, 'allocations': 0}
+
+    def get(self, name, shape, dtype=np.uint8):
+        """
+        Destination buffer for one stage of the vision path.
+
+        The buffer is reused while the requested shape and type stay the
+        same and reallocated when they change (e.g. a new frame size).
+
+        Args:
+            name (str): Stage name, one buffer per name
+            shape (tuple): Array shape
+            dtype: Array type
+
+        Returns:
+            numpy.ndarray: The buffer (contents undefined), or None when the
+                           pool is disabled
+        """
+        self.stats['requests'] += 1
+        if not self.enabled:
+            self.stats['allocations'] += 1
+            return None
+        shape = tuple(shape)
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self.buffers[name] = buffer
+            self.stats['allocations'] += 1
+        return buffer
+
+    def nbytes(self):
+        """Memory held by the pool in bytes."""
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+    def clear(self):
+        """Release all buffers."""
+        self.buffers.clear()
@@ -0,0 +1,144 @@
+"""
+Frame quality gate for the camera.
+Cheap checks on the low-resolution (lores) stream reject badly exposed or
+blurred frames before the expensive grid detection runs on them: mean
+brightness, the fraction of clipped (black or saturated) pixels, and
+sharpness as the variance of the Laplacian. Sharpness depends on the scene,
+so besides an absolute floor a frame must be at least a fraction as sharp
+as the recently accepted frames; motion blur shows up against them. When
+no frame passes after the retries, the history restarts from the frame used.
+"""
+
+import time
+from collections import deque
+import cv2
+import numpy as np
+from config import *
+
+
+def lores_gray(image, size=CAMERA_LORES_SIZE):
+    """Grayscale frame at lores size, for frames that come without a lores stream."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+class FrameQualityGate:
+    def __init__(self, min_brightness=FRAME_MIN_BRIGHTNESS, max_brightness=FRAME_MAX_BRIGHTNESS,
+                 max_clipped=FRAME_MAX_CLIPPED, min_sharpness=FRAME_MIN_SHARPNESS,
+                 relative_sharpness=FRAME_RELATIVE_SHARPNESS, history=FRAME_SHARPNESS_HISTORY,
+                 step=FRAME_QUALITY_SUBSAMPLE):
+        """
+        Initialize the gate.
+
+        Args:
+            min_brightness (float): Darker frames are rejected (mean grey level)
+            max_brightness (float): Brighter frames are rejected
+            max_clipped (float): Largest fraction of black or saturated pixels
+            min_sharpness (float): Absolute Laplacian variance floor
+            relative_sharpness (float): Fraction of the recent median sharpness
+                                        a frame must reach
+            history (int): Accepted frames the recent median is taken over
+            step (int): Subsampling step over the lores frame
+        """
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped = max_clipped
+        self.min_sharpness = min_sharpness
+        self.relative_sharpness = relative_sharpness
+        self.step = step
+        self.recent_sharpness = deque(maxlen=history)
+        self.stats = {'frames': 0, 'skipped': 0, 'dark': 0, 'bright': 0, 'clipped': 0, 'blurred': 0,
+                      'check_time': 0.0}
+
+    def measure(self, gray):
+        """
+        Quality metrics of a grayscale (lores Y plane) frame.
+
+        Returns:
+            dict: 'brightness' (mean grey level), 'clipped' (fraction of
+                  pixels at or below 5 or at or above 250) and 'sharpness'
+                  (variance of the Laplacian)
+        """
+        sample = gray[::self.step, ::self.step]
+        brightness = float(cv2.mean(sample)[0])
+        clipped = (np.count_nonzero(sample <= 5) + np.count_nonzero(sample >= 250)) / sample.size
+        _, std = cv2.meanStdDev(cv2.Laplacian(sample, cv2.CV_16S, ksize=1))
+        return {'brightness': brightness, 'clipped': clipped, 'sharpness': float(std[0, 0]) ** 2}
+
+    def check(self, gray):
+        """
+        Decide whether a frame is worth running detection on.
+
+        Args:
+            gray (numpy.ndarray): Grayscale frame, normally the lores Y plane
+
+        Returns:
+            tuple: (accepted, reason, metrics); reason is None for accepted
+                   frames, otherwise 'dark', 'bright', 'clipped' or 'blurred'
+        """
+        start_time = time.perf_counter()
+        metrics = self.measure(gray)
+        reason = None
+        if metrics['brightness'] < self.min_brightness:
+            reason = 'dark'
+        elif metrics['brightness'] > self.max_brightness:
+            reason = 'bright'
+        elif metrics['clipped'] > self.max_clipped:
+            reason = 'clipped'
+        elif metrics['sharpness'] < self.sharpness_threshold():
+            reason = 'blurred'
+
+        if reason is None:
+            self.recent_sharpness.append(metrics['sharpness'])
+        else:
+            self.stats[reason] += 1
+            self.stats['skipped'] += 1
+        self.stats['frames'] += 1
+        self.stats['check_time'] += time.perf_counter() - start_time
+        return reason is None, reason, metrics
+
+    def use_anyway(self, reason, metrics):
+        """
+        Note that a rejected frame is used because no better one came.
+
+        If every retry was rejected as blurred, the view has most likely
+        changed to a less textured one rather than staying blurred, so the
+        sharpness history restarts from this frame; otherwise the old median
+        would reject the new view forever.
+
+        Args:
+            reason (str): Why the frame was rejected
+            metrics (dict): The frame's metrics from check()
+        """
+        if reason == 'blurred':
+            self.recent_sharpness.clear()
+            self.recent_sharpness.append(metrics['sharpness'])
+
+    def sharpness_threshold(self):
+        """Sharpness a frame needs: the absolute floor or the relative bar, whichever is higher."""
+        if not self.recent_sharpness:
+            return self.min_sharpness
+        return max(self.min_sharpness, self.relative_sharpness * float(np.median(self.recent_sharpness)))
+
+    def skip_rate(self):
+        """Fraction of checked frames that were rejected."""
+        return self.stats['skipped'] / self.stats['frames'] if self.stats['frames'] else 0.0
+
+    def summary(self, detection_ms=None):
+        """
+        One-line report of the gate's decisions.
+
+        Args:
+            detection_ms (float): Average detection time per frame; when
+                                  given, the detection time saved is included
+        """
+        stats = self.stats
+        reasons = ", ".join(f"{reason} {stats[reason]}" for reason in ('dark', 'bright', 'clipped', 'blurred')
+                            if stats[reason])
+        check_ms = stats['check_time'] / stats['frames'] * 1000 if stats['frames'] else 0.0
+        text = (f"Frame gate: skipped {stats['skipped']}/{stats['frames']} ({self.skip_rate():.0%})"
+                f"{f' [{reasons}]' if reasons else ''}, {check_ms:.2f}ms per check")
+        if detection_ms is not None:
+            saved = stats['skipped'] * detection_ms - stats['check_time'] * 1000
+            text += f", detection time saved {saved:.0f}ms"
+        return text
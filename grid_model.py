@@ -0,0 +1,415 @@
+"""
+Lattice model fitting for grid detection.
+Fits two families of evenly spaced grid lines (under perspective) to detected
+line segments with RANSAC, then computes cell corners analytically.
+
+Each family is modelled in homogeneous coordinates as l(k) = a + k * b: the
+image of equally spaced parallel floor lines is linear in the line index k,
+all lines pass through the vanishing point a x b, and missing lines simply
+leave gaps in the observed indices.
+"""
+
+import time
+import tracemalloc
+import numpy as np
+from config import *
+
+
+def segments_to_lines(segments):
+    """
+    Convert segments to unit-normal homogeneous lines.
+
+    Args:
+        segments (numpy.ndarray): (n, 4) array of x1, y1, x2, y2
+
+    Returns:
+        tuple: (lines (n, 3) with a*x + b*y + c = 0 and a^2 + b^2 = 1,
+                endpoints (n, 2, 3) homogeneous points, lengths (n,))
+    """
+    segments = np.asarray(segments, dtype=float).reshape(-1, 4)
+    p1 = np.column_stack([segments[:, 0], segments[:, 1], np.ones(len(segments))])
+    p2 = np.column_stack([segments[:, 2], segments[:, 3], np.ones(len(segments))])
+    lines = _cross(p1, p2)
+    norms = np.hypot(lines[:, 0], lines[:, 1])
+    norms[norms == 0] = 1.0
+    lines = lines / norms[:, np.newaxis]
+    lengths = np.hypot(segments[:, 2] - segments[:, 0], segments[:, 3] - segments[:, 1])
+    return lines, np.stack([p1, p2], axis=1), lengths
+
+
+def _cross(u, v):
+    """Cross product of 3-vectors along the last axis (cheaper than np.cross for small arrays)."""
+    return np.stack([
+        u[..., 1] * v[..., 2] - u[..., 2] * v[..., 1],
+        u[..., 2] * v[..., 0] - u[..., 0] * v[..., 2],
+        u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0],
+    ], axis=-1)
+
+
+def _orient(lines, reference):
+    """Flip line signs so their normals point the same way as the reference."""
+    signs = np.sign(lines[:, :2] @ reference[:2])
+    signs[signs == 0] = 1.0
+    return lines * signs[:, np.newaxis]
+
+
+def _point_line_distances(lines, endpoints):
+    """
+    Mean endpoint distance of every segment to every candidate line.
+
+    Args:
+        lines (numpy.ndarray): (m, 3) homogeneous lines
+        endpoints (numpy.ndarray): (n, 2, 3) homogeneous segment endpoints
+
+    Returns:
+        numpy.ndarray: (n, m) distances in pixels
+    """
+    norms = np.hypot(lines[:, 0], lines[:, 1])
+    norms[norms == 0] = 1e-12
+    distances = np.abs(endpoints @ lines.T) / norms  # (n, 2, m)
+    return distances.mean(axis=1)
+
+
+class LatticeFamily:
+    def __init__(self, a, b, indices, inliers, residual):
+        """
+        One family of evenly spaced lines, l(k) = a + k * b.
+
+        Args:
+            a (numpy.ndarray): Homogeneous line for index 0
+            b (numpy.ndarray): Homogeneous line increment per index
+            indices (numpy.ndarray): Lattice index of each inlier segment
+            inliers (numpy.ndarray): Boolean inlier mask over the input segments
+            residual (float): RMS endpoint distance of inliers to the model (px)
+        """
+        self.a = a
+        self.b = b
+        self.indices = indices
+        self.inliers = inliers
+        self.residual = residual
+        self.k_min = int(indices.min())
+        self.k_max = int(indices.max())
+
+    def line(self, k):
+        """Homogeneous line with index k."""
+        return self.a + k * self.b
+
+    def vanishing_point(self):
+        """Vanishing point (x, y) of the family, or None if lines are parallel in the image."""
+        point = _cross(self.a, self.b)
+        if abs(point[2]) < 1e-9 * max(1.0, np.abs(point[:2]).max()):
+            return None
+        return (point[0] / point[2], point[1] / point[2])
+
+    def orientation(self):
+        """Direction angle of the lines in degrees, in [0, 180)."""
+        line = self.line((self.k_min + self.k_max) / 2)
+        return float(np.degrees(np.arctan2(line[0], -line[1])) % 180)
+
+    def spacing(self, x, y):
+        """Distance in pixels between neighbouring lines near the point (x, y)."""
+        k = (self.k_min + self.k_max) / 2
+        first, second = self.line(k), self.line(k + 1)
+        point = np.array([x, y, 1.0])
+        return abs(point @ second / np.hypot(*second[:2]) - point @ first / np.hypot(*first[:2]))
+
+
+def fit_lattice_family(segments, tolerance=6.0, max_gap=3, iterations=200, sample_size=8, rng=None,
+                       max_segments=LATTICE_MAX_SEGMENTS):
+    """
+    Fit an evenly spaced line family to segments with RANSAC.
+
+    Minimal samples are two segments plus a guess of how many lattice steps
+    separate them (1..max_gap), which tolerates missing lines. The consensus
+    set is refined with a least-squares fit of a and b. Hypotheses are
+    scored against the longest max_segments segments over only the line
+    indices that fit across the segments' extent, so the cost stays bounded
+    however many fragments the detector returns; every segment is assigned
+    to the refined model at the end.
+
+    Args:
+        segments (list): (x1, y1, x2, y2) segments believed to be one family
+        tolerance (float): Inlier distance in pixels
+        max_gap (int): Largest index gap tried between the two sampled lines
+        iterations (int): Maximum number of sampled segment pairs
+        sample_size (int): Number of longest segments pairs are drawn from
+        rng (numpy.random.Generator): Random source for large inputs
+        max_segments (int): Number of longest segments hypotheses are scored on
+
+    Returns:
+        LatticeFamily: The fitted family, or None if fewer than two lines fit
+    """
+    if len(segments) < 2:
+        return None
+    lines, endpoints, lengths = segments_to_lines(segments)
+    lines = _orient(lines, lines[np.argmax(lengths)])
+
+    # Sort segments across the family so sampled pairs have a known order
+    centers = endpoints.mean(axis=1)[:, :2]
+    normal = lines[np.argmax(lengths), :2]
+    order = np.argsort(centers @ normal)
+    lines, endpoints, lengths = lines[order], endpoints[order], lengths[order]
+    n = len(lines)
+
+    # Score hypotheses on the longest segments only; fragments add cost, not information
+    scored = np.sort(np.argsort(lengths)[::-1][:max_segments])
+    s_lines, s_endpoints, s_lengths = lines[scored], endpoints[scored], lengths[scored]
+    s_count = len(scored)
+
+    # Hypotheses come from the longest segments (short ones are often fragments
+    # of a line already sampled), but are scored against all scored segments
+    pool = sorted(np.argsort(s_lengths)[::-1][:sample_size])
+    pairs = [(i, j) for index, i in enumerate(pool) for j in pool[index + 1:]]
+    if len(pairs) > iterations:
+        rng = rng or np.random.default_rng(0)
+        pairs = [pairs[index] for index in rng.choice(len(pairs), iterations, replace=False)]
+
+    # Every hypothesis (pair, gap) with its line spacing near the sampled pair
+    positions = centers[order] @ normal
+    first = np.array([scored[i] for i, j in pairs for gap in range(1, max_gap + 1)])
+    second = np.array([scored[j] for i, j in pairs for gap in range(1, max_gap + 1)])
+    gaps = np.array([gap for i, j in pairs for gap in range(1, max_gap + 1)], dtype=float)
+    spacings = np.abs(positions[second] - positions[first]) / gaps
+    keep = spacings >= LATTICE_MIN_SPACING
+    if not keep.any():
+        return None
+    first, second, gaps, spacings = first[keep], second[keep], gaps[keep], spacings[keep]
+
+    # Lines can only be indexed as far as the segments reach: bound k by the
+    # extent across the family over the finest hypothesised spacing (with room
+    # for perspective, which packs the far lines closer)
+    extent = positions[-1] - positions[0]
+    k_limit = int(np.ceil(LATTICE_PERSPECTIVE_MARGIN * extent / spacings.min())) + 1
+    k_limit = min(k_limit, max_gap * n)
+    k_range = np.arange(-k_limit, k_limit + 1)
+    slot_penalty = 0.5 * np.median(s_lengths)
+
+    # All hypotheses evaluated at once: (hypotheses, k, 3) candidate lines
+    a_all = lines[first]
+    b_all = (lines[second] - lines[first]) / gaps[:, np.newaxis]
+    candidates = a_all[:, np.newaxis, :] + k_range[np.newaxis, :, np.newaxis] * b_all[:, np.newaxis, :]
+    hypotheses, k_count = candidates.shape[:2]
+
+    distances = _point_line_distances(candidates.reshape(-1, 3), s_endpoints).reshape(s_count, hypotheses, k_count)
+    nearest = np.argmin(distances, axis=2)  # (s_count, hypotheses)
+    nearest_distance = np.take_along_axis(distances, nearest[:, :, np.newaxis], axis=2)[:, :, 0]
+    inliers = nearest_distance < tolerance
+
+    # Penalize empty lattice slots so a lattice at half the true spacing
+    # (which also explains every line) loses against the real one
+    occupied = np.zeros((hypotheses, k_count), dtype=bool)
+    segment_ids, hypothesis_ids = np.nonzero(inliers)
+    occupied[hypothesis_ids, nearest[segment_ids, hypothesis_ids]] = True
+    any_occupied = occupied.any(axis=1)
+    low = np.argmax(occupied, axis=1)
+    high = k_count - 1 - np.argmax(occupied[:, ::-1], axis=1)
+    empty = np.where(any_occupied, high - low + 1 - occupied.sum(axis=1), 0)
+    scores = (s_lengths[:, np.newaxis] * inliers).sum(axis=0) - slot_penalty * empty
+    scores[~any_occupied] = -np.inf
+
+    best = int(np.argmax(scores))  # First maximum: smallest gap wins ties
+    a, b = a_all[best], b_all[best]
+    indices, inliers = k_range[nearest[:, best]], inliers[:, best]
+    if np.unique(indices[inliers]).size < 2:
+        return None
+    a, b = _refine(s_lines[inliers], indices[inliers], s_lengths[inliers], a, b)
+
+    # Re-assign every segment to the refined model, refine on all of them
+    # when only the longest were scored, and compute the residual
+    for final in (s_count == n, True):
+        candidates = a[np.newaxis, :] + k_range[:, np.newaxis] * b[np.newaxis, :]
+        distances = _point_line_distances(candidates, endpoints)
+        nearest = np.argmin(distances, axis=1)
+        point_distances = distances[np.arange(n), nearest]
+        inliers = point_distances < tolerance
+        if np.unique(k_range[nearest][inliers]).size < 2:
+            return None
+        if final:
+            break
+        a, b = _refine(lines[inliers], k_range[nearest][inliers], lengths[inliers], a, b)
+
+    # Undo the sort so the mask lines up with the caller's segments
+    mask = np.zeros(n, dtype=bool)
+    mask[order[inliers]] = True
+    residual = float(np.sqrt(np.mean(point_distances[inliers] ** 2)))
+    return LatticeFamily(a, b, k_range[nearest][inliers], mask, residual)
+
+
+def refit_lattice_family(family, segments, indices):
+    """
+    Refit a tracked family to new segments whose lattice indices are known,
+    skipping the RANSAC search.
+
+    Args:
+        family (LatticeFamily): The family the segments were tracked from
+        segments (list): (x1, y1, x2, y2) segments, one per tracked line
+        indices (list): Lattice index of each segment in the old family
+
+    Returns:
+        LatticeFamily: The refitted family, or None if fewer than two lines
+    """
+    indices = np.asarray(indices)
+    if np.unique(indices).size < 2:
+        return None
+    lines, endpoints, lengths = segments_to_lines(segments)
+    lines = _orient(lines, family.line((family.k_min + family.k_max) / 2))
+
+    if np.unique(indices).size >= 3:
+        a, b = _refine(lines, indices, lengths, family.a, family.b)
+    else:
+        # Two lines fix the family exactly once each is given the old scale
+        first, last = np.argmin(indices), np.argmax(indices)
+        scaled = [lines[i] * np.hypot(*family.line(indices[i])[:2]) for i in (first, last)]
+        b = (scaled[1] - scaled[0]) / (indices[last] - indices[first])
+        a = scaled[0] - indices[first] * b
+
+    candidates = a[np.newaxis, :] + indices[:, np.newaxis] * b[np.newaxis, :]
+    norms = np.hypot(candidates[:, 0], candidates[:, 1])
+    distances = np.abs(np.einsum('npj,nj->np', endpoints, candidates)) / norms[:, np.newaxis]
+    residual = float(np.sqrt(np.mean(distances ** 2)))
+    return LatticeFamily(a, b, indices, np.ones(len(indices), dtype=bool), residual)
+
+
+def _refine(lines, indices, weights, a, b):
+    """
+    Least-squares refinement of l(k) = a + k * b from indexed lines.
+
+    Each observed line must be parallel (as a 3-vector) to a + k * b, i.e.
+    line x (a + k * b) = 0, which is linear in the six unknowns.
+    """
+    if np.unique(indices).size < 3:
+        return a, b
+    zeros = np.zeros(len(lines))
+    skew = np.stack([
+        np.stack([zeros, -lines[:, 2], lines[:, 1]], axis=1),
+        np.stack([lines[:, 2], zeros, -lines[:, 0]], axis=1),
+        np.stack([-lines[:, 1], lines[:, 0], zeros], axis=1),
+    ], axis=1)  # (n, 3, 3)
+    k = np.asarray(indices, dtype=float)[:, np.newaxis, np.newaxis]
+    rows = np.sqrt(np.asarray(weights, dtype=float))[:, np.newaxis, np.newaxis] * np.concatenate([skew, k * skew], axis=2)
+    _, _, vt = np.linalg.svd(rows.reshape(-1, 6), full_matrices=False)
+    solution = vt[-1]
+    a_new, b_new = solution[:3], solution[3:]
+
+    # Restore the scale/sign of the initial guess so indices keep their meaning
+    scale = (a_new @ a) / max(a_new @ a_new, 1e-12)
+    if not np.isfinite(scale) or scale == 0:
+        return a, b
+    return a_new * scale, b_new * scale
+
+
+class GridModel:
+    def __init__(self, horizontal, vertical):
+        """
+        A fitted grid: one horizontal and one vertical line family.
+
+        Args:
+            horizontal (LatticeFamily): Lines running left-right
+            vertical (LatticeFamily): Lines running top-bottom
+        """
+        self.horizontal = horizontal
+        self.vertical = vertical
+
+    def residual(self):
+        """RMS distance (px) of the inlier segments from the model."""
+        return max(self.horizontal.residual, self.vertical.residual)
+
+    def corner(self, h_index, v_index):
+        """Intersection (x, y) of horizontal line h_index and vertical line v_index."""
+        point = _cross(self.horizontal.line(h_index), self.vertical.line(v_index))
+        if abs(point[2]) < 1e-12:
+            return None
+        return (point[0] / point[2], point[1] / point[2])
+
+    def cells(self, width=CAMERA_WIDTH, height=CAMERA_HEIGHT):
+        """
+        Grid cells between consecutive model lines, in the repo's cell format.
+
+        Only cells whose center lies in the image are returned. Rows count
+        from the top of the image and columns from the left.
+        """
+        h_indices = self._ordered_indices(self.horizontal, lambda p: p[1], width, height)
+        v_indices = self._ordered_indices(self.vertical, lambda p: p[0], width, height)
+
+        # All lattice corners at once: intersections of every h line with every v line
+        h_lines = np.array([self.horizontal.line(k) for k in h_indices])
+        v_lines = np.array([self.vertical.line(k) for k in v_indices])
+        points = _cross(h_lines[:, np.newaxis, :], v_lines[np.newaxis, :, :])
+        valid = np.abs(points[:, :, 2]) > 1e-12
+        points[:, :, 2][~valid] = 1.0
+        xs = points[:, :, 0] / points[:, :, 2]
+        ys = points[:, :, 1] / points[:, :, 2]
+
+        cells = []
+        for row in range(len(h_indices) - 1):
+            for col in range(len(v_indices) - 1):
+                if not valid[row:row + 2, col:col + 2].all():
+                    continue
+                corners = [(xs[row, col], ys[row, col]), (xs[row, col + 1], ys[row, col + 1]),
+                           (xs[row + 1, col], ys[row + 1, col]), (xs[row + 1, col + 1], ys[row + 1, col + 1])]
+                center_x = sum(corner[0] for corner in corners) / 4
+                center_y = sum(corner[1] for corner in corners) / 4
+                if not (0 <= center_x < width and 0 <= center_y < height):
+                    continue
+                cells.append({
+                    'center': (int(center_x), int(center_y)),
+                    'corners': [(int(x), int(y)) for x, y in corners],
+                    'row': row,
+                    'col': col
+                })
+        return cells
+
+    def _ordered_indices(self, family, coordinate, width, height):
+        """Observed index range of a family, ordered top-to-bottom or left-to-right."""
+        indices = list(range(family.k_min, family.k_max + 1))
+        other = self.vertical if family is self.horizontal else self.horizontal
+        middle = (other.k_min + other.k_max) / 2
+        first = self.corner(indices[0], middle) if family is self.horizontal else self.corner(middle, indices[0])
+        last = self.corner(indices[-1], middle) if family is self.horizontal else self.corner(middle, indices[-1])
+        if first is not None and last is not None and coordinate(first) > coordinate(last):
+            indices.reverse()
+        return indices
+
+
+def fit_grid_model(h_segments, v_segments, tolerance=6.0):
+    """
+    Fit a grid model to horizontal and vertical segments.
+
+    Returns:
+        GridModel: The model, or None if either family could not be fitted
+    """
+    horizontal = fit_lattice_family(h_segments, tolerance)
+    vertical = fit_lattice_family(v_segments, tolerance)
+    if horizontal is None or vertical is None:
+        return None
+    return GridModel(horizontal, vertical)
+
+
+def benchmark_lattice_fit(segment_counts=(10, 30, 100, 200, 400), spacing=90.0, lines=6, seed=0):
+    """Time and peak memory of one lattice fit as the detector returns more fragments."""
+    print("=== Lattice Fit Benchmark ===")
+    print("Segments | Time (ms) | Peak memory | Lines | Inliers | Spacing")
+    print("-" * 62)
+    rng = np.random.default_rng(seed)
+    fit_lattice_family([(0, 0, 50, 0), (0, spacing, 50, spacing)])  # Warm up numpy before timing
+    for count in segment_counts:
+        # Fragments of evenly spaced horizontal lines
+        y = 25.0 + spacing * (np.arange(count) % lines) + rng.normal(0, 1.0, count)
+        x = rng.uniform(0, CAMERA_WIDTH - 80, count)
+        segments = np.column_stack([x, y, x + rng.uniform(20, 80, count), y + rng.normal(0, 1.0, count)])
+
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        family = fit_lattice_family(segments)
+        fit_time = time.perf_counter() - start_time
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if family is None:
+            print(f"{count:8d} | {fit_time * 1000:9.1f} | {peak / 1e6:8.1f} MB | no fit")
+            continue
+        print(f"{count:8d} | {fit_time * 1000:9.1f} | {peak / 1e6:8.1f} MB | {family.k_max - family.k_min + 1:5d} | "
+              f"{int(family.inliers.sum()):7d} | {family.spacing(CAMERA_WIDTH / 2, CAMERA_HEIGHT / 2):6.1f}px")
+
+
+if __name__ == "__main__":
+    benchmark_lattice_fit()
@@ -0,0 +1,183 @@
+"""
+Array-backed grid state for navigation.
+Keeps the visited bitmap, the blocked (occupancy) bitmap, the target mask and
+a cursor into the target order so completion checks are O(1) and next-target
+retrieval is amortized O(1).
+"""
+
+import time
+import numpy as np
+from config import *
+
+
+class GridState:
+    def __init__(self, grid_rows=GRID_ROWS, grid_cols=GRID_COLS):
+        """
+        Initialize an empty grid state.
+
+        Args:
+            grid_rows (int): Number of grid rows
+            grid_cols (int): Number of grid columns
+        """
+        self.grid_rows = grid_rows
+        self.grid_cols = grid_cols
+        self.visited = np.zeros((grid_rows, grid_cols), dtype=bool)
+        self.blocked = np.zeros((grid_rows, grid_cols), dtype=bool)
+        self.target_mask = np.zeros((grid_rows, grid_cols), dtype=bool)
+        self.target_order = np.zeros(0, dtype=np.int64)  # Flat cell indices in visiting order
+        self.cursor = 0  # Every target before the cursor is visited or blocked
+        self.visited_count = 0
+        self.visited_target_count = 0
+        self.blocked_count = 0
+        self.blocked_target_count = 0  # Unvisited targets that are blocked
+
+    def set_targets(self, target_cells):
+        """
+        Set the targets to visit, in order. Duplicates and cells outside the
+        grid are dropped. Cells already visited stay visited.
+
+        Returns:
+            list: The accepted target cells
+        """
+        accepted = []
+        seen = set()
+        for row, col in target_cells:
+            if 0 <= row < self.grid_rows and 0 <= col < self.grid_cols and (row, col) not in seen:
+                seen.add((row, col))
+                accepted.append((row, col))
+            elif (row, col) not in seen:
+                print(f"Warning: target cell ({row}, {col}) is outside the grid, ignoring")
+
+        self.target_mask[:] = False
+        if accepted:
+            cells = np.array(accepted, dtype=np.int64)
+            self.target_order = cells[:, 0] * self.grid_cols + cells[:, 1]
+            self.target_mask.flat[self.target_order] = True
+        else:
+            self.target_order = np.zeros(0, dtype=np.int64)
+        self.visited_target_count = int(np.count_nonzero(self.visited & self.target_mask))
+        self._count_blocked_targets()
+        self.cursor = 0
+        return accepted
+
+    def _count_blocked_targets(self):
+        """Recount the unvisited targets that are blocked."""
+        self.blocked_target_count = int(np.count_nonzero(self.blocked & self.target_mask & ~self.visited))
+
+    def mark_visited(self, row, col):
+        """Mark a cell as visited. Returns True if it had not been visited before."""
+        if self.visited[row, col]:
+            return False
+        self.visited[row, col] = True
+        self.visited_count += 1
+        if self.target_mask[row, col]:
+            self.visited_target_count += 1
+            if self.blocked[row, col]:
+                self.blocked_target_count -= 1
+        return True
+
+    def mark_blocked(self, row, col, blocked=True):
+        """
+        Mark a cell as blocked (or free again). Blocked targets are skipped.
+
+        Returns:
+            bool: True if the cell's state changed
+        """
+        if self.blocked[row, col] == blocked:
+            return False
+        self.blocked[row, col] = blocked
+        self.blocked_count += 1 if blocked else -1
+        if self.target_mask[row, col] and not self.visited[row, col]:
+            self.blocked_target_count += 1 if blocked else -1
+            if not blocked:
+                # The cursor may have skipped this target, move it back
+                position = int(np.flatnonzero(self.target_order == row * self.grid_cols + col)[0])
+                self.cursor = min(self.cursor, position)
+        return True
+
+    def is_blocked(self, row, col):
+        """Check whether a cell is blocked."""
+        return bool(self.blocked[row, col])
+
+    def is_visited(self, row, col):
+        """Check whether a cell has been visited."""
+        return bool(self.visited[row, col])
+
+    def next_target(self):
+        """Get the first unvisited, unblocked target in visiting order, or None."""
+        # The cursor only moves forward, so the total scan over a mission is O(N)
+        visited = self.visited.reshape(-1)
+        blocked = self.blocked.reshape(-1)
+        order = self.target_order
+        while self.cursor < len(order) and (visited[order[self.cursor]] or blocked[order[self.cursor]]):
+            self.cursor += 1
+        if self.cursor == len(order):
+            return None
+        return divmod(int(order[self.cursor]), self.grid_cols)
+
+    def remaining_targets(self):
+        """Get the unvisited, unblocked targets in visiting order."""
+        self.next_target()  # Skip the visited prefix
+        order = self.target_order[self.cursor:]
+        order = order[~(self.visited.reshape(-1)[order] | self.blocked.reshape(-1)[order])]
+        return [divmod(int(index), self.grid_cols) for index in order]
+
+    def target_count(self):
+        """Total number of targets."""
+        return len(self.target_order)
+
+    def remaining_count(self):
+        """Number of targets not yet visited (blocked targets excluded)."""
+        return len(self.target_order) - self.visited_target_count - self.blocked_target_count
+
+    def is_complete(self):
+        """Check whether every reachable target has been visited (O(1))."""
+        return self.remaining_count() <= 0
+
+    def visited_cells(self):
+        """Get the visited cells as a set of (row, col) tuples."""
+        rows, cols = np.nonzero(self.visited)
+        return set(zip(rows.tolist(), cols.tolist()))
+
+    def clear_visited(self):
+        """Forget all visited cells."""
+        self.visited[:] = False
+        self.visited_count = 0
+        self.visited_target_count = 0
+        self._count_blocked_targets()
+        self.cursor = 0
+
+
+def benchmark_grid_state():
+    """Simulate full-coverage missions and time the per-step bookkeeping."""
+    print("=== Grid State Benchmark ===")
+    print("Grid      | Cells     | Array state | Per step | Set/list state")
+    print("-" * 66)
+    for size in (10, 50, 100, 300, 1000):
+        targets = [(row, col) for row in range(size) for col in range(size)]
+
+        state = GridState(size, size)
+        state.set_targets(targets)
+        start_time = time.perf_counter()
+        while not state.is_complete():
+            row, col = state.next_target()
+            state.mark_visited(row, col)
+        array_time = time.perf_counter() - start_time
+
+        # Previous representation: set of tuples plus a linear scan per step
+        if size <= 100:
+            visited = set()
+            start_time = time.perf_counter()
+            while len(visited) < len(targets):
+                target = next(t for t in targets if t not in visited)
+                visited.add(target)
+            legacy = f"{time.perf_counter() - start_time:10.3f}s"
+        else:
+            legacy = "    (skipped, O(N^2))"
+
+        print(f"{size:4d}x{size:<4d} | {len(targets):9d} | {array_time:10.3f}s | "
+              f"{array_time / len(targets) * 1e6:6.2f}us | {legacy}")
+
+
+if __name__ == "__main__":
+    benchmark_grid_state()
@@ -0,0 +1,510 @@
+"""
+Tracking of grid lines between frames.
+Each grid line has a Kalman filter over its position and slope. Once a grid
+detection is locked, frames are served by predicting every line and
+re-finding it in small windows around the prediction; full-frame detection
+only runs every TRACKING_FULL_DETECTION_INTERVAL frames (its lines are
+associated with the existing tracks) or when the lock is lost.
+"""
+
+import cv2
+import numpy as np
+from config import *
+from grid_model import GridModel, LatticeFamily, refit_lattice_family
+
+TURN_COMMANDS = ('turn_left', 'turn_right', 'pivot_left', 'pivot_right')
+
+# Replicated border (px) added around frames so every search window lies inside
+FRAME_PADDING = TRACKING_MAX_BAND + 1
+
+
+class LineTracks:
+    def __init__(self):
+        """
+        Initialize an empty set of Kalman filters, one per line of a family.
+
+        Each state is (position, velocity, slope): the line's position across
+        itself at the frame center (px), its change per frame and its slope.
+        All filters are updated together as arrays.
+        """
+        self.indices = np.zeros(0, dtype=int)  # Lattice index of each line
+        self.state = np.zeros((0, 3))
+        self.covariance = np.zeros((0, 3, 3))
+        self.misses = np.zeros(0, dtype=int)  # Consecutive frames without a measurement
+
+    def __len__(self):
+        return len(self.indices)
+
+    def add(self, indices, positions, slopes):
+        """Start tracks for newly seen lines."""
+        count = len(indices)
+        state = np.column_stack([positions, np.zeros(count), slopes])
+        covariance = np.tile(np.diag([TRACKING_MEASUREMENT_NOISE ** 2, TRACKING_VELOCITY_NOISE ** 2, 1e-4]),
+                             (count, 1, 1))
+        self.indices = np.concatenate([self.indices, np.asarray(indices, dtype=int)])
+        self.state = np.concatenate([self.state, state])
+        self.covariance = np.concatenate([self.covariance, covariance])
+        self.misses = np.concatenate([self.misses, np.zeros(count, dtype=int)])
+        order = np.argsort(self.indices)
+        self.keep(order)
+
+    def keep(self, selection):
+        """Keep only the selected tracks (boolean mask or index array)."""
+        self.indices = self.indices[selection]
+        self.state = self.state[selection]
+        self.covariance = self.covariance[selection]
+        self.misses = self.misses[selection]
+
+    def predict(self):
+        """Advance every filter by one frame (constant velocity)."""
+        transition = np.array([[1.0, 1.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+        noise = np.diag([TRACKING_PROCESS_NOISE ** 2, TRACKING_VELOCITY_NOISE ** 2, 1e-6])
+        self.state = self.state @ transition.T
+        self.covariance = transition @ self.covariance @ transition.T + noise
+
+    def inflate(self, position_std):
+        """Add position uncertainty (unmodelled motion such as drift during a move)."""
+        self.covariance[:, 0, 0] += position_std ** 2
+
+    def _innovation(self, state, covariance, positions, slopes):
+        """Measurement residuals and their covariances."""
+        residual = np.column_stack([positions - state[:, 0], slopes - state[:, 2]])
+        innovation = covariance[:, [0, 2]][:, :, [0, 2]] + np.diag([TRACKING_MEASUREMENT_NOISE ** 2, 1e-4])
+        return residual, innovation
+
+    def distances(self, positions, slopes):
+        """Squared Mahalanobis distance of one measurement per track (for gating)."""
+        residual, innovation = self._innovation(self.state, self.covariance, positions, slopes)
+        return np.einsum('ni,nij,nj->n', residual, np.linalg.inv(innovation), residual)
+
+    def update(self, selection, positions, slopes):
+        """Fuse one measurement into each selected track."""
+        state = self.state[selection]
+        covariance = self.covariance[selection]
+        residual, innovation = self._innovation(state, covariance, positions[selection], slopes[selection])
+        gain = covariance[:, :, [0, 2]] @ np.linalg.inv(innovation)
+        self.state[selection] = state + np.einsum('nij,nj->ni', gain, residual)
+        self.covariance[selection] = covariance - gain @ covariance[:, [0, 2], :]
+        self.misses[selection] = 0
+
+
+class GridTracker:
+    def __init__(self, windows=TRACKING_WINDOWS, window_length=TRACKING_WINDOW_LENGTH,
+                 min_verified=TRACKING_MIN_VERIFIED, full_interval=TRACKING_FULL_DETECTION_INTERVAL):
+        """
+        Initialize an unlocked tracker.
+
+        Args:
+            windows (int): Windows examined along each line
+            window_length (int): Window size in pixels along the line
+            min_verified (float): Fraction of tracked lines that must be
+                                  re-found to keep the lock
+            full_interval (int): Run full detection every this many frames
+        """
+        self.windows = windows
+        self.window_length = window_length
+        self.min_verified = min_verified
+        self.full_interval = full_interval
+        self.model = None  # Lattice fitted to the filtered lines
+        self.tracks = [LineTracks(), LineTracks()]  # Horizontal, vertical
+        self.segments = None  # Segments along the filtered lines of the last frame
+        self.frame_size = None
+        self.frames_since_full = 0  # Frames served by tracking since the last full detection
+        self.stats = {'tracked': 0, 'full': 0, 'lock_losses': 0, 'resets': 0}
+
+    @property
+    def locked(self):
+        """True while grid lines are being tracked."""
+        return self.model is not None
+
+    def needs_full_detection(self):
+        """True when the next frame should get full-frame detection."""
+        return self.model is None or self.frames_since_full >= self.full_interval - 1
+
+    def full_detection_done(self):
+        """Count a full-frame detection, whether or not it re-locks the grid."""
+        self.frames_since_full = 0
+        self.stats['full'] += 1
+
+    def lock(self, model, width, height):
+        """
+        Start or re-anchor tracking from a full detection.
+
+        The detected lines are associated with the predicted tracks (nearest
+        first, within the gate) and fused into them, keeping the track
+        numbering. Unmatched detections start new tracks; unmatched tracks
+        coast, so a detection that only sees part of the grid (glare, an
+        obstacle) does not drop the rest of it.
+
+        Args:
+            model (GridModel): Model fitted by full detection
+            width (int): Frame width
+            height (int): Frame height
+
+        Returns:
+            GridModel: The model fitted to the filtered lines
+        """
+        self.frame_size = (width, height)
+        families = []
+        for axis, family in ((0, model.horizontal), (1, model.vertical)):
+            indices = np.arange(family.k_min, family.k_max + 1)
+            positions, slopes = line_parameters(np.array([family.line(k) for k in indices]), axis, self.frame_size)
+            tracks = self.tracks[axis]
+            pairs = self._associate(tracks, positions, slopes) if self.model is not None and len(tracks) else []
+            if not pairs:
+                tracks = LineTracks()
+                tracks.add(indices, positions, slopes)
+                self.tracks[axis] = tracks
+                families.append(family)
+                continue
+
+            # Renumber the detection to the track numbering
+            detected, tracked = np.array(pairs).T
+            step = family.b
+            if len(pairs) >= 2 and np.cov(indices[detected], tracks.indices[tracked])[0, 1] < 0:
+                # The fit numbered the lines the other way round
+                indices, step = -indices, -step
+            offset = int(np.round(np.median(tracks.indices[tracked] - indices[detected])))
+            indices = indices + offset
+            family = LatticeFamily(family.a - offset * step, step, indices,
+                                   np.ones(len(indices), dtype=bool), family.residual)
+
+            matched = np.zeros(len(tracks), dtype=bool)
+            matched[tracked] = True
+            measured_positions = np.full(len(tracks), np.nan)
+            measured_slopes = np.full(len(tracks), np.nan)
+            measured_positions[tracked] = positions[detected]
+            measured_slopes[tracked] = slopes[detected]
+            tracks.update(matched, measured_positions, measured_slopes)
+            tracks.misses[~matched] += 1
+
+            new = np.setdiff1d(np.arange(len(indices)), detected)
+            tracks.keep(~np.isin(tracks.indices, indices[new]) & (tracks.misses <= TRACKING_MAX_MISSES))
+            tracks.add(indices[new], positions[new], slopes[new])
+            families.append(family)
+
+        self.model = GridModel(families[0], families[1])
+        smoothed = self._fit_model(self.model)
+        if smoothed is not None:
+            self.model = smoothed
+        return self.model
+
+    def _associate(self, tracks, positions, slopes):
+        """
+        Pair detected lines with predicted tracks, nearest first within the gate.
+
+        Returns:
+            list: (detection, track) index pairs
+        """
+        tracks.predict()
+        distances = np.array([tracks.distances(np.full(len(tracks), position), np.full(len(tracks), slope))
+                              for position, slope in zip(positions, slopes)])
+        pairs = []
+        for i in np.argsort(distances.min(axis=1)):
+            j = int(np.argmin(distances[i]))
+            if distances[i, j] <= TRACKING_GATE ** 2:
+                pairs.append((int(i), j))
+                distances[:, j] = np.inf
+        return pairs
+
+    def unlock(self):
+        """Drop the lock after the lines could not be re-found."""
+        if self.model is not None:
+            self.stats['lock_losses'] += 1
+        self.model = None
+        self.tracks = [LineTracks(), LineTracks()]
+
+    def predict(self, command):
+        """
+        Update the prediction for an executed motion command.
+
+        A forward move of one cell maps the floor lattice onto itself, so the
+        lines are predicted where they were, with added position uncertainty
+        for drift. A turn about an axis away from the camera moves the lines
+        in a way that depends on the mounting, so it drops the lock.
+        """
+        if self.model is None:
+            return
+        if command == 'move_forward':
+            for tracks in self.tracks:
+                tracks.inflate(TRACKING_MOVE_UNCERTAINTY)
+                tracks.state[:, 1] = 0.0  # The move is over when the next frame is taken
+        elif command in TURN_COMMANDS:
+            self.model = None
+            self.tracks = [LineTracks(), LineTracks()]
+            self.stats['resets'] += 1
+
+    def track(self, gray, buffer=None):
+        """
+        Predict the lines for a new frame and re-find them around the prediction.
+
+        Args:
+            gray (numpy.ndarray): Frame in the coordinates of the locked model
+            buffer (numpy.ndarray): Optional preallocated array for the frame
+                                    padded by FRAME_PADDING on every side
+
+        Returns:
+            tuple: (GridModel, h_segments, v_segments) from the filtered lines,
+                   or None if too few lines were verified
+        """
+        if self.model is None:
+            return None
+        height, width = gray.shape[:2]
+        self.frame_size = (width, height)
+        pad = FRAME_PADDING
+        padded = cv2.copyMakeBorder(gray, pad, pad, pad, pad, cv2.BORDER_REPLICATE, dst=buffer)
+
+        for axis in (0, 1):
+            if not self._track_family(padded, pad, axis):
+                return None
+        model = self._fit_model(self.model)
+        if model is None:
+            return None
+        self.model = model
+        self.frames_since_full += 1
+        return model, self.segments[0], self.segments[1]
+
+    def _track_family(self, padded, pad, axis):
+        """
+        Predict, measure and update the tracks of one family; axis 0 = roughly
+        horizontal lines. The lattice lines just beyond the tracked ones are
+        tried as well, so lines entering the view start new tracks.
+
+        Returns:
+            bool: True if enough tracked lines were re-found
+        """
+        tracks = self.tracks[axis]
+        if len(tracks) < 2:
+            return False
+        family = self.model.horizontal if axis == 0 else self.model.vertical
+        tracks.predict()
+
+        extra = np.array([tracks.indices[0] - 1, tracks.indices[-1] + 1])
+        lines = np.vstack([line_from_parameters(tracks.state[:, 0], tracks.state[:, 2], axis, self.frame_size),
+                           [family.line(k) for k in extra]])
+        std = np.sqrt(tracks.covariance[:, 0, 0].max() + TRACKING_MEASUREMENT_NOISE ** 2)
+        band = int(np.clip(np.ceil(TRACKING_GATE * std), TRACKING_BAND, TRACKING_MAX_BAND))
+        positions, slopes = measure_lines(padded, pad, lines, axis, band, self.model, self.frame_size,
+                                          self.windows, self.window_length)
+
+        count = len(tracks)
+        with np.errstate(invalid='ignore'):
+            gated = tracks.distances(positions[:count], slopes[:count]) <= TRACKING_GATE ** 2
+        tracks.update(gated, positions[:count], slopes[:count])
+        tracks.misses[~gated] += 1
+        verified = int(gated.sum())
+
+        found = np.isfinite(positions[count:])
+        if found.any():
+            tracks.add(extra[found], positions[count:][found], slopes[count:][found])
+        # Lines missed for several frames in a row have left the view
+        tracks.keep(tracks.misses <= TRACKING_MAX_MISSES)
+        return verified >= 2 and verified >= self.min_verified * count
+
+    def _fit_model(self, model):
+        """
+        Fit the lattice to the filtered lines and keep their segments. Lines
+        missed in this frame coast on their prediction. Returns a GridModel
+        or None.
+        """
+        families = []
+        segments = []
+        for axis, family in ((0, model.horizontal), (1, model.vertical)):
+            tracks = self.tracks[axis]
+            if len(tracks) < 2:
+                return None
+            lines = line_from_parameters(tracks.state[:, 0], tracks.state[:, 2], axis, self.frame_size)
+            family_segments = line_segments(lines, axis, model, self.frame_size)
+            refitted = refit_lattice_family(family, family_segments, tracks.indices)
+            if refitted is None:
+                return None
+            families.append(refitted)
+            segments.append(family_segments)
+        self.segments = tuple(segments)
+        return GridModel(families[0], families[1])
+
+# Line measurement shared by GridTracker and refine_grid_model
+
+def measure_lines(padded, pad, lines, axis, band, model, frame_size,
+                  windows=TRACKING_WINDOWS, window_length=TRACKING_WINDOW_LENGTH):
+    """
+    Locate lines in windows spread along their predicted positions.
+
+    Args:
+        padded (numpy.ndarray): Grayscale frame padded by pad on every side
+        pad (int): Padding in pixels
+        lines (numpy.ndarray): (n, 3) homogeneous lines to look for
+        axis (int): 0 for roughly horizontal lines, 1 for vertical ones
+        band (int): Search half-height (px) across each line
+        model (GridModel): Model whose other family bounds the lines
+        frame_size (tuple): (width, height) of the unpadded frame
+        windows (int): Windows examined along each line
+        window_length (int): Window size in pixels along the line
+
+    Returns:
+        tuple: (positions, slopes) arrays, NaN where fewer than two
+               windows found the line
+    """
+    width, height = frame_size
+    limit, across_limit = (width, height) if axis == 0 else (height, width)
+    start, end = line_extents(lines, axis, model, frame_size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        usable = np.isfinite(start) & np.isfinite(end) & (end - start >= window_length)
+
+        # Window centers along each line and the predicted position across it
+        fractions = (np.arange(windows) + 0.5) / windows
+        along = start[:, np.newaxis] + (end - start)[:, np.newaxis] * fractions
+        if axis == 0:
+            across = -(lines[:, 0:1] * along + lines[:, 2:3]) / lines[:, 1:2]
+        else:
+            across = -(lines[:, 1:2] * along + lines[:, 2:3]) / lines[:, 0:1]
+
+    half = window_length // 2
+    size = 2 * band + 1
+    valid = usable[:, np.newaxis] & np.isfinite(along) & np.isfinite(across)
+    valid &= (across >= 0) & (across < across_limit)
+    along_start = np.where(valid, along, 0).astype(int) - half
+    across_start = np.rint(np.where(valid, across, 0)).astype(int) - band
+    valid &= (along_start >= 0) & (along_start + window_length <= limit)
+
+    # Gather every window at once as (windows, across, along) brightness
+    across_index = across_start[valid][:, np.newaxis, np.newaxis] + np.arange(size)[:, np.newaxis] + pad
+    along_index = along_start[valid][:, np.newaxis, np.newaxis] + np.arange(window_length) + pad
+    if axis == 0:
+        patches = padded[across_index, along_index]
+    else:
+        patches = padded[along_index, across_index]
+    hits = np.full(along.shape, np.nan)
+    hits[valid] = across_start[valid] + line_positions(patches.mean(axis=2))
+    hits[(hits < 0) | (hits >= across_limit)] = np.nan
+
+    # Least-squares line across = slope * (along - center) + position through each line's hits
+    found = np.isfinite(hits)
+    count = found.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = np.where(found, along - limit / 2, 0.0)
+        y = np.where(found, hits, 0.0)
+        x_mean = x.sum(axis=1) / count
+        y_mean = y.sum(axis=1) / count
+        dx = np.where(found, x - x_mean[:, np.newaxis], 0.0)
+        dy = np.where(found, y - y_mean[:, np.newaxis], 0.0)
+        slopes = (dx * dy).sum(axis=1) / np.maximum((dx * dx).sum(axis=1), 1e-9)
+        positions = y_mean - slopes * x_mean
+    positions[count < 2] = np.nan
+    slopes[count < 2] = np.nan
+    return positions, slopes
+
+
+def line_extents(lines, axis, model, frame_size):
+    """Span of each line (along its axis) between the outermost lines of the model's other family."""
+    width, height = frame_size
+    limit = width if axis == 0 else height
+    other = model.vertical if axis == 0 else model.horizontal
+    outer = np.array([other.line(other.k_min), other.line(other.k_max)])
+    # Intersections with the two outer lines; only the coordinate along the
+    # line and the homogeneous scale of the cross product are needed
+    u, v = lines[:, np.newaxis, :], outer[np.newaxis, :, :]
+    if axis == 0:
+        along = u[..., 1] * v[..., 2] - u[..., 2] * v[..., 1]
+    else:
+        along = u[..., 2] * v[..., 0] - u[..., 0] * v[..., 2]
+    scale = u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ends = along / scale
+        return np.clip(ends.min(axis=1), 0, limit - 1), np.clip(ends.max(axis=1), 0, limit - 1)
+
+
+def line_segments(lines, axis, model, frame_size):
+    """(n, 4) segments along lines, between the outermost lines of the model's other family."""
+    start, end = line_extents(lines, axis, model, frame_size)
+    if axis == 0:
+        return np.column_stack([start, -(lines[:, 0] * start + lines[:, 2]) / lines[:, 1],
+                                end, -(lines[:, 0] * end + lines[:, 2]) / lines[:, 1]])
+    return np.column_stack([-(lines[:, 1] * start + lines[:, 2]) / lines[:, 0], start,
+                            -(lines[:, 1] * end + lines[:, 2]) / lines[:, 0], end])
+
+
+def line_parameters(lines, axis, frame_size):
+    """(positions at the frame center, slopes) of homogeneous lines."""
+    width, height = frame_size
+    a, b, c = lines[:, 0], lines[:, 1], lines[:, 2]
+    if axis == 0:
+        return -(a * width / 2 + c) / b, -a / b
+    return -(b * height / 2 + c) / a, -b / a
+
+
+def line_from_parameters(positions, slopes, axis, frame_size):
+    """Homogeneous lines through (position, slope) parameters."""
+    width, height = frame_size
+    if axis == 0:
+        return np.column_stack([slopes, -np.ones_like(slopes), positions - slopes * width / 2])
+    return np.column_stack([-np.ones_like(slopes), slopes, positions - slopes * height / 2])
+
+
+def line_positions(profiles):
+    """
+    Sub-pixel position of a dark line in each brightness profile across it.
+
+    Returns:
+        numpy.ndarray: Position in each profile, NaN where no line stands
+                       out or it runs into the window edge
+    """
+    positions = np.full(len(profiles), np.nan)
+    if len(profiles) == 0:
+        return positions
+    # Median brightness as the floor level (profiles have an odd length, so
+    # the middle element after a partial sort is the median)
+    middle = profiles.shape[1] // 2
+    if profiles.shape[1] % 2:
+        floor = np.partition(profiles, middle, axis=1)[:, middle]
+    else:
+        floor = np.median(profiles, axis=1)
+    darkness = floor[:, np.newaxis] - profiles
+    contrast = darkness.max(axis=1)
+    peak = np.argmax(darkness, axis=1)
+    # Centroid of the dark core (darker than half the peak)
+    weights = np.clip(darkness - contrast[:, np.newaxis] / 2, 0, None)
+    total = weights.sum(axis=1)
+    ok = (contrast >= TRACKING_MIN_CONTRAST) & (peak > 0) & (peak < profiles.shape[1] - 1) & (total > 0)
+    positions[ok] = (weights[ok] @ np.arange(profiles.shape[1])) / total[ok]
+    return positions
+
+
+def refine_grid_model(gray, model, band=TRACKING_BAND, buffer=None):
+    """
+    Refine a coarse grid model at full resolution: every lattice line is
+    re-measured in small windows around its coarse position and the lattice
+    is refitted to the measured lines.
+
+    Args:
+        gray (numpy.ndarray): Full-resolution frame
+        model (GridModel): Coarse model in full-resolution coordinates
+        band (int): Search half-height (px) across each coarse line
+        buffer (numpy.ndarray): Optional preallocated array for the padded frame
+
+    Returns:
+        tuple: (GridModel, h_segments, v_segments), or None if fewer than two
+               lines of a family were found
+    """
+    height, width = gray.shape[:2]
+    pad = FRAME_PADDING
+    padded = cv2.copyMakeBorder(gray, pad, pad, pad, pad, cv2.BORDER_REPLICATE, dst=buffer)
+
+    families = []
+    segments = []
+    for axis, family in ((0, model.horizontal), (1, model.vertical)):
+        indices = np.arange(family.k_min, family.k_max + 1)
+        lines = np.array([family.line(k) for k in indices])
+        positions, slopes = measure_lines(padded, pad, lines, axis, min(band, TRACKING_MAX_BAND), model,
+                                          (width, height))
+        found = np.isfinite(positions)
+        if found.sum() < 2:
+            return None
+        family_segments = line_segments(line_from_parameters(positions[found], slopes[found], axis, (width, height)),
+                                        axis, model, (width, height))
+        refitted = refit_lattice_family(family, family_segments, indices[found])
+        if refitted is None:
+            return None
+        families.append(refitted)
+        segments.append(family_segments)
+    return GridModel(families[0], families[1]), segments[0], segments[1]
@@ -0,0 +1,140 @@
+"""
+Lazy imports and import-time measurement.
+OpenCV, NumPy and picamera2 (with libcamera) take seconds to import on the
+Pi Zero 2W. lazy_import() defers loading a module until its first
+attribute access, so modules that only sometimes need a heavy dependency do
+not pay for it at startup. Run this module to measure the import time of
+the robot's scripts with `python -X importtime`.
+"""
+
+import os
+import re
+import ast
+import sys
+import time
+import subprocess
+import importlib.util
+
+# Scripts whose startup matters most (the emergency stop first)
+IMPORT_BENCHMARK_SCRIPTS = (
+    'stop_all_motors.py',
+    'quick_motor_test.py',
+    'test_button.py',
+    'calibrate_50cm_grid.py',
+    'power_monitor.py',
+    'test_camera.py',
+    'main_controller.py',
+    'vision_workers.py',
+)
+HEAVY_MODULES = ('cv2', 'numpy', 'picamera2')
+
+
+def lazy_import(name):
+    """
+    Import a module on its first attribute access instead of now.
+
+    Args:
+        name (str): Module name
+
+    Returns:
+        module: The module (loaded on first use), or None if it is not
+                installed
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or spec.loader is None:
+        return None
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def script_imports(path):
+    """
+    Top-level import statements of a script (also inside top-level
+    try blocks): what it costs to start without running it.
+
+    Returns:
+        list: Import statements as source lines
+    """
+    with open(path) as f:
+        source = f.read()
+    statements = []
+    nodes = list(ast.parse(source).body)
+    while nodes:
+        node = nodes.pop(0)
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            statements.append(ast.get_source_segment(source, node))
+        elif isinstance(node, ast.Try):
+            nodes = list(node.body) + nodes
+    return statements
+
+
+def import_times(statements, cwd=None):
+    """
+    Run import statements in a fresh interpreter under -X importtime.
+
+    Statements that fail (e.g. RPi.GPIO off the Pi) are reported and skipped.
+
+    Args:
+        statements (list): Import statements
+        cwd (str): Directory to run in (default: this module's directory)
+
+    Returns:
+        dict: 'total_ms' (cumulative import time), 'wall_ms' (interpreter
+              start to exit), 'modules' ({module: cumulative ms}) and
+              'missing' (errors of the failed imports)
+    """
+    code = ["missing = []"]
+    for statement in statements:
+        code += ["try:", f"    {statement}", "except ImportError as e:", "    missing.append(str(e))"]
+    code.append("print('\\n'.join(missing))")
+    start_time = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "\n".join(code)],
+                            cwd=cwd or os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start_time) * 1000
+
+    modules = {}
+    total_us = 0
+    baseline = set(sys.builtin_module_names)
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        modules[name] = cumulative / 1000
+        if indent == 1 and name not in baseline:
+            total_us += cumulative  # Top-level imports; nested ones are included in them
+    return {'total_ms': total_us / 1000, 'wall_ms': wall_ms, 'modules': modules,
+            'missing': [line for line in result.stdout.splitlines() if line.strip()]}
+
+
+def benchmark_imports(scripts=IMPORT_BENCHMARK_SCRIPTS):
+    """Print the import time of each script and which heavy modules it loads."""
+    print("=== Import Time Benchmark ===")
+    python_ms = import_times([])['wall_ms']
+    print(f"Interpreter start: {python_ms:.0f}ms")
+    print("Script                  | Imports (ms) | Start (ms) | " +
+          " | ".join(f"{name:9s}" for name in HEAVY_MODULES) + " | Not installed")
+    print("-" * 100)
+    for script in scripts:
+        if not os.path.exists(script):
+            continue
+        times = import_times(script_imports(script))
+        heavy = " | ".join(f"{times['modules'][name]:7.0f}ms" if name in times['modules'] else f"{'-':9s}"
+                           for name in HEAVY_MODULES)
+        missing = ", ".join(sorted(set(re.sub(r"No module named ", "", error) for error in times['missing'])))
+        print(f"{script:23s} | {times['total_ms']:12.0f} | {times['wall_ms']:10.0f} | {heavy} | {missing or '-'}")
+
+
+if __name__ == "__main__":
+    benchmark_imports(sys.argv[1:] or IMPORT_BENCHMARK_SCRIPTS)
@@ -0,0 +1,171 @@
+"""
+Grid localization for the robotic vehicle.
+Histogram (Bayes) filter over (row, col, heading) that predicts from the
+executed motor commands and corrects from vision position detections.
+"""
+
+import time
+import numpy as np
+from config import *
+from route_optimizer import DIRECTIONS, DIRECTION_INDEX
+from move_table import DIRECTION_DELTAS
+
+
+class GridLocalizer:
+    def __init__(self, grid_rows=GRID_ROWS, grid_cols=GRID_COLS, blocked=None):
+        """
+        Initialize the localizer.
+
+        Args:
+            grid_rows (int): Number of grid rows
+            grid_cols (int): Number of grid columns
+            blocked (numpy.ndarray): Optional live occupancy grid; the robot
+                                     cannot drive into blocked cells
+        """
+        self.grid_rows = grid_rows
+        self.grid_cols = grid_cols
+        self.blocked = blocked
+        self.belief = np.zeros((grid_rows, grid_cols, 4))
+
+        # Destination cell (flat index) of one and two forward moves per heading,
+        # clamped at the grid edge where the robot would bump into the boundary
+        rows, cols = np.indices((grid_rows, grid_cols))
+        self.destinations = {}
+        for direction, (d_row, d_col) in DIRECTION_DELTAS.items():
+            for steps in (1, 2):
+                dest_rows = np.clip(rows + d_row * steps, 0, grid_rows - 1)
+                dest_cols = np.clip(cols + d_col * steps, 0, grid_cols - 1)
+                self.destinations[(DIRECTION_INDEX[direction], steps)] = (dest_rows * grid_cols + dest_cols).ravel()
+        self.sources = np.arange(grid_rows * grid_cols)
+
+        # Row/column coordinates for moments of the position distribution
+        self.row_coords = rows.astype(float)
+        self.col_coords = cols.astype(float)
+
+        self.reset()
+
+    def reset(self, row=0, col=0, direction='north'):
+        """Put all belief on a known starting pose."""
+        self.belief[:] = 0.0
+        self.belief[row, col, DIRECTION_INDEX[direction]] = 1.0
+
+    def reset_uniform(self):
+        """Forget the pose entirely (kidnapped robot)."""
+        self.belief[:] = 1.0 / self.belief.size
+
+    def predict(self, command):
+        """Propagate the belief through an executed command (motion model)."""
+        if command == 'move_forward':
+            self._predict_move()
+        elif command in ('turn_right', 'pivot_right'):
+            self._predict_turn(1)
+        elif command in ('turn_left', 'pivot_left'):
+            self._predict_turn(-1)
+
+    def _predict_move(self):
+        """Forward move: mostly one cell, sometimes stalled, sometimes overshooting."""
+        p_stay = 1.0 - LOCALIZATION_MOVE_SUCCESS - LOCALIZATION_MOVE_OVERSHOOT
+        size = self.grid_rows * self.grid_cols
+        blocked = self.blocked.ravel() if self.blocked is not None else None
+
+        new_belief = np.empty_like(self.belief)
+        for heading in range(4):
+            layer = self.belief[:, :, heading].ravel()
+            moved = p_stay * layer
+            for steps, probability in ((1, LOCALIZATION_MOVE_SUCCESS), (2, LOCALIZATION_MOVE_OVERSHOOT)):
+                destination = self.destinations[(heading, steps)]
+                if blocked is not None:
+                    destination = np.where(blocked[destination], self.sources, destination)
+                moved += probability * np.bincount(destination, weights=layer, minlength=size)
+            new_belief[:, :, heading] = moved.reshape(self.grid_rows, self.grid_cols)
+        self.belief = new_belief
+
+    def _predict_turn(self, quarter_turns):
+        """Turn: usually completes, otherwise the heading stays unchanged."""
+        turned = np.roll(self.belief, quarter_turns, axis=2)
+        self.belief = LOCALIZATION_TURN_SUCCESS * turned + (1.0 - LOCALIZATION_TURN_SUCCESS) * self.belief
+
+    def correct(self, row, col, confidence=1.0):
+        """
+        Fuse a vision position detection (measurement model).
+
+        The likelihood is a Gaussian around the detected cell mixed with a
+        uniform term, so a low-confidence detection barely moves the belief.
+
+        Args:
+            row (int): Detected row
+            col (int): Detected column
+            confidence (float): Detection quality in [0, 1]
+        """
+        confidence = min(max(confidence, 0.0), 1.0)
+        distance_sq = (self.row_coords - row) ** 2 + (self.col_coords - col) ** 2
+        gaussian = np.exp(-distance_sq / (2 * LOCALIZATION_VISION_SIGMA ** 2))
+        likelihood = confidence * gaussian / gaussian.sum() + (1.0 - confidence) / gaussian.size
+
+        posterior = self.belief * likelihood[:, :, np.newaxis]
+        total = posterior.sum()
+        if total <= 0:
+            # Measurement contradicts the belief completely, start over from it
+            posterior = np.repeat(likelihood[:, :, np.newaxis], 4, axis=2)
+            total = posterior.sum()
+        self.belief = posterior / total
+
+    def get_estimate(self):
+        """
+        Get the pose estimate.
+
+        Returns:
+            dict: Most likely cell and heading with their probabilities, the
+                  mean position and its 2x2 covariance (in cells), and the
+                  heading distribution
+        """
+        position = self.belief.sum(axis=2)
+        best_index = int(np.argmax(position))
+        row, col = divmod(best_index, self.grid_cols)
+        headings = self.belief.sum(axis=(0, 1))
+        heading = int(np.argmax(self.belief[row, col]))
+
+        mean_row = float((position * self.row_coords).sum())
+        mean_col = float((position * self.col_coords).sum())
+        d_row = self.row_coords - mean_row
+        d_col = self.col_coords - mean_col
+        covariance = np.array([
+            [(position * d_row * d_row).sum(), (position * d_row * d_col).sum()],
+            [(position * d_row * d_col).sum(), (position * d_col * d_col).sum()],
+        ])
+
+        return {
+            'cell': (row, col),
+            'cell_probability': float(position[row, col]),
+            'direction': DIRECTIONS[heading],
+            'direction_probability': float(headings[heading]),
+            'mean': (mean_row, mean_col),
+            'covariance': covariance,
+            'heading_distribution': {name: float(headings[i]) for i, name in enumerate(DIRECTIONS)},
+        }
+
+
+def benchmark_localization():
+    """Time predict and correct updates on several grid sizes."""
+    print("=== Localization Benchmark ===")
+    print("Grid      | Predict (move) | Predict (turn) | Correct | Estimate")
+    print("-" * 66)
+    for rows, cols in [(GRID_ROWS, GRID_COLS), (10, 10), (20, 20), (50, 50)]:
+        localizer = GridLocalizer(rows, cols)
+        localizer.reset_uniform()
+        repeats = 200
+        timings = []
+        for update in (lambda: localizer.predict('move_forward'),
+                       lambda: localizer.predict('turn_right'),
+                       lambda: localizer.correct(rows // 2, cols // 2, 0.8),
+                       localizer.get_estimate):
+            start_time = time.perf_counter()
+            for _ in range(repeats):
+                update()
+            timings.append((time.perf_counter() - start_time) / repeats * 1000)
+        print(f"{rows:4d}x{cols:<4d} | {timings[0]:12.3f}ms | {timings[1]:12.3f}ms | "
+              f"{timings[2]:5.3f}ms | {timings[3]:6.3f}ms")
+
+
+if __name__ == "__main__":
+    benchmark_localization()
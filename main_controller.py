@@ -3,32 +3,141 @@ Main controller for the robotic vehicle navigation system.
 Integrates camera, motor control, and navigation components.
 """
 
-import time
 import signal
 import sys
+import threading
+import importlib
 from motor_controller import MotorController
-from camera_controller import CameraController
 from navigation_controller import NavigationController
 from button_controller import ButtonController
+from localization import GridLocalizer
+from perf_profile import apply_profile
+from clock import REAL_CLOCK
 from config import *
 
 class RobotController:
-    def __init__(self):
-        """Initialize the main robot controller."""
-        self.motor_controller = MotorController()
-        self.camera_controller = CameraController()
-        self.navigation_controller = NavigationController()
-        self.button_controller = ButtonController()
+    def __init__(self, gpio=None, camera=None, clock=None):
+        """
+        Initialize the main robot controller.
+        
+        The camera starts in a background thread (opening it and converging
+        exposure take the longest) while the GPIO subsystems are set up and
+        the start button is awaited; start() waits for it before driving.
+        
+        Args:
+            gpio: GPIO backend for the motors and button (default RPi.GPIO;
+                  simulated_hardware.FakeGPIO off the Pi)
+            camera: Camera to use instead of the Pi camera (e.g.
+                    simulated_hardware.FakeCamera on the same clock)
+            clock: Clock for all timings, sleeps and the camera thread
+                   (default: wall clock; a VirtualClock runs a simulated
+                   mission without waiting)
+        """
+        self.gpio = gpio
+        self.camera = camera
+        self.clock = clock or REAL_CLOCK
+        self.startup_start = self.clock.time()
+        self.startup_events = []  # (name, start, end, thread), seconds since startup_start
+        
+        # CPU affinity before any threads start (PWM, camera), so they inherit it;
+        # the OpenCV settings follow on the camera thread, which imports OpenCV
+        self._timed("cpu affinity", apply_profile, PERF_PROFILE, 'control', opencv=False)
+        
+        self.camera_controller = None
+        self.camera_error = None
+        self.camera_lock = threading.Lock()
+        self.camera_cancelled = False  # Set once nobody will use (or clean up) a late camera
+        self.camera_thread = self.clock.start_thread(self._start_camera, name="camera-init")
+        
+        self.motor_controller = self._timed("motors", MotorController, gpio=gpio, clock=self.clock)
+        self.navigation_controller = self._timed("navigation", NavigationController)
+        self.button_controller = self._timed("button", ButtonController, gpio=gpio, clock=self.clock)
+        self.localizer = self._timed("localizer", GridLocalizer, blocked=self.navigation_controller.grid_state.blocked)
         
         self.running = False
         self.paused = False
         
-        # Set up signal handlers for graceful shutdown
-        signal.signal(signal.SIGINT, self.signal_handler)
-        signal.signal(signal.SIGTERM, self.signal_handler)
+        # Set up signal handlers for graceful shutdown (only possible on the main
+        # thread; simulated missions may run elsewhere)
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self.signal_handler)
+            signal.signal(signal.SIGTERM, self.signal_handler)
         
         print("Robot controller initialized")
     
+    def _timed(self, name, function, *args, **kwargs):
+        """Call function(*args, **kwargs) and record it in the startup timeline."""
+        start_time = self.clock.time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.startup_events.append((name, start_time - self.startup_start,
+                                        self.clock.time() - self.startup_start,
+                                        threading.current_thread().name))
+    
+    def _start_camera(self):
+        """Camera thread: import the vision modules, open the camera and wait until it is ready."""
+        try:
+            # OpenCV and picamera2 load here, in parallel with the GPIO setup
+            camera_controller = self._timed("vision imports", importlib.import_module, "camera_controller")
+            settings = self._timed("performance profile", apply_profile, PERF_PROFILE, 'control')
+            print(f"Performance profile '{PERF_PROFILE}': OpenCV threads {settings['opencv_threads']}, "
+                  f"optimized {settings['use_optimized']}, cores {settings['cores']}")
+            controller = self._timed("camera", camera_controller.CameraController,
+                                     camera=self.camera, clock=self.clock)
+        except Exception as e:
+            self.camera_error = e
+            return
+        
+        with self.camera_lock:
+            cancelled = self.camera_cancelled
+            if not cancelled:
+                self.camera_controller = controller
+        if cancelled:
+            # wait_until_ready gave up or cleanup already ran: release the camera here
+            print("Camera ready after startup was abandoned, releasing it")
+            controller.cleanup()
+    
+    def wait_until_ready(self, timeout=CAMERA_INIT_TIMEOUT):
+        """
+        Readiness barrier before motion: wait for the camera thread.
+        
+        Returns:
+            bool: True if every subsystem is ready to drive
+        """
+        if not self._timed("wait for camera", self.clock.join, self.camera_thread, timeout):
+            print(f"Camera not ready after {timeout:.0f}s")
+            self._cancel_camera()
+            return False
+        if self.camera_error is not None:
+            print(f"Camera initialization failed: {self.camera_error}")
+            return False
+        return True
+    
+    def _cancel_camera(self):
+        """
+        Stop waiting for the camera: a camera the thread opens from now on is
+        released by the thread itself.
+        
+        Returns:
+            CameraController: The camera if it was already ready, else None
+        """
+        with self.camera_lock:
+            self.camera_cancelled = True
+            return self.camera_controller
+    
+    def print_startup_timeline(self):
+        """Print when each subsystem started and finished initializing."""
+        ready = max(end for _, _, end, _ in self.startup_events)
+        initialized = max(end for name, _, end, _ in self.startup_events
+                          if name not in ("button wait", "wait for camera"))
+        print(f"Startup timeline (s, subsystems initialized after {initialized:.2f}s, "
+              f"ready to drive after {ready:.2f}s):")
+        scale = 40 / max(ready, 1e-6)
+        for name, start, end, thread in sorted(self.startup_events, key=lambda event: event[1]):
+            bar = " " * int(start * scale) + "#" * max(1, int((end - start) * scale))
+            print(f"  {name:19s} {start:6.2f} - {end:6.2f}  {thread:11s} |{bar}")
+    
     def signal_handler(self, signum, frame):
         """Handle shutdown signals."""
         print(f"\nReceived signal {signum}. Shutting down gracefully...")
@@ -40,10 +149,16 @@ class RobotController:
         print("🤖 Robotic Vehicle Navigation System")
         print("=" * 40)
         
-        # Wait for start button press
-        if not self.button_controller.wait_for_button_press():
+        # Wait for start button press (the camera keeps warming up meanwhile)
+        if not self._timed("button wait", self.button_controller.wait_for_button_press):
             print("Starting automatically...")
         
+        # No motion before the camera is ready
+        if not self.wait_until_ready():
+            print("Not starting navigation without the camera")
+            return
+        self.print_startup_timeline()
+        
         print("Starting robot navigation...")
         self.running = True
         
@@ -57,7 +172,7 @@ class RobotController:
                 
                 if not self.paused:
                     self.navigation_step()
-                time.sleep(0.1)  # Small delay to prevent excessive CPU usage
+                self.clock.sleep(0.1)  # Small delay to prevent excessive CPU usage
             
             if self.navigation_controller.is_navigation_complete():
                 print("🎉 Navigation completed successfully!")
@@ -76,11 +191,35 @@ class RobotController:
             print("Failed to capture image")
             return
         
-        # Detect current position
-        current_row, current_col = self.camera_controller.get_vehicle_position(image)
-        if current_row is not None and current_col is not None:
-            self.navigation_controller.update_position(current_row, current_col)
-            print(f"Current position: ({current_row}, {current_col})")
+        # Detect current position (in the vision workers, if running, while the
+        # next plan is prepared), requesting another frame if quality is poor
+        pending = self.camera_controller.submit_position(image)
+        self.plan_ahead()
+        current_row, current_col, quality = self.camera_controller.collect_position(pending)
+        frames = 1
+        while quality < GRID_DETECTION_THRESHOLD and frames < VISION_MAX_FRAMES:
+            print(f"Low grid detection quality ({quality:.2f}), requesting another frame")
+            retry_image = self.camera_controller.capture_image()
+            if retry_image is None:
+                break
+            image = retry_image
+            pending = self.camera_controller.submit_position(image)
+            current_row, current_col, quality = self.camera_controller.collect_position(pending)
+            frames += 1
+        
+        # Fuse a good detection with odometry; on bad frames trust odometry alone
+        if current_row is not None and quality >= GRID_DETECTION_THRESHOLD:
+            self.localizer.correct(current_row, current_col, quality * LOCALIZATION_VISION_CONFIDENCE)
+        elif current_row is not None:
+            print(f"Ignoring low-quality detection ({quality:.2f}), trusting odometry")
+        
+        estimate = self.localizer.get_estimate()
+        if estimate['cell_probability'] >= LOCALIZATION_MIN_CONFIDENCE:
+            self.navigation_controller.update_position(*estimate['cell'])
+            print(f"Current position: {estimate['cell']} (p={estimate['cell_probability']:.2f}, "
+                  f"vision: ({current_row}, {current_col}))")
+        else:
+            print(f"Position uncertain (p={estimate['cell_probability']:.2f}), keeping dead-reckoned pose")
         
         # Get next target
         next_target = self.navigation_controller.get_next_target()
@@ -91,16 +230,46 @@ class RobotController:
         target_row, target_col = next_target
         print(f"Next target: ({target_row}, {target_col})")
         
-        # Calculate and execute movement commands
+        # Plan (without changing navigation state) and execute movement commands
         commands = self.navigation_controller.get_movement_commands(target_row, target_col)
+        if commands is None:
+            # Target enclosed by blocked cells, skip it instead of stalling
+            print(f"Target ({target_row}, {target_col}) is unreachable, skipping")
+            self.navigation_controller.mark_cell_blocked(target_row, target_col)
+            return
+        if not commands:
+            # Already standing on the target
+            print(f"Already at target ({target_row}, {target_col})")
+            self.navigation_controller.update_position(target_row, target_col)
+            return
         self.execute_commands(commands)
         
         # Save debug image
         if DEBUG_MODE:
-            self.camera_controller.save_debug_image(image, f"step_{len(self.navigation_controller.visited_cells)}.jpg")
+            self.camera_controller.save_debug_image(image, f"step_{self.navigation_controller.grid_state.visited_count}.jpg")
+    
+    def plan_ahead(self):
+        """
+        Plan from the dead-reckoned pose to the next target.
+        
+        Runs while the frame is detected; plans are memoized, so when vision
+        confirms the pose the step reuses this one instead of planning.
+        """
+        next_target = self.navigation_controller.get_next_target()
+        if next_target is not None:
+            self.navigation_controller.plan_to_target(*next_target)
     
     def execute_commands(self, commands):
         """Execute a sequence of movement commands."""
+        # Short exposures while moving, against motion blur
+        self.camera_controller.set_moving(True)
+        try:
+            self._execute_commands(commands)
+        finally:
+            self.camera_controller.set_moving(False)
+    
+    def _execute_commands(self, commands):
+        """Execute movement commands one by one (see execute_commands)."""
         for command in commands:
             if not self.running:
                 break
@@ -122,8 +291,13 @@ class RobotController:
             elif command == 'stop':
                 self.motor_controller.stop()
             
+            # Commit the pose change only once the command has been executed
+            self.navigation_controller.commit_command(command)
+            self.localizer.predict(command)
+            self.camera_controller.note_motion(command)
+            
             # Small delay between commands
-            time.sleep(0.2)
+            self.clock.sleep(COMMAND_DELAY)
     
     def play_completion_sound(self):
         """Play a completion sound (if speaker is connected)."""
@@ -161,7 +335,9 @@ class RobotController:
         """Clean up all resources."""
         print("Cleaning up resources...")
         self.motor_controller.cleanup()
-        self.camera_controller.cleanup()
+        camera_controller = self._cancel_camera()
+        if camera_controller is not None:
+            camera_controller.cleanup()
         self.button_controller.cleanup()
         print("Cleanup completed")
 
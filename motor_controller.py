@@ -3,15 +3,32 @@ Motor controller for the robotic vehicle.
 Handles movement, turning, and speed control.
 """
 
-import RPi.GPIO as GPIO
-import time
 from config import *
+from clock import REAL_CLOCK
+
+try:
+    import RPi.GPIO as GPIO
+except ImportError:
+    GPIO = None  # Off the Pi: pass a simulated backend (simulated_hardware.FakeGPIO)
 
 class MotorController:
-    def __init__(self):
-        """Initialize the motor controller with GPIO pins for L298N driver."""
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setwarnings(False)
+    def __init__(self, gpio=None, clock=None):
+        """
+        Initialize the motor controller with GPIO pins for L298N driver.
+        
+        Args:
+            gpio: GPIO backend with the RPi.GPIO interface (default RPi.GPIO;
+                  simulated_hardware.FakeGPIO off the Pi)
+            clock: Clock for the movement timings (default: wall clock)
+        """
+        if gpio is None:
+            if GPIO is None:
+                raise ImportError("RPi.GPIO is required to drive the motors")
+            gpio = GPIO
+        self.gpio = gpio
+        self.clock = clock or REAL_CLOCK
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setwarnings(False)
         
         # Set up motor pins for L298N driver
         self.motor_pins = {
@@ -23,29 +40,29 @@ class MotorController:
         
         # Initialize all motor pins as outputs and set them LOW
         for pin in self.motor_pins.values():
-            GPIO.setup(pin, GPIO.OUT)
-            GPIO.output(pin, GPIO.LOW)  # Ensure all pins start LOW
+            self.gpio.setup(pin, self.gpio.OUT)
+            self.gpio.output(pin, self.gpio.LOW)  # Ensure all pins start LOW
         
         # Initialize enable pins if using ENA/ENB method
         if USE_ENABLE_PINS:
-            GPIO.setup(ENA_PIN, GPIO.OUT)
-            GPIO.setup(ENB_PIN, GPIO.OUT)
-            GPIO.output(ENA_PIN, GPIO.LOW)  # Ensure enable pins start LOW
-            GPIO.output(ENB_PIN, GPIO.LOW)
+            self.gpio.setup(ENA_PIN, self.gpio.OUT)
+            self.gpio.setup(ENB_PIN, self.gpio.OUT)
+            self.gpio.output(ENA_PIN, self.gpio.LOW)  # Ensure enable pins start LOW
+            self.gpio.output(ENB_PIN, self.gpio.LOW)
             
             # Set up PWM for enable pins (speed control)
-            self.ena_pwm = GPIO.PWM(ENA_PIN, PWM_FREQUENCY)
-            self.enb_pwm = GPIO.PWM(ENB_PIN, PWM_FREQUENCY)
+            self.ena_pwm = self.gpio.PWM(ENA_PIN, PWM_FREQUENCY)
+            self.enb_pwm = self.gpio.PWM(ENB_PIN, PWM_FREQUENCY)
             
             # Start enable PWM with 0% duty cycle
             self.ena_pwm.start(0)
             self.enb_pwm.start(0)
             
             # Set up input pins as digital outputs (direction control)
-            self.left_forward_pin = GPIO.PWM(MOTOR_LEFT_FORWARD, PWM_FREQUENCY)
-            self.left_backward_pin = GPIO.PWM(MOTOR_LEFT_BACKWARD, PWM_FREQUENCY)
-            self.right_forward_pin = GPIO.PWM(MOTOR_RIGHT_FORWARD, PWM_FREQUENCY)
-            self.right_backward_pin = GPIO.PWM(MOTOR_RIGHT_BACKWARD, PWM_FREQUENCY)
+            self.left_forward_pin = self.gpio.PWM(MOTOR_LEFT_FORWARD, PWM_FREQUENCY)
+            self.left_backward_pin = self.gpio.PWM(MOTOR_LEFT_BACKWARD, PWM_FREQUENCY)
+            self.right_forward_pin = self.gpio.PWM(MOTOR_RIGHT_FORWARD, PWM_FREQUENCY)
+            self.right_backward_pin = self.gpio.PWM(MOTOR_RIGHT_BACKWARD, PWM_FREQUENCY)
             
             # Start input PWM with 0% duty cycle
             self.left_forward_pin.start(0)
@@ -56,10 +73,10 @@ class MotorController:
             print("L298N Motor controller initialized (ENA/ENB method)")
         else:
             # Set up PWM for speed control (Direct PWM method)
-            self.left_pwm_forward = GPIO.PWM(MOTOR_LEFT_FORWARD, PWM_FREQUENCY)
-            self.left_pwm_backward = GPIO.PWM(MOTOR_LEFT_BACKWARD, PWM_FREQUENCY)
-            self.right_pwm_forward = GPIO.PWM(MOTOR_RIGHT_FORWARD, PWM_FREQUENCY)
-            self.right_pwm_backward = GPIO.PWM(MOTOR_RIGHT_BACKWARD, PWM_FREQUENCY)
+            self.left_pwm_forward = self.gpio.PWM(MOTOR_LEFT_FORWARD, PWM_FREQUENCY)
+            self.left_pwm_backward = self.gpio.PWM(MOTOR_LEFT_BACKWARD, PWM_FREQUENCY)
+            self.right_pwm_forward = self.gpio.PWM(MOTOR_RIGHT_FORWARD, PWM_FREQUENCY)
+            self.right_pwm_backward = self.gpio.PWM(MOTOR_RIGHT_BACKWARD, PWM_FREQUENCY)
             
             # Start PWM with 0% duty cycle
             self.left_pwm_forward.start(0)
@@ -111,7 +128,7 @@ class MotorController:
             else:
                 # For direct PWM method, we'll set the speed in the calling function
                 pass
-            time.sleep(step_time)
+            self.clock.sleep(step_time)
     
     def move_forward(self, speed=DEFAULT_SPEED, duration=None):
         """Move the vehicle forward."""
@@ -156,7 +173,7 @@ class MotorController:
                 self.right_pwm_backward.ChangeDutyCycle(0)
         
         if duration:
-            time.sleep(duration)
+            self.clock.sleep(duration)
             self.stop()
     
     def move_forward_grid_cell(self, speed=FORWARD_SPEED):
@@ -202,7 +219,7 @@ class MotorController:
                 self.right_pwm_forward.ChangeDutyCycle(0)
         
         if duration:
-            time.sleep(duration)
+            self.clock.sleep(duration)
             self.stop()
     
     def turn_left(self, speed=TURN_SPEED, duration=None):
@@ -244,7 +261,7 @@ class MotorController:
                 self.right_pwm_backward.ChangeDutyCycle(0)
         
         if duration:
-            time.sleep(duration)
+            self.clock.sleep(duration)
             self.stop()
     
     def turn_right(self, speed=TURN_SPEED, duration=None):
@@ -286,7 +303,7 @@ class MotorController:
                 self.right_pwm_forward.ChangeDutyCycle(0)
         
         if duration:
-            time.sleep(duration)
+            self.clock.sleep(duration)
             self.stop()
     
     def turn_left_90(self, speed=TURN_SPEED):
@@ -336,7 +353,7 @@ class MotorController:
                 self.right_pwm_backward.ChangeDutyCycle(0)
         
         if duration:
-            time.sleep(duration)
+            self.clock.sleep(duration)
             self.stop()
     
     def pivot_right(self, speed=TURN_SPEED, duration=None):
@@ -378,7 +395,7 @@ class MotorController:
                 self.right_pwm_forward.ChangeDutyCycle(0)
         
         if duration:
-            time.sleep(duration)
+            self.clock.sleep(duration)
             self.stop()
     
     def pivot_left_90(self, speed=TURN_SPEED):
@@ -483,19 +500,19 @@ class MotorController:
             # Set all pins to LOW before cleanup
             try:
                 for pin in [MOTOR_LEFT_FORWARD, MOTOR_LEFT_BACKWARD, MOTOR_RIGHT_FORWARD, MOTOR_RIGHT_BACKWARD]:
-                    GPIO.output(pin, GPIO.LOW)
+                    self.gpio.output(pin, self.gpio.LOW)
                 if USE_ENABLE_PINS:
-                    GPIO.output(ENA_PIN, GPIO.LOW)
-                    GPIO.output(ENB_PIN, GPIO.LOW)
+                    self.gpio.output(ENA_PIN, self.gpio.LOW)
+                    self.gpio.output(ENB_PIN, self.gpio.LOW)
             except:
                 pass
             
-            GPIO.cleanup()
+            self.gpio.cleanup()
             print("Motor controller cleaned up")
         except Exception as e:
             # Silent cleanup - don't print warnings
             try:
-                GPIO.cleanup()
+                self.gpio.cleanup()
             except:
                 pass
     
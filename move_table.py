@@ -0,0 +1,178 @@
+"""
+Precomputed move table for the grid.
+Stores the optimal command sequence and cost between every (cell, heading)
+state and every target cell, so path planning becomes a dictionary lookup.
+"""
+
+import os
+import time
+import json
+import heapq
+import hashlib
+from config import *
+from route_optimizer import DIRECTIONS, DIRECTION_INDEX
+
+# Row/column change for one 'move_forward' in each heading
+DIRECTION_DELTAS = {'north': (-1, 0), 'east': (0, 1), 'south': (1, 0), 'west': (0, -1)}
+
+# Bump when the table format changes so stale cache files are ignored
+MOVE_TABLE_VERSION = 2
+
+
+class MoveTable:
+    def __init__(self, grid_rows=GRID_ROWS, grid_cols=GRID_COLS, move_time=MOVE_FORWARD_TIME,
+                 turn_time=TURN_TIME, command_delay=COMMAND_DELAY, cache_dir=MOVE_TABLE_CACHE_DIR):
+        """
+        Build the move table, or load it from the disk cache.
+
+        Args:
+            grid_rows (int): Number of grid rows
+            grid_cols (int): Number of grid columns
+            move_time (float): Seconds to drive one grid cell
+            turn_time (float): Seconds for one 90-degree turn
+            command_delay (float): Pause between executed commands
+            cache_dir (str): Directory for cached tables (None disables caching)
+        """
+        self.grid_rows = grid_rows
+        self.grid_cols = grid_cols
+        self.move_cost = move_time + command_delay
+        self.turn_cost = turn_time + command_delay
+        self.cache_dir = os.path.expanduser(cache_dir) if cache_dir else None
+        self.table = {}
+
+        start_time = time.time()
+        if self.load():
+            source = "loaded from cache"
+        else:
+            self.build()
+            self.save()
+            source = "built"
+        print(f"Move table {source}: {len(self.table)} entries in {(time.time() - start_time) * 1000:.1f}ms")
+
+    def cache_path(self):
+        """Cache file name, keyed by grid dimensions and timing constants."""
+        key = f"{MOVE_TABLE_VERSION}:{self.grid_rows}x{self.grid_cols}:{self.move_cost!r}:{self.turn_cost!r}"
+        digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"move_table_{self.grid_rows}x{self.grid_cols}_{digest}.json")
+
+    def load(self):
+        """
+        Load the table from disk. Returns True on success.
+
+        The cache is plain JSON, and only read if it belongs to this user and
+        nobody else can write it, so a planted file cannot change the plans.
+        """
+        if not self.cache_dir:
+            return False
+        path = self.cache_path()
+        try:
+            stat = os.stat(path)
+            if stat.st_uid != os.getuid() or stat.st_mode & 0o022:
+                print(f"Move table cache warning: ignoring {path} (not owned by this user or writable by others)")
+                return False
+            with open(path) as f:
+                entries = json.load(f)
+            interned = {}
+            table = {}
+            for row, col, direction, target_row, target_col, cost, commands in entries:
+                commands = tuple(commands)
+                table[(row, col, direction, target_row, target_col)] = (cost, interned.setdefault(commands, commands))
+        except (OSError, ValueError, TypeError):
+            return False
+        self.table = table
+        return True
+
+    def save(self):
+        """Write the table to disk, ignoring failures (the cache is optional)."""
+        if not self.cache_dir:
+            return
+        entries = [list(key) + [cost, list(commands)] for key, (cost, commands) in self.table.items()]
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            temp_path = self.cache_path() + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(entries, f, separators=(',', ':'))
+            os.chmod(temp_path, 0o600)
+            os.replace(temp_path, self.cache_path())
+        except OSError as e:
+            print(f"Move table cache warning: {e}")
+
+    def build(self):
+        """Run a shortest-path search from every (cell, heading) state."""
+        self.table = {}
+        interned = {}  # Share identical command tuples between entries
+        for row in range(self.grid_rows):
+            for col in range(self.grid_cols):
+                for direction in DIRECTIONS:
+                    for target, (cost, commands) in self._search(row, col, direction).items():
+                        commands = interned.setdefault(commands, commands)
+                        self.table[(row, col, direction) + target] = (cost, commands)
+
+    def _search(self, row, col, direction):
+        """Dijkstra over (row, col, heading) states from one start state."""
+        start = (row, col, direction)
+        costs = {start: 0.0}
+        previous = {start: None}
+        heap = [(0.0, start)]
+
+        while heap:
+            cost, state = heapq.heappop(heap)
+            if cost > costs[state]:
+                continue
+            for command, next_state, step_cost in self._successors(state):
+                new_cost = cost + step_cost
+                if new_cost < costs.get(next_state, float('inf')) - 1e-9:
+                    costs[next_state] = new_cost
+                    previous[next_state] = (state, command)
+                    heapq.heappush(heap, (new_cost, next_state))
+
+        # Best arrival heading for each target cell
+        best = {}
+        for state, cost in costs.items():
+            target = state[:2]
+            if target not in best or cost < best[target][0]:
+                best[target] = (cost, state)
+
+        results = {}
+        for target, (cost, state) in best.items():
+            commands = []
+            while previous[state] is not None:
+                state, command = previous[state]
+                commands.append(command)
+            results[target] = (cost, tuple(reversed(commands)))
+        return results
+
+    def _successors(self, state):
+        """Commands available from a state with their resulting state and cost."""
+        row, col, direction = state
+        index = DIRECTION_INDEX[direction]
+        yield 'turn_right', (row, col, DIRECTIONS[(index + 1) % 4]), self.turn_cost
+        yield 'turn_left', (row, col, DIRECTIONS[(index - 1) % 4]), self.turn_cost
+        d_row, d_col = DIRECTION_DELTAS[direction]
+        if 0 <= row + d_row < self.grid_rows and 0 <= col + d_col < self.grid_cols:
+            yield 'move_forward', (row + d_row, col + d_col, direction), self.move_cost
+
+    def lookup(self, row, col, direction, target_row, target_col):
+        """
+        Optimal plan from a pose to a target cell.
+
+        Returns:
+            tuple: (cost in seconds, tuple of commands), or None if either
+                   cell is outside the grid
+        """
+        return self.table.get((row, col, direction, target_row, target_col))
+
+
+if __name__ == "__main__":
+    print("=== Move Table Benchmark ===")
+    start_time = time.time()
+    table = MoveTable(cache_dir=None)
+    print(f"Build time: {time.time() - start_time:.3f}s")
+
+    keys = list(table.table.keys())
+    start_time = time.perf_counter()
+    for _ in range(100):
+        for key in keys:
+            table.lookup(*key)
+    lookup_time = (time.perf_counter() - start_time) / (100 * len(keys))
+    print(f"Average lookup time: {lookup_time * 1e6:.2f}us over {len(keys)} entries")
@@ -4,7 +4,33 @@ Handles path planning and grid traversal logic.
 """
 
 import time
+from collections import namedtuple
 from config import *
+from route_optimizer import RouteOptimizer, DIRECTIONS, DIRECTION_INDEX, leg_options
+from move_table import MoveTable, DIRECTION_DELTAS
+from grid_state import GridState
+from dstar_lite import DStarLitePlanner
+
+# Immutable snapshot of the vehicle pose used by the planning API
+Pose = namedtuple('Pose', ['row', 'col', 'direction'])
+
+# Heading of a move between adjacent cells
+DELTA_DIRECTIONS = {delta: direction for direction, delta in DIRECTION_DELTAS.items()}
+
+# Heading change (in quarter turns clockwise) caused by each command
+COMMAND_TURNS = {'turn_right': 1, 'pivot_right': 1, 'turn_left': -1, 'pivot_left': -1}
+
+
+def apply_command(pose, command):
+    """Return the pose after executing a command (pure function)."""
+    if command == 'move_forward':
+        d_row, d_col = DIRECTION_DELTAS[pose.direction]
+        return Pose(pose.row + d_row, pose.col + d_col, pose.direction)
+    if command in COMMAND_TURNS:
+        index = (DIRECTION_INDEX[pose.direction] + COMMAND_TURNS[command]) % 4
+        return Pose(pose.row, pose.col, DIRECTIONS[index])
+    return pose
+
 
 class NavigationController:
     def __init__(self):
@@ -14,8 +40,12 @@ class NavigationController:
         self.current_row = 0
         self.current_col = 0
         self.current_direction = 'north'  # north, south, east, west
-        self.visited_cells = set()
+        self.grid_state = GridState(self.grid_rows, self.grid_cols)  # Visited bitmap and target mask
         self.target_cells = []
+        self.route_optimizer = RouteOptimizer()
+        self.move_table = MoveTable(self.grid_rows, self.grid_cols) if USE_MOVE_TABLE else None
+        self.plan_cache = {}  # (pose, target_row, target_col) -> (commands, end pose)
+        self.replanners = {}  # goal cell -> DStarLitePlanner, repaired when cells get blocked
         
         # Initialize target cells (example: visit all cells in a pattern)
         self.initialize_target_cells()
@@ -33,6 +63,10 @@ class NavigationController:
                 for col in range(self.grid_cols - 1, -1, -1):
                     self.target_cells.append((row, col))
         
+        if OPTIMIZE_ROUTE:
+            self.target_cells = self.optimize_route(self.target_cells)
+        self.target_cells = self.grid_state.set_targets(self.target_cells)
+        
         print(f"Target cells initialized: {len(self.target_cells)} cells to visit")
     
     def update_position(self, row, col):
@@ -40,78 +74,238 @@ class NavigationController:
         if 0 <= row < self.grid_rows and 0 <= col < self.grid_cols:
             self.current_row = row
             self.current_col = col
-            self.visited_cells.add((row, col))
+            self.grid_state.mark_visited(row, col)
             return True
         return False
     
+    @property
+    def visited_cells(self):
+        """Set of visited (row, col) cells (built on demand from the visited bitmap)."""
+        return self.grid_state.visited_cells()
+    
     def get_next_target(self):
         """Get the next target cell to visit."""
-        for target in self.target_cells:
-            if target not in self.visited_cells:
-                return target
-        return None  # All cells visited
+        return self.grid_state.next_target()  # None when all cells visited
     
-    def calculate_path_to_target(self, target_row, target_col):
-        """Calculate the path from current position to target."""
+    def optimize_route(self, target_cells):
+        """Reorder target cells for minimum mission time from the current pose."""
+        start_time = time.time()
+        route = self.route_optimizer.optimize(
+            target_cells, (self.current_row, self.current_col), self.current_direction
+        )
+        planning_time = time.time() - start_time
+        
+        before = self.route_optimizer.route_cost(target_cells, (self.current_row, self.current_col), self.current_direction)
+        after = self.route_optimizer.route_cost(route, (self.current_row, self.current_col), self.current_direction)
+        print(f"Route optimized in {planning_time * 1000:.1f}ms: estimated mission time {before:.0f}s -> {after:.0f}s")
+        return route
+    
+    def calculate_path_to_target(self, target_row, target_col, pose=None):
+        """Calculate the path from current position (or the given pose) to target."""
         if target_row is None or target_col is None:
             return []
         
+        if pose is None:
+            pose = self.get_pose()
+        
         path = []
-        current_row, current_col = self.current_row, self.current_col
+        current_row, current_col = pose.row, pose.col
         
-        # Simple path: move to target row first, then to target column
-        # Move vertically first
+        # L-shaped path: pick the axis order that needs the fewest turns
+        options = leg_options(current_row, current_col, pose.direction, target_row, target_col)
+        vertical_first = min(options, key=lambda option: option[1])[3]
+        
+        vertical_moves = []
         while current_row != target_row:
             if current_row < target_row:
-                path.append('move_south')
+                vertical_moves.append('move_south')
                 current_row += 1
             else:
-                path.append('move_north')
+                vertical_moves.append('move_north')
                 current_row -= 1
         
-        # Then move horizontally
+        horizontal_moves = []
         while current_col != target_col:
             if current_col < target_col:
-                path.append('move_east')
+                horizontal_moves.append('move_east')
                 current_col += 1
             else:
-                path.append('move_west')
+                horizontal_moves.append('move_west')
                 current_col -= 1
         
+        if vertical_first:
+            path = vertical_moves + horizontal_moves
+        else:
+            path = horizontal_moves + vertical_moves
+        
         return path
     
-    def get_movement_commands(self, target_row, target_col):
-        """Get the sequence of movement commands to reach the target."""
-        path = self.calculate_path_to_target(target_row, target_col)
-        commands = []
+    def get_pose(self):
+        """Get an immutable snapshot of the current pose."""
+        return Pose(self.current_row, self.current_col, self.current_direction)
+    
+    def plan_to_target(self, target_row, target_col, pose=None):
+        """
+        Plan the commands to reach a target without changing any state.
         
-        for move in path:
-            if move == 'move_north':
-                commands.extend(self.get_commands_to_face('north'))
-                commands.append('move_forward')
-            elif move == 'move_south':
-                commands.extend(self.get_commands_to_face('south'))
-                commands.append('move_forward')
-            elif move == 'move_east':
-                commands.extend(self.get_commands_to_face('east'))
-                commands.append('move_forward')
-            elif move == 'move_west':
-                commands.extend(self.get_commands_to_face('west'))
+        Plans are pure functions of (pose, target), so they are memoized and
+        can be evaluated speculatively, e.g. for several candidate targets.
+        
+        Args:
+            target_row (int): Target row
+            target_col (int): Target column
+            pose (Pose): Pose to plan from (defaults to the current pose)
+        
+        Returns:
+            tuple: (tuple of commands, Pose after executing them); the
+                   commands are None if the target is unreachable and empty
+                   if the pose is already on the target
+        """
+        if pose is None:
+            pose = self.get_pose()
+        if target_row is None or target_col is None:
+            return (), pose
+        
+        key = (pose, target_row, target_col)
+        plan = self.plan_cache.get(key)
+        if plan is not None:
+            return plan
+        
+        commands = None
+        if self.grid_state.blocked_count:
+            commands = self.plan_around_obstacles(pose, target_row, target_col)
+            if commands is None:
+                plan = (None, pose)
+                self.plan_cache[key] = plan
+                return plan
+        elif self.move_table is not None:
+            entry = self.move_table.lookup(pose.row, pose.col, pose.direction, target_row, target_col)
+            if entry is not None:
+                commands = entry[1]
+        
+        if commands is None:
+            commands = []
+            direction = pose.direction
+            for move in self.calculate_path_to_target(target_row, target_col, pose):
+                move_direction = move[len('move_'):]
+                commands.extend(self.get_commands_to_face(move_direction, direction))
                 commands.append('move_forward')
+                direction = move_direction
+            commands = tuple(commands)
         
-        return commands
+        end_pose = pose
+        for command in commands:
+            end_pose = apply_command(end_pose, command)
+        
+        plan = (commands, end_pose)
+        self.plan_cache[key] = plan
+        return plan
+    
+    def plan_around_obstacles(self, pose, target_row, target_col):
+        """
+        Plan to a target avoiding blocked cells, reusing the incremental planner.
+        
+        Returns:
+            tuple: Commands to reach the target (empty if the pose is on the
+                   target), or None if it is unreachable
+        """
+        goal = (target_row, target_col)
+        planner = self.replanners.get(goal)
+        if planner is None:
+            if len(self.replanners) >= MAX_REPLANNERS:
+                self.replanners.pop(next(iter(self.replanners)))  # Drop the oldest goal
+            planner = DStarLitePlanner(self.grid_state.blocked, goal, (pose.row, pose.col))
+            self.replanners[goal] = planner
+        
+        path = planner.get_path((pose.row, pose.col))
+        if path is None:
+            return None
+        
+        commands = []
+        direction = pose.direction
+        row, col = pose.row, pose.col
+        for next_row, next_col in path:
+            move_direction = DELTA_DIRECTIONS[(next_row - row, next_col - col)]
+            commands.extend(self.get_commands_to_face(move_direction, direction))
+            commands.append('move_forward')
+            direction = move_direction
+            row, col = next_row, next_col
+        return tuple(commands)
     
-    def get_commands_to_face(self, target_direction):
-        """Get commands to turn to face the target direction."""
+    def mark_cell_blocked(self, row, col, blocked=True):
+        """
+        Mark a cell as blocked (e.g. from vision or manual input) or free again.
+        Existing plans are repaired incrementally rather than rebuilt. The
+        cell the robot stands on is never blocked: every plan starts there.
+        """
+        if not (0 <= row < self.grid_rows and 0 <= col < self.grid_cols):
+            return False
+        if blocked and (row, col) == (self.current_row, self.current_col):
+            print(f"Warning: not blocking cell ({row}, {col}), the robot is on it")
+            return False
+        if not self.grid_state.mark_blocked(row, col, blocked):
+            return False
+        
+        self.plan_cache.clear()
+        for planner in self.replanners.values():
+            planner.update_cells([(row, col)])
+        print(f"Cell ({row}, {col}) marked {'blocked' if blocked else 'free'}")
+        return True
+    
+    def plan_cost(self, commands):
+        """Estimated execution time of a command sequence in seconds."""
+        moves = sum(1 for command in commands if command == 'move_forward')
+        return moves * self.route_optimizer.move_cost + (len(commands) - moves) * self.route_optimizer.turn_cost
+    
+    def evaluate_targets(self, targets, pose=None):
+        """
+        Plan to several candidate targets from the same pose (what-if evaluation).
+        
+        Returns:
+            list: (cost, target, commands, end_pose) tuples, cheapest first;
+                  unreachable targets last, with infinite cost and no commands
+        """
+        if pose is None:
+            pose = self.get_pose()
+        results = []
+        for target_row, target_col in targets:
+            commands, end_pose = self.plan_to_target(target_row, target_col, pose)
+            cost = float('inf') if commands is None else self.plan_cost(commands)
+            results.append((cost, (target_row, target_col), commands, end_pose))
+        results.sort(key=lambda result: result[0])
+        return results
+    
+    def get_movement_commands(self, target_row, target_col, pose=None):
+        """
+        Get the sequence of movement commands to reach the target (no state change).
+        
+        Returns:
+            list: Commands (empty if already on the target), or None if the
+                  target is unreachable
+        """
+        commands, _ = self.plan_to_target(target_row, target_col, pose)
+        return None if commands is None else list(commands)
+    
+    def commit_command(self, command):
+        """Commit the effect of a command that has actually been executed."""
+        pose = apply_command(self.get_pose(), command)
+        self.current_direction = pose.direction
+        if (pose.row, pose.col) != (self.current_row, self.current_col):
+            self.update_position(pose.row, pose.col)
+    
+    def get_commands_to_face(self, target_direction, current_direction=None):
+        """Get commands to turn from the current (or given) heading to the target direction."""
         commands = []
         
-        if self.current_direction == target_direction:
+        if current_direction is None:
+            current_direction = self.current_direction
+        
+        if current_direction == target_direction:
             return commands  # Already facing the right direction
         
         # Calculate the turn needed
-        direction_map = {'north': 0, 'east': 1, 'south': 2, 'west': 3}
-        current_angle = direction_map[self.current_direction]
-        target_angle = direction_map[target_direction]
+        current_angle = DIRECTION_INDEX[current_direction]
+        target_angle = DIRECTION_INDEX[target_direction]
         
         # Calculate shortest turn
         turn_angle = (target_angle - current_angle) % 4
@@ -124,23 +318,23 @@ class NavigationController:
         elif turn_angle == 3:  # Turn left
             commands.append('turn_left')
         
-        # Update current direction
-        self.current_direction = target_direction
-        
         return commands
     
     def is_navigation_complete(self):
-        """Check if navigation is complete (all cells visited)."""
-        return len(self.visited_cells) >= len(self.target_cells)
+        """Check if navigation is complete (all target cells visited)."""
+        return self.grid_state.is_complete()
     
     def get_navigation_status(self):
         """Get current navigation status."""
+        total = self.grid_state.target_count()
+        done = total - self.grid_state.remaining_count()  # Visited or skipped as blocked
         return {
             'current_position': (self.current_row, self.current_col),
             'current_direction': self.current_direction,
-            'visited_cells': len(self.visited_cells),
-            'total_cells': len(self.target_cells),
-            'progress': len(self.visited_cells) / len(self.target_cells) * 100,
+            'visited_cells': self.grid_state.visited_target_count,
+            'blocked_cells': self.grid_state.blocked_count,
+            'total_cells': total,
+            'progress': done / total * 100 if total else 100.0,
             'is_complete': self.is_navigation_complete()
         }
     
@@ -149,15 +343,17 @@ class NavigationController:
         self.current_row = 0
         self.current_col = 0
         self.current_direction = 'north'
-        self.visited_cells.clear()
+        self.grid_state.clear_visited()
         print("Navigation reset")
     
-    def set_custom_targets(self, target_cells):
+    def set_custom_targets(self, target_cells, optimize=OPTIMIZE_ROUTE):
         """Set custom target cells for navigation."""
-        self.target_cells = target_cells
-        self.visited_cells.clear()
-        print(f"Custom targets set: {len(target_cells)} cells")
+        self.grid_state.clear_visited()
+        if optimize:
+            target_cells = self.optimize_route(target_cells)
+        self.target_cells = self.grid_state.set_targets(target_cells)
+        print(f"Custom targets set: {len(self.target_cells)} cells")
     
     def get_remaining_targets(self):
         """Get list of remaining target cells."""
-        return [target for target in self.target_cells if target not in self.visited_cells]
+        return self.grid_state.remaining_targets()
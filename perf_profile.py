@@ -0,0 +1,171 @@
+"""
+Runtime performance profiles for the Pi Zero 2W.
+A profile sets, per subsystem, how many threads OpenCV may use, whether its
+optimized (SIMD) code paths are enabled and which CPU cores the process may
+run on, so OpenCV's thread pool does not compete with the RPi.GPIO PWM
+threads and the control loop. Run this module to sweep the settings over
+the vision pipeline and report the best ones for the current machine.
+"""
+
+import os
+import sys
+import time
+import itertools
+import contextlib
+import io
+from config import *
+from lazy_imports import lazy_import
+
+cv2 = lazy_import('cv2')  # Loaded by the first OpenCV setting, not on import
+
+# Subsystem settings: 'opencv_threads' (None leaves OpenCV's default),
+# 'use_optimized' and 'cores' (CPU cores to run on, None for all)
+PERF_PROFILES = {
+    'default': {
+        'control': {'opencv_threads': None, 'use_optimized': True, 'cores': None},
+        'vision_worker': {'opencv_threads': None, 'use_optimized': True, 'cores': None},
+    },
+    # Four cores: the control process (main loop, PWM threads and in-process
+    # detection) keeps core 0 and may borrow one more for OpenCV; vision
+    # workers get one single-threaded process per remaining core
+    'pi_zero_2w': {
+        'control': {'opencv_threads': 2, 'use_optimized': True, 'cores': None},
+        'vision_worker': {'opencv_threads': 1, 'use_optimized': True, 'cores': (1, 2, 3)},
+    },
+    # Smallest footprint: everything single-threaded
+    'single_thread': {
+        'control': {'opencv_threads': 1, 'use_optimized': True, 'cores': None},
+        'vision_worker': {'opencv_threads': 1, 'use_optimized': True, 'cores': None},
+    },
+}
+
+
+def apply_profile(profile=PERF_PROFILE, subsystem='control', opencv=True):
+    """
+    Apply a performance profile to the calling process.
+
+    Call it before starting threads: Linux CPU affinity is inherited by
+    threads created afterwards.
+
+    Args:
+        profile (str or dict): Name in PERF_PROFILES, or a subsystem
+                               settings dict
+        subsystem (str): 'control' or 'vision_worker'
+        opencv (bool): Apply the OpenCV settings too; False sets the CPU
+                       affinity only, without importing OpenCV (apply the
+                       whole profile again later, before using OpenCV)
+
+    Returns:
+        dict: The settings now in effect (see current_settings)
+    """
+    if isinstance(profile, str):
+        if profile not in PERF_PROFILES:
+            print(f"Warning: unknown performance profile '{profile}', using default")
+            profile = 'default'
+        settings = PERF_PROFILES[profile].get(subsystem, {})
+    else:
+        settings = profile
+
+    if opencv:
+        threads = settings.get('opencv_threads')
+        if threads is not None:
+            cv2.setNumThreads(threads)
+        cv2.setUseOptimized(settings.get('use_optimized', True))
+
+    cores = settings.get('cores')
+    if cores is not None and hasattr(os, 'sched_setaffinity'):
+        # Only cores this machine has (the profile may be for a bigger CPU)
+        available = os.sched_getaffinity(0) | set(range(os.cpu_count() or 1))
+        usable = set(cores) & available
+        if usable:
+            try:
+                os.sched_setaffinity(0, usable)
+            except OSError as e:
+                print(f"CPU affinity warning: {e}")
+        else:
+            print(f"Warning: none of cores {sorted(cores)} exist, keeping affinity")
+    return current_settings(opencv)
+
+
+def current_settings(opencv=True):
+    """
+    OpenCV threading/optimization and CPU affinity of the calling process.
+
+    Args:
+        opencv (bool): Include the OpenCV settings (imports OpenCV);
+                       otherwise they are None
+
+    Returns:
+        dict: 'opencv_threads', 'use_optimized' and 'cores'
+    """
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None
+    if not opencv:
+        return {'opencv_threads': None, 'use_optimized': None, 'cores': cores}
+    return {'opencv_threads': cv2.getNumThreads(), 'use_optimized': cv2.useOptimized(), 'cores': cores}
+
+
+def sweep_settings(frames, thread_counts=(1, 2, 3, 4), repeats=3):
+    """
+    Time the vision pipeline under each OpenCV thread count, optimization
+    setting and CPU affinity (all cores, or all but core 0 which is left to
+    the control loop), restoring the original settings afterwards.
+
+    Args:
+        frames (list): BGR frames to detect the grid in
+        thread_counts (tuple): OpenCV thread counts to try
+        repeats (int): Passes over the frames per setting
+
+    Returns:
+        list: (settings dict, ms per frame) sorted fastest first
+    """
+    from camera_controller import CameraController
+
+    original = current_settings()
+    with contextlib.redirect_stdout(io.StringIO()):
+        camera = CameraController(use_camera=False, tracking=False)
+    core_options = [None]
+    if original['cores'] is not None:
+        core_options = [tuple(original['cores'])]
+        if len(original['cores']) > 1:
+            core_options.append(tuple(original['cores'][1:]))
+    results = []
+    try:
+        for use_optimized, threads, cores in itertools.product((True, False), thread_counts, core_options):
+            settings = {'opencv_threads': threads, 'use_optimized': use_optimized, 'cores': cores}
+            apply_profile(settings)
+            with contextlib.redirect_stdout(io.StringIO()):
+                camera.detect_grid(frames[0])  # Warm-up
+                start_time = time.perf_counter()
+                for _ in range(repeats):
+                    for frame in frames:
+                        camera.detect_grid(frame)
+            elapsed = (time.perf_counter() - start_time) / (repeats * len(frames)) * 1000
+            results.append((settings, elapsed))
+    finally:
+        apply_profile(original)
+    return sorted(results, key=lambda result: result[1])
+
+
+def benchmark_profiles(frames):
+    """Print the settings sweep and the best settings for this machine."""
+    print("=== Performance Profile Sweep ===")
+    print(f"CPU cores: {os.cpu_count()}, usable: {current_settings()['cores']}, "
+          f"OpenCV default threads: {cv2.getNumThreads()}")
+    all_cores = current_settings()['cores']
+    results = sweep_settings(frames)
+    print("OpenCV threads | Optimized | Cores     | Detect (ms)")
+    print("-" * 52)
+    for settings, elapsed in sorted(results, key=lambda result: (not result[0]['use_optimized'],
+                                                                   result[0]['opencv_threads'],
+                                                                   -len(result[0]['cores'] or ()))):
+        cores = "all" if settings['cores'] in (None, tuple(all_cores or ())) else ",".join(map(str, settings['cores']))
+        print(f"{settings['opencv_threads']:14d} | {str(settings['use_optimized']):9s} | {cores:9s} | {elapsed:11.2f}")
+    best, elapsed = results[0]
+    print(f"Best: {best} ({elapsed:.2f}ms per frame)")
+
+
+if __name__ == "__main__":
+    from vision_benchmark import load_frames
+    frames, source, _ = load_frames(sys.argv[1] if len(sys.argv) > 1 else IMAGE_SAVE_PATH)
+    print(f"Using {source}\n")
+    benchmark_profiles(frames)
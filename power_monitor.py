@@ -3,13 +3,18 @@ Power monitoring utility for LM2596S buck converter and L298N motor driver.
 This script helps monitor power consumption and voltage levels during operation.
 """
 
-import time
-import RPi.GPIO as GPIO
 from config import *
+from clock import REAL_CLOCK
 
 class PowerMonitor:
-    def __init__(self):
-        """Initialize power monitoring system."""
+    def __init__(self, clock=None):
+        """
+        Initialize power monitoring system.
+        
+        Args:
+            clock: Clock for the monitoring periods (default: wall clock)
+        """
+        self.clock = clock or REAL_CLOCK
         self.monitoring = False
         print("Power Monitor initialized")
         print("Note: This is a software monitor. Use multimeter for accurate voltage readings.")
@@ -75,7 +80,7 @@ class PowerMonitor:
             print(f"Estimated Runtime: {estimated_runtime:.1f} hours")
         
         print("\nMonitoring... (Use multimeter to verify actual values)")
-        time.sleep(duration)
+        self.clock.sleep(duration)
         print("Monitoring complete")
     
     def power_system_test(self):
@@ -91,7 +96,7 @@ class PowerMonitor:
         for pwm in test_levels:
             print(f"\n--- Testing {pwm}% PWM ---")
             self.monitor_motor_operation(pwm, 2)
-            time.sleep(1)
+            self.clock.sleep(1)
         
         print("\n=== Power System Test Complete ===")
         print("Recommendations:")
@@ -0,0 +1,347 @@
+"""
+Route optimizer for the robotic vehicle.
+Computes a near-minimum-time order for visiting a set of target cells,
+taking the cost of turning into account.
+"""
+
+import time
+import random
+from config import *
+
+# Headings in clockwise order (index difference = number of right turns)
+DIRECTIONS = ['north', 'east', 'south', 'west']
+DIRECTION_INDEX = {'north': 0, 'east': 1, 'south': 2, 'west': 3}
+
+
+def count_turns(current_direction, target_direction):
+    """Number of 90-degree turns needed to go from one heading to another."""
+    turn = (DIRECTION_INDEX[target_direction] - DIRECTION_INDEX[current_direction]) % 4
+    return min(turn, 4 - turn)
+
+
+def leg_options(row, col, direction, target_row, target_col):
+    """
+    List the L-shaped ways of driving from a cell to a target cell.
+
+    Returns:
+        list: (moves, turns, end_direction, vertical_first) tuples, one for
+              moving vertically first and one for moving horizontally first
+    """
+    d_row = target_row - row
+    d_col = target_col - col
+    vertical = 'south' if d_row > 0 else 'north'
+    horizontal = 'east' if d_col > 0 else 'west'
+    moves = abs(d_row) + abs(d_col)
+
+    options = []
+    for vertical_first in (True, False):
+        legs = [(vertical, abs(d_row)), (horizontal, abs(d_col))]
+        if not vertical_first:
+            legs.reverse()
+        heading = direction
+        turns = 0
+        for leg_direction, length in legs:
+            if length:
+                turns += count_turns(heading, leg_direction)
+                heading = leg_direction
+        options.append((moves, turns, heading, vertical_first))
+        if d_row == 0 or d_col == 0:
+            break  # Straight line, both orders are identical
+    return options
+
+
+class RouteOptimizer:
+    def __init__(self, move_time=MOVE_FORWARD_TIME, turn_time=TURN_TIME,
+                 command_delay=COMMAND_DELAY, exact_limit=ROUTE_EXACT_LIMIT):
+        """
+        Initialize the route optimizer.
+
+        Args:
+            move_time (float): Seconds to drive one grid cell
+            turn_time (float): Seconds for one 90-degree turn
+            command_delay (float): Pause between executed commands
+            exact_limit (int): Largest target count solved with exact DP
+        """
+        self.move_cost = move_time + command_delay
+        self.turn_cost = turn_time + command_delay
+        self.exact_limit = exact_limit
+
+    def leg_cost(self, row, col, direction, target_row, target_col):
+        """
+        Cheapest time to drive to a target cell.
+
+        Returns:
+            tuple: (cost in seconds, heading on arrival)
+        """
+        best = None
+        for moves, turns, end_direction, _ in leg_options(row, col, direction, target_row, target_col):
+            cost = moves * self.move_cost + turns * self.turn_cost
+            if best is None or cost < best[0]:
+                best = (cost, end_direction)
+        return best
+
+    def route_cost(self, route, start=(0, 0), direction='north'):
+        """Total time to visit the cells of a route in order."""
+        row, col = start
+        total = 0.0
+        for target_row, target_col in route:
+            cost, direction = self.leg_cost(row, col, direction, target_row, target_col)
+            total += cost
+            row, col = target_row, target_col
+        return total
+
+    def optimize(self, targets, start=(0, 0), direction='north'):
+        """
+        Compute a near-minimum-time order for visiting the target cells.
+
+        Small target sets are solved exactly with dynamic programming over
+        (visited set, last cell, heading); larger sets use a nearest-neighbour
+        tour improved with 2-opt and Or-opt moves. The result is never worse
+        than the order the targets were given in.
+
+        Args:
+            targets (list): (row, col) cells to visit
+            start (tuple): Starting cell
+            direction (str): Starting heading
+
+        Returns:
+            list: The targets in visiting order
+        """
+        # Drop duplicates but keep the first occurrence order
+        targets = list(dict.fromkeys(targets))
+
+        # The start cell is visited as soon as the robot localizes itself
+        head = [cell for cell in targets if cell == tuple(start)]
+        remaining = [cell for cell in targets if cell != tuple(start)]
+
+        if len(remaining) <= 1:
+            return head + remaining
+
+        if len(remaining) <= self.exact_limit:
+            route = self._solve_exact(remaining, start, direction)
+        else:
+            route = self._solve_heuristic(remaining, start, direction)
+
+        if self.route_cost(remaining, start, direction) < self.route_cost(route, start, direction):
+            route = remaining
+        return head + route
+
+    def _solve_exact(self, targets, start, direction):
+        """Held-Karp dynamic programming with the heading as part of the state."""
+        n = len(targets)
+        # best[(mask, last, heading)] = (cost, previous state)
+        best = {}
+        for i, (row, col) in enumerate(targets):
+            for moves, turns, end_direction, _ in leg_options(start[0], start[1], direction, row, col):
+                cost = moves * self.move_cost + turns * self.turn_cost
+                key = (1 << i, i, end_direction)
+                if key not in best or cost < best[key][0]:
+                    best[key] = (cost, None)
+
+        # Process states in order of increasing number of visited cells
+        layer = list(best.keys())
+        for _ in range(n - 1):
+            next_layer = {}
+            for state in layer:
+                mask, last, heading = state
+                cost = best[state][0]
+                row, col = targets[last]
+                for j in range(n):
+                    if mask & (1 << j):
+                        continue
+                    for moves, turns, end_direction, _ in leg_options(row, col, heading, *targets[j]):
+                        new_cost = cost + moves * self.move_cost + turns * self.turn_cost
+                        key = (mask | (1 << j), j, end_direction)
+                        if key not in best or new_cost < best[key][0]:
+                            best[key] = (new_cost, state)
+                            next_layer[key] = True
+            layer = list(next_layer.keys())
+
+        # Walk back from the cheapest complete state
+        state = min(layer, key=lambda s: best[s][0])
+        route = []
+        while state is not None:
+            route.append(targets[state[1]])
+            state = best[state][1]
+        route.reverse()
+        return route
+
+    def _edge_cost(self, a, b):
+        """Heading-independent estimate of the time between two cells."""
+        d_row = abs(a[0] - b[0])
+        d_col = abs(a[1] - b[1])
+        cost = (d_row + d_col) * self.move_cost
+        if d_row and d_col:
+            cost += self.turn_cost  # An L-shaped leg always needs one turn
+        return cost
+
+    def _solve_heuristic(self, targets, start, direction, neighbours=8):
+        """Nearest-neighbour construction followed by 2-opt and Or-opt."""
+        route = self._nearest_neighbour(targets, start, direction)
+        return self._local_search(route, start, neighbours)
+
+    def _nearest_neighbour(self, targets, start, direction):
+        """Greedy tour that always drives to the cheapest unvisited target."""
+        rows = [cell[0] for cell in targets] + [start[0]]
+        cols = [cell[1] for cell in targets] + [start[1]]
+        max_radius = max(rows) - min(rows) + max(cols) - min(cols)
+
+        unvisited = set(targets)
+        route = []
+        row, col = start
+        while unvisited:
+            # Search outward ring by ring until no closer target can exist
+            best = None
+            radius = 1
+            while radius <= max_radius and (best is None or radius * self.move_cost <= best[0]):
+                for cell in self._ring(row, col, radius):
+                    if cell in unvisited:
+                        cost, end_direction = self.leg_cost(row, col, direction, *cell)
+                        if best is None or (cost, cell) < (best[0], best[1]):
+                            best = (cost, cell, end_direction)
+                radius += 1
+            _, cell, direction = best
+            unvisited.discard(cell)
+            route.append(cell)
+            row, col = cell
+        return route
+
+    @staticmethod
+    def _ring(row, col, radius):
+        """Cells at exactly the given Manhattan distance from a cell."""
+        for d_row in range(-radius, radius + 1):
+            d_col = radius - abs(d_row)
+            yield (row + d_row, col + d_col)
+            if d_col:
+                yield (row + d_row, col - d_col)
+
+    def _candidate_lists(self, tour, neighbours):
+        """The closest few tour cells to each tour cell."""
+        cells = set(tour)
+        rows = [cell[0] for cell in tour]
+        cols = [cell[1] for cell in tour]
+        max_radius = max(rows) - min(rows) + max(cols) - min(cols)
+
+        candidates = {}
+        for cell in tour:
+            found = []
+            radius = 1
+            while len(found) < neighbours and radius <= max_radius:
+                found.extend(other for other in self._ring(cell[0], cell[1], radius) if other in cells)
+                radius += 1
+            found.sort(key=lambda other: self._edge_cost(cell, other))
+            candidates[cell] = found[:neighbours]
+        return candidates
+
+    def _local_search(self, route, start, neighbours, max_passes=50):
+        """Improve an open tour from a fixed start with 2-opt and Or-opt moves."""
+        tour = [tuple(start)] + list(route)
+        candidates = self._candidate_lists(tour, neighbours)
+
+        for _ in range(max_passes):
+            improved = self._two_opt_pass(tour, candidates)
+            improved = self._or_opt_pass(tour, candidates) or improved
+            if not improved:
+                break
+        return tour[1:]
+
+    def _two_opt_pass(self, tour, candidates):
+        """One sweep of 2-opt moves; reverses tour segments in place."""
+        cost = self._edge_cost
+        n = len(tour)
+        position = {cell: i for i, cell in enumerate(tour)}
+        improved = False
+
+        for i in range(n - 1):
+            a, b = tour[i], tour[i + 1]
+            for c in candidates[a]:
+                j = position[c]
+                if j <= i + 1:
+                    continue
+                d = tour[j + 1] if j + 1 < n else None
+                delta = cost(a, c) - cost(a, b)
+                if d is not None:
+                    delta += cost(b, d) - cost(c, d)
+                if delta < -1e-9:
+                    tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1]
+                    for k in range(i + 1, j + 1):
+                        position[tour[k]] = k
+                    improved = True
+                    break
+        return improved
+
+    def _or_opt_pass(self, tour, candidates):
+        """One sweep of Or-opt moves; relocates segments of 1-3 cells in place."""
+        cost = self._edge_cost
+        n = len(tour)
+        position = {cell: i for i, cell in enumerate(tour)}
+        improved = False
+
+        for length in (1, 2, 3):
+            for i in range(1, n - length + 1):
+                segment = tour[i:i + length]
+                prev = tour[i - 1]
+                nxt = tour[i + length] if i + length < n else None
+                removed = cost(prev, segment[0])
+                if nxt is not None:
+                    removed += cost(segment[-1], nxt) - cost(prev, nxt)
+
+                for c in candidates[segment[0]] + candidates[segment[-1]]:
+                    k = position[c]
+                    if i - 1 <= k <= i + length - 1:
+                        continue
+                    after = tour[k + 1] if k + 1 < n else None
+                    moved = False
+                    for piece in (segment, segment[::-1]):
+                        added = cost(c, piece[0])
+                        if after is not None:
+                            added += cost(piece[-1], after) - cost(c, after)
+                        if added < removed - 1e-9:
+                            # Insert the segment right after cell c
+                            del tour[i:i + length]
+                            insert_at = k + 1 if k < i else k + 1 - length
+                            tour[insert_at:insert_at] = piece
+                            for m in range(min(i, insert_at), max(i, insert_at) + length):
+                                position[tour[m]] = m
+                            moved = True
+                            break
+                    if moved:
+                        improved = True
+                        break
+        return improved
+
+
+def benchmark_route_optimizer():
+    """Compare planning time and mission time against the snake pattern."""
+    print("=== Route Optimizer Benchmark ===")
+    optimizer = RouteOptimizer()
+    rng = random.Random(0)
+
+    print("Grid    | Targets | Plan time | Given order | Optimized | Saved")
+    print("-" * 66)
+    for rows, cols in [(4, 5), (10, 10), (20, 20), (30, 30), (50, 50)]:
+        cells = [(r, c) for r in range(rows) for c in range(cols)]
+        for fraction in (0.1, 0.5, 1.0):
+            count = max(2, int(len(cells) * fraction))
+            if fraction == 1.0:
+                # Full coverage in the default snake order
+                targets = []
+                for r in range(rows):
+                    row_cells = [(r, c) for c in range(cols)]
+                    targets.extend(row_cells if r % 2 == 0 else row_cells[::-1])
+            else:
+                targets = rng.sample(cells, count)
+
+            start_time = time.perf_counter()
+            route = optimizer.optimize(targets)
+            plan_time = time.perf_counter() - start_time
+
+            given = optimizer.route_cost(targets)
+            optimized = optimizer.route_cost(route)
+            saved = (given - optimized) / given * 100 if given else 0.0
+            print(f"{rows:2d}x{cols:<2d}   | {len(targets):7d} | {plan_time:8.3f}s | "
+                  f"{given / 60:9.1f}min | {optimized / 60:7.1f}min | {saved:4.1f}%")
+
+
+if __name__ == "__main__":
+    benchmark_route_optimizer()
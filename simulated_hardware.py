@@ -0,0 +1,456 @@
+"""
+Simulated hardware for running the robot software without a Pi.
+FakeCamera stands in for Picamera2: it renders a grid floor through a
+simple linear sensor and reports the frame metadata the real camera does
+(frame timestamps and duration, exposure, gain, colour gains, AE lock),
+including a startup period with irregular frame timing, white balance that
+settles over a few frames and controls that take effect a few frames late.
+FakeGPIO stands in for the RPi.GPIO module: it keeps the pin modes, levels
+and PWM duty cycles, raises the errors RPi.GPIO raises for misuse, and
+logs every change against a clock so the wheel drive can be checked.
+Run this module to time camera startup on the fake camera.
+"""
+
+import sys
+import time
+import threading
+from config import *
+from clock import REAL_CLOCK
+from lazy_imports import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+# Grey level per unit of exposure (us x gain) at light level 1: the floor reaches 190 at 20ms
+SENSOR_RESPONSE = 190 / 20000
+
+
+class FakeCamera:
+    def __init__(self, scene=None, light=1.0, frame_duration=33333, startup_frames=4, awb_frames=6,
+                 control_latency=2, noise=2.0, clock=None, seed=0):
+        """
+        Initialize the fake camera.
+
+        Args:
+            scene (numpy.ndarray): BGR image of the floor (reflectance, 200 =
+                                   white); by default a synthetic grid
+            light (float): Scene brightness (1 = normal room light)
+            frame_duration (int): Frame interval (us)
+            startup_frames (int): Frames with irregular timing after start()
+            awb_frames (int): Frames auto white balance takes to settle
+            control_latency (int): Frames before set_controls takes effect
+            noise (float): Sensor noise standard deviation at gain 1
+            clock: Clock the frames are delivered on, at the frame rate
+                   (default: wall clock; a VirtualClock makes them instant)
+            seed (int): Random seed
+        """
+        if scene is None:
+            from vision_benchmark import synthetic_grid_frame
+            scene = synthetic_grid_frame(noise=0)
+        self.scene = scene.astype(np.float32) / 200.0
+        self.light = light
+        self.frame_duration = frame_duration
+        self.startup_frames = startup_frames
+        self.awb_frames = awb_frames
+        self.control_latency = control_latency
+        self.noise = noise
+        self.clock = clock or REAL_CLOCK
+        self.rng = np.random.default_rng(seed)
+        self.sensor_modes = []
+        self.sensor_mode = None
+        self.config = None
+        self.started = False
+        self.frame = 0
+        self.controls = {'AeEnable': True, 'AwbEnable': True, 'ExposureTime': 20000, 'AnalogueGain': 1.0}
+        self.pending = []  # (frame the controls take effect, controls)
+        self.ae_locked = False
+        self.timestamp = 0  # ns
+        self.next_frame_time = None
+        self.stats = {'frames': 0, 'set_controls': 0}
+
+    def create_still_configuration(self, main=None, lores=None, **kwargs):
+        """Camera configuration: the stream sizes and formats."""
+        return {'main': main or {"size": (CAMERA_WIDTH, CAMERA_HEIGHT), "format": "RGB888"}, 'lores': lores}
+
+    def configure(self, config):
+        """Apply a configuration from create_still_configuration."""
+        self.config = config
+
+    def set_controls(self, controls):
+        """Queue controls; they take effect control_latency frames later."""
+        self.stats['set_controls'] += 1
+        self.pending.append((self.frame + self.control_latency, dict(controls)))
+
+    def start(self):
+        """Start streaming frames."""
+        self.started = True
+        self.frame = 0
+        self.next_frame_time = self.clock.time() + self.frame_duration / 1e6
+
+    def stop(self):
+        """Stop streaming frames."""
+        self.started = False
+
+    def close(self):
+        """Release the camera."""
+        self.started = False
+
+    def capture_array(self, name="main"):
+        """Capture one array of the next frame."""
+        (array,), _ = self.capture_arrays([name])
+        return array
+
+    def capture_arrays(self, names):
+        """
+        Capture arrays of the next frame.
+
+        Args:
+            names (list): Stream names, 'main' and/or 'lores'
+
+        Returns:
+            tuple: (list of arrays, metadata dict)
+        """
+        if not self.started:
+            raise RuntimeError("Camera not started")
+        self._wait_for_frame()
+        self._apply_controls()
+        metadata = self._metadata()
+        exposure = metadata['ExposureTime'] * metadata['AnalogueGain']
+        noise = self.noise * (0.5 + 0.5 * metadata['AnalogueGain'])
+
+        arrays = []
+        for name in names:
+            stream = self.config[name] if self.config else None
+            size = stream['size'] if stream else (CAMERA_WIDTH, CAMERA_HEIGHT)
+            scene = cv2.resize(self.scene, size, interpolation=cv2.INTER_AREA)
+            if name == 'lores':
+                scene = cv2.cvtColor(scene, cv2.COLOR_BGR2GRAY)
+            image = scene * (self.light * SENSOR_RESPONSE * exposure)
+            image += self.rng.normal(0, noise, image.shape).astype(np.float32)
+            image = np.clip(image, 0, 255).astype(np.uint8)
+            if name == 'lores':
+                # YUV420: Y plane on top of the quarter-size U and V planes
+                image = np.vstack([image, np.full((size[1] // 2, size[0]), 128, dtype=np.uint8)])
+            else:
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            arrays.append(image)
+        self.frame += 1
+        self.stats['frames'] += 1
+        return arrays, metadata
+
+    def _wait_for_frame(self):
+        """Wait on the clock until the next frame is due and advance the sensor timestamp."""
+        interval = self.frame_duration
+        if self.frame < self.startup_frames:
+            # Sensor and ISP pipeline still filling: irregular frame intervals
+            interval = int(self.frame_duration * self.rng.uniform(1.3, 2.5))
+        self.timestamp += interval * 1000
+        self.next_frame_time += interval / 1e6
+        delay = self.next_frame_time - self.clock.time()
+        if delay > 0:
+            self.clock.sleep(delay)
+        else:
+            self.next_frame_time = self.clock.time()
+
+    def _apply_controls(self):
+        """Apply the queued controls that are due, and run the simulated AE."""
+        due = [controls for frame, controls in self.pending if frame <= self.frame]
+        self.pending = [(frame, controls) for frame, controls in self.pending if frame > self.frame]
+        for controls in due:
+            self.controls.update(controls)
+        if self.controls.get('AeEnable', True):
+            # Auto exposure: halfway to a mid-grey picture per frame, gain first kept at 1
+            target = 120 / (self.light * SENSOR_RESPONSE * 0.9)
+            current = self.controls['ExposureTime'] * self.controls['AnalogueGain']
+            exposure = current + 0.5 * (target - current)
+            self.controls['ExposureTime'] = int(min(exposure, 66000))
+            self.controls['AnalogueGain'] = max(1.0, exposure / self.controls['ExposureTime'])
+            self.ae_locked = abs(exposure - target) <= 0.03 * target
+        else:
+            self.ae_locked = False
+
+    def _metadata(self):
+        """Metadata of the frame being captured."""
+        settled = min(1.0, self.frame / max(self.awb_frames, 1)) if self.controls.get('AwbEnable', True) else 1.0
+        # Colour gains move from neutral to the scene's white point, settling by awb_frames
+        colour_gains = (1.0 + 0.8 * (1 - (1 - settled) ** 3), 1.0 + 0.5 * (1 - (1 - settled) ** 3))
+        return {
+            'SensorTimestamp': self.timestamp,
+            'FrameDuration': self.frame_duration,
+            'ExposureTime': int(self.controls['ExposureTime']),
+            'AnalogueGain': float(self.controls['AnalogueGain']),
+            'DigitalGain': 1.0,
+            'ColourGains': colour_gains,
+            'AeLocked': self.ae_locked,
+        }
+
+
+class FakePWM:
+    def __init__(self, gpio, pin, frequency):
+        """PWM on a FakeGPIO pin (see RPi.GPIO.PWM)."""
+        self.gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.running = False
+
+    def start(self, duty_cycle):
+        """Start the PWM output at a duty cycle (0-100)."""
+        self.running = True
+        self.ChangeDutyCycle(duty_cycle)
+
+    def ChangeDutyCycle(self, duty_cycle):
+        """Set the duty cycle (0-100)."""
+        if not 0 <= duty_cycle <= 100:
+            raise ValueError("dutycycle must have a value from 0.0 to 100.0")
+        self.gpio._set_level(self.pin, duty_cycle / 100 if self.running else 0.0, 'pwm')
+
+    def ChangeFrequency(self, frequency):
+        """Set the PWM frequency (Hz)."""
+        if frequency <= 0:
+            raise ValueError("frequency must be greater than 0.0")
+        self.frequency = frequency
+
+    def stop(self):
+        """Stop the PWM output (the pin goes low)."""
+        self.running = False
+        self.gpio._set_level(self.pin, 0.0, 'pwm')
+        self.gpio.pwm.pop(self.pin, None)
+
+
+class FakeGPIO:
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self, clock=None, inputs=None, reversed_motors=(REVERSE_LEFT_MOTOR, REVERSE_RIGHT_MOTOR)):
+        """
+        Initialize the simulated GPIO.
+
+        Args:
+            clock: Clock the pin changes are logged against (default: wall clock)
+            inputs (dict): Levels of external inputs by pin, e.g.
+                           {START_BUTTON_PIN: 0} for a pressed button;
+                           unlisted inputs read their pull-up/down level
+            reversed_motors (tuple): (left, right) motors wired in reverse,
+                                     as REVERSE_LEFT_MOTOR/REVERSE_RIGHT_MOTOR
+                                     describe the real wiring
+        """
+        self.clock = clock or REAL_CLOCK
+        self.inputs = dict(inputs or {})
+        self.reversed_motors = reversed_motors
+        self.mode = None
+        self.pins = {}  # pin -> {'direction', 'pull', 'level'}, level 0-1 (PWM duty as a fraction)
+        self.pwm = {}  # pin -> FakePWM
+        self.log = []  # (time, pin, kind, level)
+        self.lock = threading.Lock()
+
+    def setmode(self, mode):
+        """Select the pin numbering (BCM or BOARD)."""
+        if self.mode is not None and mode != self.mode:
+            raise ValueError("A different mode has already been set!")
+        self.mode = mode
+
+    def getmode(self):
+        """The pin numbering in use, or None."""
+        return self.mode
+
+    def setwarnings(self, enabled):
+        """Warnings are not simulated."""
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        """Configure a pin as an input or output."""
+        if self.mode is None:
+            raise RuntimeError("Please set pin numbering mode using GPIO.setmode(GPIO.BOARD) or GPIO.setmode(GPIO.BCM)")
+        for channel in (pin if isinstance(pin, (list, tuple)) else [pin]):
+            if not 0 <= channel <= 27:
+                raise ValueError("The channel sent is invalid on a Raspberry Pi")
+            level = float(initial or 0) if direction == self.OUT else None
+            self.pins[channel] = {'direction': direction, 'pull': pull_up_down or self.PUD_OFF, 'level': level}
+            if level is not None:
+                self._set_level(channel, level, 'setup')
+
+    def output(self, pin, value):
+        """Drive an output pin high or low."""
+        for channel in (pin if isinstance(pin, (list, tuple)) else [pin]):
+            state = self.pins.get(channel)
+            if state is None or state['direction'] != self.OUT:
+                raise RuntimeError("The GPIO channel has not been set up as an OUTPUT")
+            self._set_level(channel, 1.0 if value else 0.0, 'output')
+
+    def input(self, pin):
+        """Read a pin: the driven level of an output, else the external or pull level."""
+        state = self.pins.get(pin)
+        if state is None:
+            raise RuntimeError("You must setup() the GPIO channel first")
+        if state['direction'] == self.OUT:
+            return self.HIGH if state['level'] >= 0.5 else self.LOW
+        if pin in self.inputs:
+            return self.inputs[pin]
+        return self.HIGH if state['pull'] == self.PUD_UP else self.LOW
+
+    def PWM(self, pin, frequency):
+        """PWM on an output pin; one PWM object per pin, as RPi.GPIO enforces."""
+        state = self.pins.get(pin)
+        if state is None or state['direction'] != self.OUT:
+            raise RuntimeError("You must setup() the GPIO channel as an output first")
+        if pin in self.pwm:
+            raise RuntimeError("A PWM object already exists for this GPIO channel")
+        self.pwm[pin] = FakePWM(self, pin, frequency)
+        return self.pwm[pin]
+
+    def cleanup(self, pin=None):
+        """Return pins (all by default) to unconfigured inputs."""
+        channels = list(self.pins) if pin is None else (pin if isinstance(pin, (list, tuple)) else [pin])
+        for channel in channels:
+            if channel in self.pins and self.pins[channel]['level']:
+                self._set_level(channel, 0.0, 'cleanup')
+            self.pins.pop(channel, None)
+            self.pwm.pop(channel, None)
+        if pin is None:
+            self.mode = None
+
+    def set_input(self, pin, level):
+        """
+        Drive an external input, e.g. press the start button with
+        set_input(START_BUTTON_PIN, LOW); None returns it to its pull level.
+        """
+        if level is None:
+            self.inputs.pop(pin, None)
+        else:
+            self.inputs[pin] = level
+
+    def level(self, pin):
+        """Output level of a pin, 0-1 (PWM duty as a fraction), 0 if not an output."""
+        state = self.pins.get(pin)
+        return state['level'] if state and state['level'] is not None else 0.0
+
+    def wheel_drive(self):
+        """
+        Drive of each wheel from the L298N pins: enable duty times the
+        direction inputs, positive for forward wheel motion.
+
+        Returns:
+            tuple: (left, right), each -1 (full backward) to 1 (full forward)
+        """
+        drive = []
+        for forward, backward, enable, reversed_motor in (
+                (MOTOR_LEFT_FORWARD, MOTOR_LEFT_BACKWARD, ENB_PIN, self.reversed_motors[0]),
+                (MOTOR_RIGHT_FORWARD, MOTOR_RIGHT_BACKWARD, ENA_PIN, self.reversed_motors[1])):
+            direction = self.level(forward) - self.level(backward)
+            speed = self.level(enable) if USE_ENABLE_PINS else 1.0
+            drive.append((-1 if reversed_motor else 1) * direction * speed)
+        return tuple(drive)
+
+    def _set_level(self, pin, level, kind):
+        """Set an output level and log the change."""
+        with self.lock:
+            state = self.pins.get(pin)
+            if state is not None:
+                state['level'] = level
+            self.log.append((self.clock.time(), pin, kind, level))
+
+
+def benchmark_camera_startup(light_levels=(0.2, 1.0, 5.0)):
+    """
+    Start the camera controller on the fake camera under dim, normal and
+    bright light, with the closed-loop exposure controller and with the
+    camera's auto exposure, and report the time to the first ready frame.
+    """
+    import contextlib
+    import io
+    from camera_controller import CameraController
+
+    print("=== Camera Startup Benchmark ===")
+    print("Light | Exposure      | First frame (ms) | Ready (ms) | Frames | Ready | Floor level")
+    print("-" * 84)
+    for light in light_levels:
+        for name, enabled in (("closed loop", True), ("auto (AE)", False)):
+            camera = FakeCamera(light=light)
+            with contextlib.redirect_stdout(io.StringIO()):
+                controller = CameraController(use_camera=False, tracking=False, camera=camera,
+                                              exposure_control=enabled)
+                image = controller.capture_image()
+                controller.cleanup()
+            stats = controller.startup_stats
+            floor = np.percentile(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), EXPOSURE_PERCENTILE)
+            print(f"{light:5.1f} | {name:13s} | {stats['first_frame_ms']:16.0f} | {stats['ready_ms']:10.0f} | "
+                  f"{stats['frames']:6d} | {str(stats['ready']):5s} | {floor:11.0f}")
+    print("(Before: fixed sleeps of 3s at startup and 0.5s before every capture)")
+
+
+
+def simulate_mission(button_press=2.0, light=1.0, scene=None, targets=None, known_start=True, clock=None):
+    """
+    Run a whole navigation mission of the RobotController on simulated
+    hardware and a virtual clock: FakeGPIO for the motors and button,
+    FakeCamera for the camera, and the start button pressed at button_press
+    seconds.
+
+    Args:
+        button_press (float): Virtual time (s) the start button is pressed
+        light (float): Scene brightness (see FakeCamera)
+        scene (numpy.ndarray): Floor image (see FakeCamera)
+        targets (list): Cells to visit in this order (default: the
+                        navigation controller's own targets)
+        known_start (bool): False starts the localizer with no idea of the
+                            pose (uniform belief)
+        clock (VirtualClock): Clock to run on (default: a new one)
+
+    Returns:
+        tuple: (robot, gpio, clock) after the mission
+    """
+    import contextlib
+    import io
+    from clock import VirtualClock
+    from main_controller import RobotController
+
+    clock = clock or VirtualClock()
+    gpio = FakeGPIO(clock=clock)
+    camera = FakeCamera(scene=scene, light=light, clock=clock)
+    clock.schedule(button_press, lambda: gpio.set_input(START_BUTTON_PIN, gpio.LOW))
+    clock.schedule(button_press + 0.3, lambda: gpio.set_input(START_BUTTON_PIN, None))
+    with contextlib.redirect_stdout(io.StringIO()):
+        robot = RobotController(gpio=gpio, camera=camera, clock=clock)
+        if targets is not None:
+            robot.navigation_controller.set_custom_targets(targets, optimize=False)
+        if not known_start:
+            robot.localizer.reset_uniform()
+        robot.start()
+    return robot, gpio, clock
+
+
+def benchmark_virtual_clock(runs=2):
+    """
+    Run the simulated mission a few times and report the virtual mission
+    time against the wall time, and whether every run drove the pins
+    identically.
+    """
+    print("=== Simulated Mission (virtual clock) ===")
+    logs = []
+    for run in range(runs):
+        start_time = time.perf_counter()
+        robot, gpio, clock = simulate_mission()
+        wall = time.perf_counter() - start_time
+        status = robot.navigation_controller.get_navigation_status()
+        logs.append(gpio.log)
+        print(f"Run {run + 1}: {clock.time():.1f}s of mission in {wall:.2f}s wall "
+              f"({clock.time() / wall:.0f}x), {clock.events} clock events, {len(gpio.log)} pin changes, "
+              f"complete: {robot.navigation_controller.is_navigation_complete()}")
+    print(f"Identical pin timelines across runs: {all(log == logs[0] for log in logs)}")
+    print(f"Navigation: {status}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ['mission']:
+        benchmark_virtual_clock()
+    else:
+        benchmark_camera_startup()
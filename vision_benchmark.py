@@ -0,0 +1,732 @@
+"""
+Benchmarks for the grid vision pipeline on recorded frames.
+Uses the debug frames saved by the main controller (step_*.jpg in
+IMAGE_SAVE_PATH, or a directory given on the command line) and falls back
+to synthetic grid frames when none are available. No camera is needed.
+"""
+
+import os
+import sys
+import glob
+import time
+import contextlib
+import io
+import tracemalloc
+import pickle
+import cv2
+import numpy as np
+from config import *
+from camera_controller import CameraController, LINE_DETECTORS
+from birds_eye import BirdsEyeView, calibrate_homography, load_calibration
+from frame_buffers import FrameBufferPool
+from vision_workers import VisionWorkerPool
+from frame_quality import FrameQualityGate, lores_gray
+from exposure_control import ExposureController
+
+# Memory of the Raspberry Pi the robot runs on
+PI_MEMORY_MB = 512
+
+# Synthetic camera: the floor cell (0..50cm, 0..50cm) seen as a trapezoid
+SYNTHETIC_CELL_CORNERS = [(270, 230), (370, 230), (250, 330), (390, 330)]
+
+
+def synthetic_grid_frame(angle=0.0, offset=(30, 20), spacing=100, thickness=6, noise=10, seed=0,
+                         width=CAMERA_WIDTH, height=CAMERA_HEIGHT):
+    """
+    Render a grid of dark tape lines on a light floor.
+
+    Args:
+        angle (float): Grid rotation in degrees
+        offset (tuple): (x, y) pixel position of the first vertical/horizontal line
+        spacing (int): Pixels between lines
+        thickness (int): Line thickness in pixels
+        noise (float): Standard deviation of the sensor noise
+        seed (int): Noise seed
+
+    Returns:
+        numpy.ndarray: BGR image
+    """
+    rng = np.random.default_rng(seed)
+    # Draw on a canvas twice the frame size so rotation leaves no empty corners
+    canvas = np.full((height * 2, width * 2, 3), 200, dtype=np.uint8)
+    for y in range(offset[1] - height // 2, 2 * height, spacing):
+        cv2.line(canvas, (0, y + height // 2), (2 * width, y + height // 2), (30, 30, 30), thickness)
+    for x in range(offset[0] - width // 2, 2 * width, spacing):
+        cv2.line(canvas, (x + width // 2, 0), (x + width // 2, 2 * height), (30, 30, 30), thickness)
+    rotation = cv2.getRotationMatrix2D((width, height), angle, 1.0)
+    canvas = cv2.warpAffine(canvas, rotation, (2 * width, 2 * height), borderValue=(200, 200, 200))
+    frame = canvas[height // 2:height // 2 + height, width // 2:width // 2 + width].astype(np.float32)
+    frame += rng.normal(0, noise, frame.shape)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def synthetic_floor_frame(homography, line_width_cm=2.0, noise=10, seed=0,
+                          width=CAMERA_WIDTH, height=CAMERA_HEIGHT):
+    """
+    Render the camera view of a floor grid under perspective.
+
+    Args:
+        homography (numpy.ndarray): Floor (cm) to image pixel homography
+
+    Returns:
+        numpy.ndarray: BGR image
+    """
+    rng = np.random.default_rng(seed)
+    xs, ys = np.meshgrid(np.arange(width, dtype=np.float64), np.arange(height, dtype=np.float64))
+    floor = np.stack([xs, ys, np.ones_like(xs)], axis=-1) @ np.linalg.inv(homography).T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        floor_x = floor[..., 0] / floor[..., 2]
+        floor_y = floor[..., 1] / floor[..., 2]
+    on_floor = floor[..., 2] > 0
+
+    def near_line(values):
+        offset = np.abs((values + GRID_CELL_SIZE_CM / 2) % GRID_CELL_SIZE_CM - GRID_CELL_SIZE_CM / 2)
+        return offset < line_width_cm / 2
+
+    lines = on_floor & (near_line(floor_x) | near_line(floor_y))
+    frame = np.where(lines, 30.0, 200.0)
+    frame = np.repeat(frame[:, :, np.newaxis], 3, axis=2) + rng.normal(0, noise, (height, width, 3))
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def synthetic_run(steps=60, seed=0):
+    """
+    Simulate the frames of a navigation run with drift between steps.
+
+    Returns:
+        list: (commands executed before the frame, BGR frame) pairs
+    """
+    rng = np.random.default_rng(seed)
+    angle, offset_x, offset_y = 1.0, 30.0, 20.0
+    run = []
+    for step in range(steps):
+        commands = []
+        if step and step % 8 == 0:
+            # Turn: new heading error and an unpredictable shift of the view
+            commands = ['turn_right']
+            angle = rng.uniform(-3, 3)
+            offset_x, offset_y = rng.uniform(0, 100), rng.uniform(0, 100)
+        elif step:
+            # One cell forward maps the lattice onto itself, up to drift
+            commands = ['move_forward']
+            offset_x += rng.normal(0, 3)
+            offset_y += rng.normal(0, 5)
+            angle += rng.normal(0, 0.3)
+        frame = synthetic_grid_frame(angle, offset=(int(offset_x) % 100, int(offset_y) % 100), seed=step)
+        run.append((commands, frame))
+    return run
+
+
+def load_frames(directory=IMAGE_SAVE_PATH, pattern="step_*.jpg", limit=200):
+    """
+    Load recorded frames in capture order.
+
+    Returns:
+        tuple: (list of BGR images, description of the source, True if the
+                frames are recordings rather than synthetic)
+    """
+    def step_number(path):
+        digits = ''.join(ch for ch in os.path.basename(path) if ch.isdigit())
+        return int(digits) if digits else 0
+
+    paths = sorted(glob.glob(os.path.join(directory, pattern)), key=step_number)[:limit]
+    frames = [frame for frame in (cv2.imread(path) for path in paths) if frame is not None]
+    if frames:
+        return frames, f"{len(frames)} recorded frames from {directory}", True
+
+    # No recordings: axis-aligned frames plus a few rotated ones
+    angles = [0.0] * 12 + [0.5, 1.0, 2.0, 5.0, 8.0, 12.0]
+    frames = [synthetic_grid_frame(angle, offset=(20 + 7 * i, 15 + 5 * i), seed=i)
+              for i, angle in enumerate(angles)]
+    description = f"{len(frames)} synthetic frames ({angles.count(0.0)} axis-aligned, {len(angles) - angles.count(0.0)} rotated)"
+    return frames, description, False
+
+
+def _time_per_frame(function, frames, repeats=5):
+    """Average milliseconds of function(frame) over all frames."""
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        for frame in frames:
+            function(frame)
+    return (time.perf_counter() - start_time) / (repeats * len(frames)) * 1000
+
+
+def benchmark_line_detectors(frames):
+    """Compare the grid line detectors for speed and detection quality."""
+    print("=== Grid Line Detector Benchmark ===")
+    print("Detector    | Lines (ms) | Full detect (ms) | Fast path | Cells | Quality")
+    print("-" * 74)
+    for detector in LINE_DETECTORS:
+        with contextlib.redirect_stdout(io.StringIO()):
+            camera = CameraController(line_detector=detector, use_camera=False)
+            # Copies: the preprocessed image is a pooled buffer reused by the next frame
+            processed = [camera.preprocess_image(frame).copy() for frame in frames]
+            line_time = _time_per_frame(lambda image: camera.detect_grid_lines(image, oriented=True), processed)
+            detect_time = _time_per_frame(camera.detect_grid, frames, repeats=1)
+            detections = [camera.detect_grid(frame) for frame in frames]
+
+        if detector == 'projection':
+            fast = sum(camera.detect_grid_lines_projection(image, True) is not None for image in processed)
+            fast_path = f"{fast:4d}/{len(frames):<4d}"
+        else:
+            fast_path = "    -    "
+        cells = np.mean([len(detection['cells']) for detection in detections])
+        quality = np.mean([detection['quality'] for detection in detections])
+        print(f"{detector:11s} | {line_time:10.2f} | {detect_time:16.2f} | {fast_path} | {cells:5.1f} | {quality:7.3f}")
+
+
+
+def _center_cell(detection, center):
+    """Center of the detected cell nearest to a point, or None."""
+    if not detection['cells']:
+        return None
+    return min(detection['cells'], key=lambda cell: (cell['center'][0] - center[0]) ** 2 +
+               (cell['center'][1] - center[1]) ** 2)['center']
+
+
+def benchmark_pyramid(frames, levels=(0, 2, 3)):
+    """
+    Compare pyramid (coarse-to-fine) detection with full-resolution detection:
+    latency of the image stages (grayscale to line segments) and of the whole
+    detection, and how far the center cell moves from the full-resolution result.
+    """
+    print("=== Pyramid Detection Benchmark ===")
+    print("Detector    | Scale | Image (ms) | Detect (ms) | Usable | Cells | Quality | Center cell vs full")
+    print("-" * 96)
+    for detector in LINE_DETECTORS:
+        reference = None
+        for level in levels:
+            with contextlib.redirect_stdout(io.StringIO()):
+                camera = CameraController(line_detector=detector, use_camera=False, tracking=False,
+                                          pyramid_levels=level)
+                image_time = _time_per_frame(
+                    lambda frame: camera.detect_grid_lines(camera.preprocess_image(frame), oriented=True), frames)
+                detect_time = _time_per_frame(camera.detect_grid, frames, repeats=2)
+                detections = [camera.detect_grid(frame) for frame in frames]
+            center = camera.frame_geometry()[3]
+            if reference is None:
+                reference = detections
+            errors = []
+            for full, coarse in zip(reference, detections):
+                # The same cell in both: the one nearest the full-resolution center cell
+                full_center = _center_cell(full, center)
+                coarse_center = _center_cell(coarse, full_center) if full_center is not None else None
+                if coarse_center is not None:
+                    errors.append(np.hypot(full_center[0] - coarse_center[0], full_center[1] - coarse_center[1]))
+            usable = sum(detection['quality'] >= GRID_DETECTION_THRESHOLD for detection in detections)
+            cells = np.mean([len(detection['cells']) for detection in detections])
+            quality = np.mean([detection['quality'] for detection in detections])
+            error = f"{np.median(errors):5.1f}px median, {np.max(errors):5.1f}px max" if errors else "-"
+            print(f"{detector:11s} | 1/{2 ** level:<3d} | {image_time:10.2f} | {detect_time:11.2f} | "
+                  f"{usable:3d}/{len(frames):<2d} | {cells:5.1f} | {quality:7.3f} | {error}")
+
+
+def benchmark_rotated_grids(angles=(0, 2, 5, 10, 20, 30, 45), frames_per_angle=3):
+    """
+    Compare the grid line detectors on synthetic grids at known rotations.
+
+    Accuracy is the error of the fitted grid orientation and the fraction
+    of frames with a usable detection (quality above GRID_DETECTION_THRESHOLD).
+    """
+    print("=== Rotated Grid Benchmark ===")
+    print("Detector    | Angle | Lines (ms) | Usable | Cells | Quality | Angle error")
+    print("-" * 74)
+    for detector in LINE_DETECTORS:
+        with contextlib.redirect_stdout(io.StringIO()):
+            camera = CameraController(line_detector=detector, use_camera=False)
+        for angle in angles:
+            frames = [synthetic_grid_frame(angle, offset=(20 + 11 * i, 15 + 7 * i), seed=i)
+                      for i in range(frames_per_angle)]
+            processed = [camera.preprocess_image(frame).copy() for frame in frames]
+            with contextlib.redirect_stdout(io.StringIO()):
+                line_time = _time_per_frame(lambda image: camera.detect_grid_lines(image, oriented=True), processed)
+                detections = [camera.detect_grid(frame) for frame in frames]
+
+            usable = sum(detection['quality'] >= GRID_DETECTION_THRESHOLD for detection in detections)
+            errors = []
+            for detection in detections:
+                if detection['model'] is not None:
+                    # Rotating the frame by +angle turns image lines by -angle (y points down)
+                    orientation = detection['model'].horizontal.orientation()
+                    errors.append(abs((orientation + angle + 45) % 90 - 45))
+            error = f"{np.mean(errors):9.2f}deg" if errors else "        -   "
+            cells = np.mean([len(detection['cells']) for detection in detections])
+            quality = np.mean([detection['quality'] for detection in detections])
+            print(f"{detector:11s} | {angle:5.1f} | {line_time:10.2f} | {usable:3d}/{len(frames):<2d} | "
+                  f"{cells:5.1f} | {quality:7.3f} | {error}")
+
+
+def benchmark_birds_eye(frames=None, homography=None):
+    """
+    Measure the bird's-eye remap stage and compare grid detection in the
+    camera view with detection in the bird's-eye view.
+
+    Uses synthetic perspective frames unless recorded frames and their floor
+    calibration are given.
+    """
+    print("=== Bird's-Eye View Benchmark ===")
+    if frames is None or homography is None:
+        homography = calibrate_homography(SYNTHETIC_CELL_CORNERS,
+                                          [(0, 0), (GRID_CELL_SIZE_CM, 0), (0, GRID_CELL_SIZE_CM),
+                                           (GRID_CELL_SIZE_CM, GRID_CELL_SIZE_CM)])
+        frames = [synthetic_floor_frame(homography, seed=i) for i in range(10)]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        view = BirdsEyeView(homography, cache_dir=None)
+    print(f"View {view.width}x{view.height} from source region {view.source_rect[2]}x{view.source_rect[3]} "
+          f"(frame {frames[0].shape[1]}x{frames[0].shape[0]})")
+
+    # Remap stage: cached fixed-point maps vs float maps vs a full perspective warp
+    grays = [cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frames]
+    fixed_time = _time_per_frame(view.warp, grays, repeats=20)
+    map_x, map_y = cv2.convertMaps(view.map1, view.map2, cv2.CV_32FC1)
+    x, y, w, h = view.source_rect
+    float_time = _time_per_frame(lambda gray: cv2.remap(gray[y:y + h, x:x + w], map_x, map_y, cv2.INTER_LINEAR),
+                                 grays, repeats=20)
+    warp_time = _time_per_frame(lambda gray: cv2.warpPerspective(gray, view.image_to_view, (view.width, view.height)),
+                                grays, repeats=20)
+    print(f"Remap, fixed-point maps: {fixed_time:6.3f}ms per frame")
+    print(f"Remap, float maps:       {float_time:6.3f}ms per frame")
+    print(f"warpPerspective:         {warp_time:6.3f}ms per frame")
+    print()
+
+    print("View        | Detector    | Detect (ms) | Fast path | Cells | Quality")
+    print("-" * 70)
+    for name, birds_eye in (("camera", None), ("bird's-eye", view)):
+        for detector in ('projection', 'hough'):
+            with contextlib.redirect_stdout(io.StringIO()):
+                camera = CameraController(line_detector=detector, use_camera=False, birds_eye=birds_eye)
+                camera.birds_eye = birds_eye  # None must mean the camera view even when BIRDS_EYE_ENABLED
+                detect_time = _time_per_frame(camera.detect_grid, frames, repeats=2)
+                detections = [camera.detect_grid(frame) for frame in frames]
+            if detector == 'projection':
+                fast = sum(camera.detect_grid_lines_projection(camera.preprocess_image(frame), True) is not None
+                           for frame in frames)
+                fast_path = f"{fast:4d}/{len(frames):<4d}"
+            else:
+                fast_path = "    -    "
+            cells = np.mean([len(detection['cells']) for detection in detections])
+            quality = np.mean([detection['quality'] for detection in detections])
+            print(f"{name:11s} | {detector:11s} | {detect_time:11.2f} | {fast_path} | {cells:5.1f} | {quality:7.3f}")
+
+
+def benchmark_tracking(run):
+    """
+    Compare full detection on every frame with grid line tracking.
+
+    Args:
+        run (list): (commands before the frame, frame) pairs in capture order
+    """
+    print("=== Grid Tracking Benchmark ===")
+    with contextlib.redirect_stdout(io.StringIO()):
+        full_camera = CameraController(use_camera=False, tracking=False)
+        tracking_camera = CameraController(use_camera=False, tracking=True)
+
+        full_time = 0.0
+        tracking_time = 0.0
+        tracked_times = []
+        errors = []
+        for commands, frame in run:
+            start_time = time.perf_counter()
+            full = full_camera.detect_grid(frame)
+            full_time += time.perf_counter() - start_time
+
+            for command in commands:
+                tracking_camera.note_motion(command)
+            start_time = time.perf_counter()
+            tracked = tracking_camera.detect_grid(frame)
+            elapsed = time.perf_counter() - start_time
+            tracking_time += elapsed
+            if tracked['metrics'].get('tracked'):
+                tracked_times.append(elapsed)
+
+            # Agreement: center of the cell nearest the image center
+            if full['cells'] and tracked['cells']:
+                _, _, _, (center_x, center_y) = full_camera.frame_geometry()
+                nearest = [min(detection['cells'], key=lambda cell: (cell['center'][0] - center_x) ** 2 +
+                               (cell['center'][1] - center_y) ** 2)['center'] for detection in (full, tracked)]
+                errors.append(np.hypot(nearest[0][0] - nearest[1][0], nearest[0][1] - nearest[1][1]))
+
+    stats = tracking_camera.tracker.stats
+    frames = len(run)
+    print(f"Frames:                 {frames}")
+    print(f"Full detection:         {full_time / frames * 1000:6.2f}ms per frame")
+    print(f"With tracking:          {tracking_time / frames * 1000:6.2f}ms per frame "
+          f"({full_time / max(tracking_time, 1e-9):.1f}x faster)")
+    print(f"Tracked frames:         {stats['tracked']} ({stats['tracked'] / frames:.0%}), "
+          f"full detections: {stats['full']}")
+    if tracked_times:
+        full_frames = frames - len(tracked_times)
+        print(f"Tracked frame cost:     {np.mean(tracked_times) * 1000:6.2f}ms, frames with full detection "
+              f"{(tracking_time - sum(tracked_times)) / max(full_frames, 1) * 1000:6.2f}ms")
+    print(f"Lock losses:            {stats['lock_losses']} ({stats['lock_losses'] / frames:.1%} of frames), "
+          f"resets after turns: {stats['resets']}")
+    if errors:
+        print(f"Center cell agreement:  {np.mean(errors):.2f}px mean, {np.max(errors):.2f}px max difference")
+
+
+
+def benchmark_detection_cache(run, frames_per_stop=4, noise=10, seed=0):
+    """
+    Detect the grid in several frames per stop of a navigation run, as the
+    robot stands still between commands, with and without the detection
+    cache: hit rate, CPU time saved and how far the reused grid is from a
+    fresh detection.
+
+    Args:
+        run (list): (commands before the frame, frame) pairs, one per stop
+        frames_per_stop (int): Frames captured while stationary at each stop
+        noise (float): Extra sensor noise making the frames of a stop differ
+    """
+    print("=== Detection Cache Benchmark ===")
+    rng = np.random.default_rng(seed)
+    stream = []
+    for commands, frame in run:
+        for i in range(frames_per_stop):
+            noisy = np.clip(frame + rng.normal(0, noise, frame.shape), 0, 255).astype(np.uint8)
+            stream.append((commands if i == 0 else [], noisy))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        fresh_camera = CameraController(use_camera=False, cache=False)
+        cached_camera = CameraController(use_camera=False, cache=True)
+        times = {'fresh': 0.0, 'cached': 0.0}
+        errors = []
+        _, _, _, (center_x, center_y) = fresh_camera.frame_geometry()
+        for commands, frame in stream:
+            centers = []
+            for name, camera in (("fresh", fresh_camera), ("cached", cached_camera)):
+                for command in commands:
+                    camera.note_motion(command)
+                start_time = time.perf_counter()
+                detection = camera.detect_grid(frame)
+                times[name] += time.perf_counter() - start_time
+                if detection['cells']:
+                    centers.append(min(detection['cells'], key=lambda cell: (cell['center'][0] - center_x) ** 2 +
+                                       (cell['center'][1] - center_y) ** 2)['center'])
+            # Agreement: center of the cell nearest the image center
+            if len(centers) == 2:
+                errors.append(np.hypot(centers[0][0] - centers[1][0], centers[0][1] - centers[1][1]))
+
+    cache = cached_camera.detection_cache
+    frames = len(stream)
+    print(f"Frames:                 {frames} ({len(run)} stops, {frames_per_stop} frames each)")
+    print(f"Fresh detection:        {times['fresh'] / frames * 1000:6.2f}ms per frame")
+    print(f"With detection cache:   {times['cached'] / frames * 1000:6.2f}ms per frame "
+          f"({times['fresh'] / max(times['cached'], 1e-9):.1f}x faster)")
+    if errors:
+        print(f"Center cell agreement:  {np.mean(errors):.2f}px mean, {np.max(errors):.2f}px max difference")
+    print(cache.summary())
+
+
+def benchmark_exposure_control(light_levels=(0.2, 1.0, 5.0), frames=12, latency=2, seed=0):
+    """
+    Run the exposure controller against a simulated sensor looking at a
+    grid under dim, normal and bright light, next to the fixed 50ms / gain
+    2.0 controls the camera used to start with. Controls take effect
+    `latency` frames after they are set, as on the Pi camera.
+    """
+    print("=== Exposure Control Benchmark ===")
+    rng = np.random.default_rng(seed)
+    scene = cv2.cvtColor(synthetic_grid_frame(noise=0), cv2.COLOR_BGR2GRAY)
+    scene = cv2.resize(scene, CAMERA_LORES_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32) / 200.0
+    floor, tape = scene > 0.8, scene < 0.3
+    # Grey level per unit of exposure (us x gain) at normal light: the floor reaches 190 at 20ms
+    response = 190 / 20000
+
+    def sensor(light, exposure_time, gain):
+        signal = scene * light * response * exposure_time * gain
+        noise = rng.normal(0, 1.0 + 0.8 * gain, scene.shape)  # Read noise grows with gain
+        return np.clip(signal + noise, 0, 255).astype(np.uint8)
+
+    print("Light | Controls        | Frames to converge | Exposure (ms) | Gain | Floor | Contrast | Clipped")
+    print("-" * 98)
+    for light in light_levels:
+        for name in ("fixed", "closed loop"):
+            controller = ExposureController() if name == "closed loop" else None
+            applied = [{'ExposureTime': 50000, 'AnalogueGain': 2.0}] * (latency + 1)
+            if controller is not None:
+                applied = [controller.controls()] * (latency + 1)
+            converged_at = None
+            for frame in range(frames):
+                controls = applied.pop(0)
+                gray = sensor(light, controls['ExposureTime'], controls['AnalogueGain'])
+                if controller is not None:
+                    new_controls = controller.update(gray, controls)
+                    if controller.converged and converged_at is None:
+                        converged_at = frame + 1
+                    applied.append(new_controls or applied[-1])
+                else:
+                    applied.append(controls)
+            converged = "-" if controller is None else (str(converged_at) if converged_at else "no")
+            print(f"{light:5.1f} | {name:15s} | {converged:>18s} | {controls['ExposureTime'] / 1000:13.1f} | "
+                  f"{controls['AnalogueGain']:4.1f} | {gray[floor].mean():5.0f} | "
+                  f"{gray[floor].mean() - gray[tape].mean():8.0f} | {np.mean(gray >= 250):7.1%}")
+
+    # Black floor with a lamp in view (floor level 0, over 2% saturated), then
+    # the lamp leaves the view and the dim grid must be found again
+    controller = ExposureController()
+    x0, y0, x1, y1 = EXPOSURE_REGION
+    lamp = np.zeros(scene.shape, dtype=np.uint8)
+    lamp[:, int((x0 + 0.1) * scene.shape[1]):int((x0 + 0.2) * scene.shape[1])] = 255
+    applied = [controller.controls()] * (latency + 1)
+    lamp_frames = 4
+    converged_at = None
+    for frame in range(lamp_frames + frames):
+        controls = applied.pop(0)
+        gray = lamp if frame < lamp_frames else sensor(0.2, controls['ExposureTime'], controls['AnalogueGain'])
+        applied.append(controller.update(gray, controls) or applied[-1])
+        if frame >= lamp_frames and controller.converged and converged_at is None:
+            converged_at = frame + 1 - lamp_frames
+    print(f"\nLamp in a dark view for {lamp_frames} frames, then the dim grid: "
+          f"converged {converged_at or 'no'} frames after the lamp left, floor {gray[floor].mean():.0f}, "
+          f"exposure {controls['ExposureTime'] / 1000:.1f}ms x gain {controls['AnalogueGain']:.1f}")
+
+    # Motion blur during a 90-degree turn, at the image edge (320 px from the center)
+    speed = np.pi / 2 / TURN_TIME * CAMERA_WIDTH / 2
+    controller = ExposureController()
+    controller.exposure = EXPOSURE_MAX_TIME  # Dim light: exposure time at its stationary cap
+    stationary = controller.controls()
+    controller.set_moving(True)
+    moving = controller.controls()
+    print(f"\nTurning ({speed:.0f} px/s at the image edge), dim light:")
+    for name, controls in (("stationary", stationary), ("moving", moving)):
+        print(f"  {name:10s}: {controls['ExposureTime'] / 1000:5.1f}ms x gain {controls['AnalogueGain']:.1f}, "
+              f"motion blur {speed * controls['ExposureTime'] / 1e6:4.1f}px")
+
+
+def benchmark_jitter(frames=40, noise=30, glare_frame=20):
+    """
+    Compare the frame-to-frame stability of the detected grid with and
+    without line tracking while the robot stands still: noisy frames of
+    the same grid, one of them washed out by glare.
+    """
+    print("=== Grid Jitter Benchmark ===")
+    run = []
+    for i in range(frames):
+        frame = synthetic_grid_frame(1.0, noise=noise, seed=1000 + i)
+        if i == glare_frame:
+            frame[:, CAMERA_WIDTH // 3:] = 250  # Glare over two thirds of the view
+        run.append(frame)
+
+    print("Mode          | Center x std | Center y std | Glare frame | Cells on glare frame")
+    print("-" * 80)
+    for name, tracking in (("full", False), ("tracking", True)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            camera = CameraController(use_camera=False, tracking=tracking)
+            _, _, _, (center_x, center_y) = camera.frame_geometry()
+            centers = []
+            glare = None
+            for i, frame in enumerate(run):
+                detection = camera.detect_grid(frame)
+                if i == glare_frame:
+                    glare = detection
+                elif detection['cells']:
+                    cell = min(detection['cells'], key=lambda cell: (cell['center'][0] - center_x) ** 2 +
+                               (cell['center'][1] - center_y) ** 2)
+                    centers.append(cell['center'])
+        centers = np.array(centers, dtype=float)
+        glare_state = "tracked" if glare['metrics'].get('tracked') else (
+            "fallback" if glare['fallback'] else f"q={glare['quality']:.2f}")
+        print(f"{name:13s} | {centers[:, 0].std():10.2f}px | {centers[:, 1].std():10.2f}px | "
+              f"{glare_state:11s} | {len(glare['cells'])}")
+
+
+
+def degraded_frame(frame, kind, seed=0):
+    """
+    A copy of a frame spoiled the way real captures are.
+
+    Args:
+        frame (numpy.ndarray): BGR frame
+        kind (str): 'motion' (horizontal motion blur, 15-31 px), 'defocus'
+                    (Gaussian blur), 'dark' or 'overexposed'
+        seed (int): Random seed for the blur length
+    """
+    if kind == 'motion':
+        length = int(np.random.default_rng(seed).integers(15, 32))
+        kernel = np.full((1, length), 1.0 / length, dtype=np.float32)
+        return cv2.filter2D(frame, -1, kernel)
+    if kind == 'defocus':
+        return cv2.GaussianBlur(frame, (0, 0), 3)
+    if kind == 'dark':
+        return cv2.convertScaleAbs(frame, alpha=0.03)
+    if kind == 'overexposed':
+        return cv2.convertScaleAbs(frame, alpha=3.0, beta=60)
+    raise ValueError(f"Unknown degradation: {kind}")
+
+
+def benchmark_quality_gate(frames, bad_every=4, repeats=3):
+    """
+    Run the frame quality gate over a stream with motion-blurred, defocused,
+    dark and overexposed frames mixed in: which frames are skipped and why,
+    the cost of the check, the detection time it saves and how well the
+    grid is detected on accepted versus rejected frames.
+    """
+    print("=== Frame Quality Gate Benchmark ===")
+    kinds = ('motion', 'defocus', 'dark', 'overexposed')
+    stream = []
+    for i, frame in enumerate(frames * 2):
+        kind = kinds[(i // bad_every) % len(kinds)] if i % bad_every == bad_every - 1 else None
+        stream.append((kind, frame if kind is None else degraded_frame(frame, kind, seed=i)))
+
+    gate = FrameQualityGate()
+    with contextlib.redirect_stdout(io.StringIO()):
+        camera = CameraController(use_camera=False, tracking=False)
+        camera.detect_grid(stream[0][1])  # Warm-up
+        decisions = []
+        for kind, frame in stream:
+            accepted, reason, _ = gate.check(lores_gray(frame))
+            start_time = time.perf_counter()
+            for _ in range(repeats):
+                detection = camera.detect_grid(frame)
+            detect_ms = (time.perf_counter() - start_time) / repeats * 1000
+            decisions.append((kind, accepted, reason, detect_ms, detection))
+
+    print("Frames       | Count | Skipped | Reasons")
+    print("-" * 70)
+    for label in (None,) + kinds:
+        rows = [d for d in decisions if d[0] == label]
+        reasons = {}
+        for _, accepted, reason, _, _ in rows:
+            if not accepted:
+                reasons[reason] = reasons.get(reason, 0) + 1
+        skipped = sum(reasons.values())
+        print(f"{label or 'normal':12s} | {len(rows):5d} | {skipped / len(rows):6.0%} | "
+              f"{', '.join(f'{r} {n}' for r, n in sorted(reasons.items())) or '-'}")
+
+    print("\nDecision | Frames | Detect (ms) | Quality | Fallback | Cells")
+    print("-" * 62)
+    for name, accepted in (("accepted", True), ("rejected", False)):
+        rows = [d for d in decisions if d[1] == accepted]
+        if not rows:
+            continue
+        print(f"{name:8s} | {len(rows):6d} | {np.mean([d[3] for d in rows]):11.2f} | "
+              f"{np.mean([d[4]['quality'] for d in rows]):7.2f} | "
+              f"{np.mean([d[4]['fallback'] for d in rows]):8.0%} | {np.mean([len(d[4]['cells']) for d in rows]):5.1f}")
+    skipped_ms = sum(d[3] for d in decisions if not d[1])
+    print(f"\n{gate.summary()}")
+    print(f"Detection time saved: {skipped_ms - gate.stats['check_time'] * 1000:.0f}ms over {len(stream)} frames "
+          f"({skipped_ms:.0f}ms of detection skipped, {gate.stats['check_time'] * 1000:.0f}ms spent checking)")
+
+
+def benchmark_frame_buffers(frames, repeats=5):
+    """
+    Compare the vision path with per-frame allocation and with the frame
+    buffer pool: latency, frame-size buffer allocations per frame and the
+    transient memory peak of one detection (traced with tracemalloc).
+    """
+    print("=== Frame Buffer Benchmark ===")
+    print(f"Detector    | Buffers   | Detect (ms) | Allocs/frame | Peak mean/max (MB) | Pool (MB) | of {PI_MEMORY_MB} MB")
+    print("-" * 95)
+    for detector in ('morphology', 'projection', 'hough'):
+        for name, enabled in (("allocate", False), ("pooled", True)):
+            with contextlib.redirect_stdout(io.StringIO()):
+                buffers = FrameBufferPool(enabled=enabled)
+                camera = CameraController(line_detector=detector, use_camera=False, tracking=False, buffers=buffers)
+                camera.detect_grid(frames[0])  # Warm-up fills the pool
+                detect_time = _time_per_frame(camera.detect_grid, frames, repeats=repeats)
+
+                buffers.stats = {'requests': 0, 'allocations': 0}
+                tracemalloc.start()
+                peaks = []
+                for frame in frames:
+                    tracemalloc.reset_peak()
+                    baseline = tracemalloc.get_traced_memory()[0]
+                    camera.detect_grid(frame)
+                    peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+                tracemalloc.stop()
+            allocations = buffers.stats['allocations'] / len(frames)
+            peak = max(peaks) / 2 ** 20
+            pool = buffers.nbytes() / 2 ** 20
+            print(f"{detector:11s} | {name:9s} | {detect_time:11.2f} | {allocations:12.1f} | "
+                  f"{np.mean(peaks) / 2 ** 20:8.2f} / {peak:7.2f} | {pool:9.2f} | {(peak + pool) / PI_MEMORY_MB:6.2%}")
+
+
+
+def benchmark_vision_workers(frames, worker_counts=(1, 2, 3), rounds=5):
+    """
+    Compare detection throughput of the single-process path with the
+    vision worker pool, and what the control thread pays per frame to hand
+    it over (shared memory copy vs pickling the frame for a queue).
+    """
+    print("=== Vision Worker Pool Benchmark ===")
+    print(f"CPU cores available: {len(os.sched_getaffinity(0))}")
+    stream = [frames[i % len(frames)] for i in range(rounds * len(frames))]
+
+    frame = stream[0]
+    copy_time = _time_per_frame(lambda image: np.copyto(np.empty_like(image), image), [frame], repeats=50)
+    pickle_time = _time_per_frame(lambda image: pickle.loads(pickle.dumps(image, protocol=pickle.HIGHEST_PROTOCOL)),
+                                  [frame], repeats=50)
+    print(f"Hand-over of a {frame.nbytes / 1024:.0f} KB frame: shared memory copy {copy_time:.3f}ms, "
+          f"pickle round trip {pickle_time:.3f}ms")
+    print()
+
+    print("Mode            | Frames/s | Speedup | Mean latency (ms) | Submit (ms)")
+    print("-" * 70)
+    with contextlib.redirect_stdout(io.StringIO()):
+        camera = CameraController(use_camera=False, tracking=False)
+        start_time = time.perf_counter()
+        for image in stream:
+            camera.position_from_detection(camera.detect_grid(image))
+        single_time = time.perf_counter() - start_time
+    single_rate = len(stream) / single_time
+    print(f"{'single process':15s} | {single_rate:8.1f} | {1.0:6.2f}x | {single_time / len(stream) * 1000:17.2f} | "
+          f"{'-':>11s}")
+
+    for workers in worker_counts:
+        with contextlib.redirect_stdout(io.StringIO()):
+            pool = VisionWorkerPool(workers=workers, slots=workers + 1, frame_shape=frame.shape)
+        try:
+            # Warm up: every worker has imported OpenCV and detected a frame
+            for frame_id in [pool.submit(frame) for _ in range(workers)]:
+                pool.result(frame_id, timeout=60)
+
+            latencies = []
+            submit_time = 0.0
+            start_time = time.perf_counter()
+            for image in stream:
+                # A camera loop would drop frames while the ring is full; here wait for a slot
+                while pool.in_flight() >= pool.slots:
+                    latencies.extend(result['latency_ms'] for result in pool.poll())
+                    time.sleep(0.0005)
+                submit_start = time.perf_counter()
+                pool.submit(image)
+                submit_time += time.perf_counter() - submit_start
+            while pool.in_flight():
+                latencies.extend(result['latency_ms'] for result in pool.poll())
+                time.sleep(0.0005)
+            latencies.extend(result['latency_ms'] for result in pool.poll())
+            pool_time = time.perf_counter() - start_time
+        finally:
+            with contextlib.redirect_stdout(io.StringIO()):
+                pool.cleanup()
+        rate = len(stream) / pool_time
+        print(f"{f'{workers} workers':15s} | {rate:8.1f} | {rate / single_rate:6.2f}x | {np.mean(latencies):17.2f} | "
+              f"{submit_time / len(stream) * 1000:11.3f}")
+
+
+if __name__ == "__main__":
+    frames, source, recorded = load_frames(sys.argv[1] if len(sys.argv) > 1 else IMAGE_SAVE_PATH)
+    print(f"Using {source}\n")
+    benchmark_line_detectors(frames)
+    print()
+    benchmark_frame_buffers(frames)
+    print()
+    benchmark_pyramid(frames)
+    print()
+    benchmark_quality_gate(frames)
+    print()
+    benchmark_exposure_control()
+    print()
+    benchmark_vision_workers(frames)
+    print()
+    benchmark_rotated_grids()
+    print()
+    benchmark_birds_eye(frames if recorded else None, load_calibration() if recorded else None)
+    print()
+    # Recorded frames carry no motion commands, so the tracker predicts no motion
+    benchmark_tracking([([], frame) for frame in frames] if recorded else synthetic_run())
+    print()
+    benchmark_detection_cache(synthetic_run(20))
+    print()
+    benchmark_jitter()
@@ -0,0 +1,208 @@
+"""
+Vision worker pool: grid detection in separate processes.
+Frames are copied into slots of a shared memory ring instead of being
+pickled through a queue; only the slot number goes to a worker, and only
+a compact result (position, quality, cell count) comes back. Consecutive
+frames are detected in parallel on the Pi's cores, and the control thread
+only pays for one frame copy per submit. With VISION_WORKER_POOL the camera
+controller detects navigation frames here (submit_position/collect_position).
+"""
+
+import os
+import time
+import queue
+import contextlib
+import multiprocessing
+from collections import deque
+from multiprocessing import shared_memory
+import numpy as np
+from config import *
+
+
+def _worker_main(shm_name, ring_shape, tasks, results, line_detector, pyramid_levels):
+    """Worker process: detect the grid in ring slots until a None task arrives."""
+    from camera_controller import CameraController
+    from perf_profile import apply_profile
+    apply_profile(PERF_PROFILE, 'vision_worker')
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = np.ndarray(ring_shape, dtype=np.uint8, buffer=shm.buf)
+    # Frames from one worker are not consecutive, so there is nothing to track
+    camera = CameraController(line_detector=line_detector, use_camera=False, tracking=False,
+                              pyramid_levels=pyramid_levels, vision_workers=False)
+    try:
+        # Detection logs every frame; keep that off the console, but not
+        # warnings from startup or tracebacks (stderr)
+        with open(os.devnull, 'w') as devnull:
+            while True:
+                task = tasks.get()
+                if task is None:
+                    break
+                frame_id, slot = task
+                start_time = time.perf_counter()
+                with contextlib.redirect_stdout(devnull):
+                    detection = camera.detect_grid(ring[slot])
+                row, col, quality = camera.position_from_detection(detection)
+                results.put({
+                    'frame_id': frame_id,
+                    'slot': slot,
+                    'row': row,
+                    'col': col,
+                    'quality': quality,
+                    'cells': len(detection['cells']),
+                    'fallback': detection['fallback'],
+                    'detect_ms': (time.perf_counter() - start_time) * 1000,
+                    'worker': os.getpid(),
+                })
+    finally:
+        del ring
+        shm.close()
+
+
+class VisionWorkerPool:
+    def __init__(self, workers=VISION_WORKERS, slots=VISION_RING_SLOTS,
+                 frame_shape=(CAMERA_HEIGHT, CAMERA_WIDTH, 3), line_detector=GRID_LINE_DETECTOR,
+                 pyramid_levels=VISION_PYRAMID_LEVELS, start_method=VISION_WORKER_START_METHOD):
+        """
+        Initialize the shared frame ring and start the worker processes.
+
+        Args:
+            workers (int): Number of worker processes
+            slots (int): Frames that can be in flight at once
+            frame_shape (tuple): Shape of the BGR frames that will be submitted
+            line_detector (str): Grid line detector used by the workers
+            pyramid_levels (int): Pyramid detection scale used by the workers
+            start_method (str): multiprocessing start method ('spawn' keeps
+                                the camera and GPIO state out of the workers)
+        """
+        self.frame_shape = tuple(frame_shape)
+        self.slots = slots
+        ring_shape = (slots,) + self.frame_shape
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(ring_shape)))
+        self.ring = np.ndarray(ring_shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.free_slots = deque(range(slots))
+        self.next_frame_id = 0
+        self.pending = {}  # frame_id -> submit time
+        self.results = {}  # frame_id -> result dict, until collected
+        self.cancelled = set()  # frame_ids whose results nobody will collect
+        self.stats = {'submitted': 0, 'completed': 0, 'dropped': 0}
+
+        context = multiprocessing.get_context(start_method)
+        self.tasks = context.Queue()
+        self.result_queue = context.Queue()
+        self.workers = [context.Process(target=_worker_main, daemon=True,
+                                        args=(self.shm.name, ring_shape, self.tasks, self.result_queue,
+                                              line_detector, pyramid_levels))
+                        for _ in range(workers)]
+        for worker in self.workers:
+            worker.start()
+        print(f"Vision worker pool started: {workers} workers, {slots} frame slots "
+              f"({self.shm.size / 2 ** 20:.1f} MB shared)")
+
+    def submit(self, frame):
+        """
+        Queue a frame for detection without waiting for it.
+
+        Args:
+            frame (numpy.ndarray): BGR frame of the pool's frame shape
+
+        Returns:
+            int: Frame id to collect the result with, or None if every slot
+                 is busy (the frame is dropped rather than blocking)
+        """
+        self._collect()
+        if frame is None or frame.shape != self.frame_shape:
+            print(f"Warning: frame shape {None if frame is None else frame.shape} does not match the pool")
+            return None
+        if not self.free_slots:
+            self.stats['dropped'] += 1
+            return None
+        slot = self.free_slots.popleft()
+        np.copyto(self.ring[slot], frame)
+        frame_id = self.next_frame_id
+        self.next_frame_id += 1
+        self.pending[frame_id] = time.perf_counter()
+        self.tasks.put((frame_id, slot))
+        self.stats['submitted'] += 1
+        return frame_id
+
+    def poll(self):
+        """
+        Collect finished detections without blocking.
+
+        Returns:
+            list: Result dicts ('frame_id', 'row', 'col', 'quality', 'cells',
+                  'fallback', 'detect_ms', 'latency_ms') in completion order
+        """
+        self._collect()
+        finished = list(self.results.values())
+        self.results.clear()
+        return finished
+
+    def result(self, frame_id, timeout=None):
+        """
+        Wait for the detection of one frame.
+
+        Returns:
+            dict: The result (see poll), or None on timeout
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while frame_id not in self.results:
+            remaining = None if deadline is None else deadline - time.perf_counter()
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                self._store(self.result_queue.get(timeout=remaining))
+            except queue.Empty:
+                return None
+        return self.results.pop(frame_id)
+
+    def cancel(self, frame_id):
+        """Drop the result of a frame nobody will collect (e.g. after a timeout)."""
+        if self.results.pop(frame_id, None) is None and frame_id in self.pending:
+            self.cancelled.add(frame_id)
+
+    def alive(self):
+        """True if every worker process is still running."""
+        return self.shm is not None and all(worker.is_alive() for worker in self.workers)
+
+    def in_flight(self):
+        """Number of submitted frames without a collected result."""
+        return len(self.pending)
+
+    def _collect(self):
+        """Move every result that has arrived into self.results."""
+        while True:
+            try:
+                self._store(self.result_queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def _store(self, result):
+        """Record a worker result and free its ring slot."""
+        self.free_slots.append(result.pop('slot'))
+        submitted = self.pending.pop(result['frame_id'], None)
+        if submitted is not None:
+            result['latency_ms'] = (time.perf_counter() - submitted) * 1000
+        self.stats['completed'] += 1
+        if result['frame_id'] in self.cancelled:
+            self.cancelled.discard(result['frame_id'])
+            return
+        self.results[result['frame_id']] = result
+
+    def cleanup(self):
+        """Stop the workers and release the shared memory."""
+        if self.shm is None:
+            return
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        del self.ring
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+        print(f"Vision worker pool stopped ({self.stats['completed']} of {self.stats['submitted']} frames detected, "
+              f"{self.stats['dropped']} dropped)")